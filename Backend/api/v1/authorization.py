@@ -8,7 +8,7 @@ from Backend.utils.helper.model.api.v1.authorization import (
     SingUpSuccessModel,
 )
 from Backend.utils.helper.logger import CustomLoggerHandler
-from Backend.utils.database.database import MySQLHandler
+from Backend.utils.database.database import AsyncMySQLHandler
 
 from fastapi import APIRouter, HTTPException
 from pprint import pformat
@@ -25,7 +25,7 @@ from dotenv import load_dotenv
 load_dotenv("./.env")
 
 router = APIRouter()
-mysql_client = MySQLHandler()
+mysql_client = AsyncMySQLHandler()
 logger = CustomLoggerHandler(__name__).setup_logging()
 
 
@@ -66,7 +66,7 @@ async def login(
     username = login_form.username
     hashed_password = login_form.hashed_password
 
-    _status, user_info = mysql_client.get_user_info(username, hashed_password)
+    _status, user_info = await mysql_client.get_user_info(username, hashed_password)
 
     if _status != 200 and isinstance(user_info, str):
         return LoginFormUnsuccessModel(
@@ -109,7 +109,7 @@ async def login(
         jwt_token = jwt.encode(login_info, _jwt_secret, algorithm=_jwt_algorithm)
         logger.debug(f"Generated new jwt token:{jwt_token}")
 
-        _success = mysql_client.insert_login_token(user_info.user_id, jwt_token)
+        _success = await mysql_client.insert_login_token(user_info.user_id, jwt_token)
 
         if _success:
             return LoginFormSuccessModel(
@@ -149,7 +149,7 @@ async def sign_in(username: str, password: str) -> SingUpSuccessModel:
     hash_function.update(password.encode())
     hashed_password = hash_function.hexdigest()
 
-    _success = mysql_client.create_user(username, hashed_password)
+    _success = await mysql_client.create_user(username, hashed_password)
     if _success:
         return SingUpSuccessModel(status_code=200, success=True)
     else:
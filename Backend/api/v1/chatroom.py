@@ -6,23 +6,42 @@ from Backend.utils.helper.model.api.v1.chatroom import (
     QuestioningModel,
     QuestionResponseModel,
 )
-from Backend.utils.database.vector_database import MilvusHandler
+from Backend.utils.helper.model.database.vector_database import SearchSimilarityModel
+from Backend.utils.helper.model.database.database import ChatRecordModel
+from Backend.utils.helper.model.RAG.answer_cache import CachedAnswerModel
+from Backend.utils.helper.model.RAG.response_handler import SchedulerStatsModel
+from Backend.utils.helper.error import SchedulerRejectedError, SchedulerUserLimitError
 from Backend.utils.RAG.response_handler import ResponseHandler
+from Backend.utils.RAG.answer_cache import SemanticAnswerCache
+from Backend.utils.RAG.conversation_memory import ConversationMemory
+from Backend.utils.RAG.hybrid_retriever import HybridRetriever
+from Backend.utils.RAG.single_flight import SingleFlight
 from Backend.utils.RAG.vector_extractor import VectorHandler
 from Backend.utils.helper.logger import CustomLoggerHandler
-from Backend.utils.database.database import MySQLHandler
+from Backend.utils.database.write_behind import ChatRecordWriter
+from Backend.utils.database.database import AsyncMySQLHandler
 
 # from Backend.utils.helper.model.model import *
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Literal
+from datetime import datetime
 from pprint import pformat
 from uuid import uuid4
 
+import hashlib
+import json
+
 router = APIRouter()
-mysql_client = MySQLHandler()
-milvus_client = MilvusHandler()
+mysql_client = AsyncMySQLHandler()
+chat_record_writer = ChatRecordWriter()
+retriever = HybridRetriever()
 encoder_client = VectorHandler()
 response_client = ResponseHandler()
+answer_cache = SemanticAnswerCache()
+single_flight = SingleFlight()
+conversation_memory = ConversationMemory(response_client)
 logger = CustomLoggerHandler(__name__).setup_logging()
 
 
@@ -39,6 +58,18 @@ async def get_uuid() -> str:
     return chatroom_uuid
 
 
+@router.get("/chatroom/scheduler/", status_code=200)
+async def get_scheduler_stats() -> SchedulerStatsModel:
+    """
+    Report the LLM scheduler state for monitoring.
+
+    Returns:
+        SchedulerStatsModel: running generations, queue depth and wait times
+            of the current LLM backend.
+    """
+    return response_client.scheduler.stats()
+
+
 @router.patch("/chatroom/rating/", status_code=200)
 async def answer_rating(
     rating_model: RatingModel,
@@ -76,7 +107,12 @@ async def answer_rating(
         )
     )
 
-    success = mysql_client.update_rating(question_uuid=question_uuid, rating=score)
+    # the record may still be waiting in the write-behind queue
+    if chat_record_writer.set_pending_rating(question_uuid, score):
+        return AnswerRatingModel(status_code=200, success=True)
+
+    await chat_record_writer.wait_until_written(question_uuid)
+    success = await mysql_client.update_rating(question_uuid=question_uuid, rating=score)
 
     if success:
         return AnswerRatingModel(status_code=200, success=success)
@@ -93,7 +129,8 @@ async def questioning(
     Args:
         Args:
         chat_id (str): chatroom uuid
-        question (list[str]): question content
+        question (list[str]): question content, only the last one is used,
+            the history is rebuilt from chat_id
         user_id (str): user id
         collection (str, optional): collection of docs database. Defaults to "default".
         language (str): language for the response
@@ -122,55 +159,392 @@ async def questioning(
         )
     )
 
+    conversation = await conversation_memory.get(chat_id, language)
+    chat_history = conversation_memory.history(conversation, question[-1])
+    summary = conversation.summary
+
+    # identical concurrent questions share one generation
+    history_hash = hashlib.sha256(
+        json.dumps([summary, chat_history[:-1]], ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    try:
+        generated_answer = await single_flight.run(
+            (question[-1], history_hash, collection, language, question_type),
+            lambda: _answer_question(
+                question=chat_history,
+                summary=summary,
+                collection=collection,
+                language=language,
+                question_type=question_type,
+                user_id=user_id,
+            ),
+        )
+    except SchedulerRejectedError as error:
+        raise _scheduler_rejected_exception(error)
+
+    if generated_answer.answer:
+        conversation_memory.append_turn(
+            chat_id, question[-1], generated_answer.answer, language
+        )
+
+    # insert into mysql in the background
+    await chat_record_writer.enqueue(
+        ChatRecordModel(
+            chat_id=chat_id,
+            qa_id=question_uuid,
+            answer=generated_answer.answer,
+            question=question[-1],
+            token_size=generated_answer.token_size,
+            sent_by=user_id,
+            file_ids=generated_answer.file_ids,
+            sent_time=datetime.now(),
+        )
+    )
+
+    if generated_answer.answer:
+        return QuestionResponseModel(
+            status_code=200,
+            question_uuid=question_uuid,
+            answer=generated_answer.answer,
+            files=generated_answer.files,
+        )
+
+    raise HTTPException(status_code=500, detail="Internal server error")
+
+
+async def _answer_question(
+    question: list[str],
+    summary: str,
+    collection: str,
+    language: Literal["CHINESE", "ENGLISH"],
+    question_type: Literal["CHATTING", "TESTING", "THEOREM"],
+    user_id: str,
+) -> CachedAnswerModel:
+    """embed, search and generate the answer of a question
+
+    Args:
+        question (list[str]): chat history ending with the question
+        summary (str): rolling summary of the older turns
+        collection (str): collection of docs database
+        language (Literal["CHINESE", "ENGLISH"]): language for the response
+        question_type (Literal["CHATTING", "TESTING", "THEOREM"]): type of prompt
+        user_id (str): user id of the first requester, used by the LLM scheduler
+
+    Returns:
+        CachedAnswerModel: answer, prompt token size and source files
+    """
     # search question
     question_text = question[-1] if isinstance(question, list) else question
-    question_vector = encoder_client.encoder(question_text)
-    docs_result = milvus_client.search_similarity(
-        question_vector, collection_name=collection
+    question_vector = await encoder_client.async_encoder(question_text)
+
+    # only single-turn questions are answered from the semantic cache
+    is_single_turn = len(question) == 1 and not summary
+    if is_single_turn:
+        cached_answer = answer_cache.lookup(
+            question_vector, collection, language, question_type
+        )
+        if cached_answer:
+            return cached_answer
+
+    docs_result = await retriever.search(
+        question[-1], question_vector, collection=collection
     )
 
     document_content = [x.content for x in docs_result]
     document_file_uuid = [str(x.file_uuid) for x in docs_result]
 
-    # handling duplicates files name
-    seen = set()
-    files = []
-    for docs in docs_result:
-        if not docs.source in seen:
-            files.append(
-                {
-                    "file_name": docs.source,
-                    "file_uuid": docs.file_uuid,
-                }
-            )
-            seen.add(docs.source)
+    files = _unique_source_files(docs_result)
 
-    answer, token_size = response_client.generate_response(
+    answer, token_size = await response_client.async_generate_response(
         question=question,
         queried_document=document_content,
         question_type=question_type,
         max_tokens=8192,
         language=language,
+        user_id=user_id,
+        summary=summary,
     )
     answer = "".join(answer).replace("\n\n", "\n")
 
-    # insert into mysql
-    mysql_client.insert_chatting(
-        chat_id=chat_id,
-        qa_id=question_uuid,
+    generated_answer = CachedAnswerModel(
         answer=answer,
-        question=question[-1],
         token_size=token_size,
-        sent_by=user_id,
+        files=files,
         file_ids=document_file_uuid,
     )
 
-    if answer:
-        return QuestionResponseModel(
-            status_code=200,
-            question_uuid=question_uuid,
-            answer=answer,
-            files=files,
+    if answer and is_single_turn:
+        answer_cache.store(
+            question_vector, collection, language, question_type, generated_answer
         )
 
-    raise HTTPException(status_code=500, detail="Internal server error")
+    return generated_answer
+
+
+@router.post("/chatroom/{chat_id}/stream/", status_code=200)
+async def questioning_stream(
+    question_model: QuestioningModel,
+) -> StreamingResponse:
+    """Ask the question and stream the answer from RAG as server-sent events
+
+    The source files are sent first, followed by the answer as it is generated.
+    The QA record is written once the stream finishes.
+
+    Events:
+        files: {"question_uuid": str, "files": list[dict[str, str]]}
+        token: {"content": str}
+        done: {"question_uuid": str, "token_size": int}
+        error: {"detail": str}
+
+    Args:
+        chat_id (str): chatroom uuid
+        question (list[str]): question content, only the last one is used,
+            the history is rebuilt from chat_id
+        user_id (str): user id
+        collection (str, optional): collection of docs database. Defaults to "default".
+        language (str): language for the response
+
+    Returns:
+        StreamingResponse: text/event-stream of the events above
+    """
+    chat_id = question_model.chat_id
+    question = question_model.question
+    user_id = question_model.user_id
+    collection = question_model.collection
+    language = question_model.language
+    question_type = question_model.question_type
+    question_uuid = str(uuid4())
+
+    logger.debug(
+        pformat(
+            {
+                "chat_id": chat_id,
+                "question": question,
+                "user_id": user_id,
+                "collection": collection,
+                "question_uuid": question_uuid,
+                "stream": True,
+            }
+        )
+    )
+
+    conversation = await conversation_memory.get(chat_id, language)
+    chat_history = conversation_memory.history(conversation, question[-1])
+    summary = conversation.summary
+
+    # search question
+    question_vector = await encoder_client.async_encoder(question[-1])
+
+    # only single-turn questions are answered from the semantic cache
+    is_single_turn = len(chat_history) == 1 and not summary
+    cached_answer = (
+        answer_cache.lookup(question_vector, collection, language, question_type)
+        if is_single_turn
+        else None
+    )
+    if cached_answer:
+        return StreamingResponse(
+            _cached_event_stream(
+                cached_answer=cached_answer,
+                chat_id=chat_id,
+                question_uuid=question_uuid,
+                question=question[-1],
+                user_id=user_id,
+                language=language,
+            ),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    # reject before the stream starts, the status code can't change afterwards
+    try:
+        response_client.scheduler.check_admission(user_id)
+    except SchedulerRejectedError as error:
+        raise _scheduler_rejected_exception(error)
+
+    docs_result = await retriever.search(
+        question[-1], question_vector, collection=collection
+    )
+
+    document_content = [x.content for x in docs_result]
+    document_file_uuid = [str(x.file_uuid) for x in docs_result]
+    files = _unique_source_files(docs_result)
+
+    async def event_stream() -> AsyncIterator[str]:
+        yield _format_sse_event(
+            "files", {"question_uuid": question_uuid, "files": files}
+        )
+
+        answer_pieces = []
+        token_size = 0
+        try:
+            async for (
+                content,
+                prompt_tokens,
+            ) in response_client.async_generate_response_stream(
+                question=chat_history,
+                queried_document=document_content,
+                question_type=question_type,
+                max_tokens=8192,
+                language=language,
+                user_id=user_id,
+                summary=summary,
+            ):
+                token_size = prompt_tokens or token_size
+                if content:
+                    answer_pieces.append(content)
+                    yield _format_sse_event("token", {"content": content})
+        except SchedulerRejectedError as error:
+            yield _format_sse_event(
+                "error", {"detail": str(error), "retry_after": error.retry_after}
+            )
+            return
+        except Exception as error:
+            logger.error(f"Failed to stream response: {error}")
+            yield _format_sse_event("error", {"detail": "Internal server error"})
+            return
+
+        answer = "".join(answer_pieces).replace("\n\n", "\n")
+        if not answer:
+            yield _format_sse_event("error", {"detail": "Internal server error"})
+            return
+
+        # insert into mysql in the background
+        await chat_record_writer.enqueue(
+            ChatRecordModel(
+                chat_id=chat_id,
+                qa_id=question_uuid,
+                answer=answer,
+                question=question[-1],
+                token_size=token_size,
+                sent_by=user_id,
+                file_ids=document_file_uuid,
+                sent_time=datetime.now(),
+            )
+        )
+        conversation_memory.append_turn(chat_id, question[-1], answer, language)
+
+        if is_single_turn:
+            answer_cache.store(
+                question_vector,
+                collection,
+                language,
+                question_type,
+                CachedAnswerModel(
+                    answer=answer,
+                    token_size=token_size,
+                    files=files,
+                    file_ids=document_file_uuid,
+                ),
+            )
+
+        yield _format_sse_event(
+            "done", {"question_uuid": question_uuid, "token_size": token_size}
+        )
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _cached_event_stream(
+    cached_answer: CachedAnswerModel,
+    chat_id: str,
+    question_uuid: str,
+    question: str,
+    user_id: str,
+    language: Literal["CHINESE", "ENGLISH"],
+) -> AsyncIterator[str]:
+    """replay a cached answer with the same events as a generated one
+
+    Args:
+        cached_answer (CachedAnswerModel): answer from the semantic cache
+        chat_id (str): chatroom uuid
+        question_uuid (str): uuid of this question
+        question (str): question content
+        user_id (str): user id
+        language (Literal["CHINESE", "ENGLISH"]): language for the response
+
+    Yields:
+        str: encoded server-sent events
+    """
+    yield _format_sse_event(
+        "files", {"question_uuid": question_uuid, "files": cached_answer.files}
+    )
+    yield _format_sse_event("token", {"content": cached_answer.answer})
+
+    await chat_record_writer.enqueue(
+        ChatRecordModel(
+            chat_id=chat_id,
+            qa_id=question_uuid,
+            answer=cached_answer.answer,
+            question=question,
+            token_size=cached_answer.token_size,
+            sent_by=user_id,
+            file_ids=cached_answer.file_ids,
+            sent_time=datetime.now(),
+        )
+    )
+    conversation_memory.append_turn(chat_id, question, cached_answer.answer, language)
+
+    yield _format_sse_event(
+        "done",
+        {"question_uuid": question_uuid, "token_size": cached_answer.token_size},
+    )
+
+
+def _unique_source_files(
+    docs_result: list[SearchSimilarityModel],
+) -> list[dict[str, str]]:
+    """handling duplicates files name
+
+    Args:
+        docs_result (list[SearchSimilarityModel]): searched documents
+
+    Returns:
+        list[dict[str, str]]: file name and file uuid of each distinct source
+    """
+    seen = set()
+    files = []
+    for docs in docs_result:
+        if not docs.source in seen:
+            files.append(
+                {
+                    "file_name": docs.source,
+                    "file_uuid": docs.file_uuid,
+                }
+            )
+            seen.add(docs.source)
+
+    return files
+
+
+def _scheduler_rejected_exception(error: SchedulerRejectedError) -> HTTPException:
+    """map a rejection of the LLM scheduler to 429 (user limit) or 503 (queue full)
+
+    Args:
+        error (SchedulerRejectedError): rejection raised by the scheduler
+
+    Returns:
+        HTTPException: exception with a Retry-After header
+    """
+    return HTTPException(
+        status_code=429 if isinstance(error, SchedulerUserLimitError) else 503,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+
+def _format_sse_event(event: str, data: dict) -> str:
+    """format a server-sent event
+
+    Args:
+        event (str): event name
+        data (dict): json serializable payload
+
+    Returns:
+        str: encoded event
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
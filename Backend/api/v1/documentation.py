@@ -1,34 +1,42 @@
 # Code by AkinoAlice@TyrantRey
 
 from Backend.utils.helper.model.api.v1.documentation import (
+    IngestionJobAcceptedModel,
+    IngestionJobStatusModel,
     QueryDocumentListModel,
-    FileUploadSuccessModel,
+    DocumentUpdateModel,
 )
-from Backend.utils.database.vector_database import MilvusHandler
-from Backend.utils.RAG.document_handler import DocumentSplitter
-from Backend.utils.RAG.vector_extractor import VectorHandler
+from Backend.utils.RAG.expired_documents import ExpiredDocuments
+from Backend.utils.RAG.answer_cache import SemanticAnswerCache
+from Backend.utils.RAG.ingestion_queue import IngestionQueue
+from Backend.utils.helper.executor import io_executor
 from Backend.utils.helper.logger import CustomLoggerHandler
-from Backend.utils.database.database import MySQLHandler
+from Backend.utils.database.database import AsyncMySQLHandler
 
 from fastapi import APIRouter, HTTPException
-from fastapi import UploadFile, Form
+from fastapi import UploadFile, Form, Response
 
 from starlette.responses import FileResponse
-from typing import Literal, Annotated
+from typing import Literal, Annotated, BinaryIO
 from pprint import pformat
-from os import path
+from os import getenv, path
 
+import hashlib
 import uuid
 import json
+import os
 
 # FastAPI router setup
 router = APIRouter()
-mysql_client = MySQLHandler()
-milvus_client = MilvusHandler()
-docs_client = DocumentSplitter()
-encoder_client = VectorHandler()
+mysql_client = AsyncMySQLHandler()
+answer_cache = SemanticAnswerCache()
+expired_documents = ExpiredDocuments()
+ingestion_queue = IngestionQueue()
 logger = CustomLoggerHandler(__name__).setup_logging()
 
+# bytes copied at a time when storing an upload
+UPLOAD_CHUNK_SIZE = int(getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
 
 @router.get("/documentation/{docs_id}", status_code=200)
 async def get_docs(docs_id: str) -> FileResponse:
@@ -54,7 +62,7 @@ async def get_docs(docs_id: str) -> FileResponse:
     if docs_id == "":
         raise HTTPException(status_code=422, detail="Empty request")
 
-    file_name = mysql_client.query_docs_name(docs_id)
+    file_name = await mysql_client.query_docs_name(docs_id)
     file_extension = file_name.split(".")[-1]
     if uuid.UUID(docs_id, version=4) and path.exists(
         f"./files/{docs_id}.{file_extension}"
@@ -90,7 +98,9 @@ async def get_documentation_list(
     Raises:
         HTTPException: If no documents are found for the given documentation type.
     """
-    docs_list = mysql_client.query_documentation_type_list(documentation_type)
+    docs_list = await mysql_client.query_documentation_type_list(
+        documentation_type
+    )
 
     if not docs_list:
         raise HTTPException(406, detail="No documents found")
@@ -101,28 +111,36 @@ async def get_documentation_list(
     )
 
 
-@router.post("/documentation/upload/", status_code=200)
+@router.post("/documentation/upload/", status_code=202)
 async def file_upload(
     docs_file: UploadFile,
     tags: Annotated[list[str], Form()],
+    response: Response,
     docs_format: str = "docx",
     collection: str = "default",
-) -> FileUploadSuccessModel:
+) -> IngestionJobAcceptedModel:
     """
-    Upload a document file, process its content, and store it in the database.
+    Upload a document file and queue it to be indexed.
 
-    This function handles the upload of a document file, splits its content,
-    generates vector representations, and stores the information in both
-    MySQL and Milvus databases.
+    This function streams the uploaded file to disk, hashing it on the way, and
+    returns right away. Splitting, embedding and inserting the document into
+    Milvus and MySQL run as a background ingestion job, see `get_ingestion_job`.
+    A file whose content is already in the collection is not indexed again,
+    the existing file id is returned with status 200. A file named like a
+    document of the collection replaces that document, keeping its file id and
+    taking the submitted tags; only chunks that changed are embedded, and the
+    stored file is replaced once the job succeeded.
 
     Args:
         docs_file (UploadFile): The uploaded document file.
         tags (Annotated[list[str], Form()]): A list of tags associated with the document.
+        response (Response): The response, its status code is set to 200 for duplicates.
         docs_format (str, optional): The format of the document. Defaults to "docx".
         collection (str, optional): The name of the collection to store the document in. Defaults to "default".
 
     Returns:
-        FileUploadSuccessModel: A model containing the status code and the UUID of the uploaded file.
+        IngestionJobAcceptedModel: A model containing the status code, the UUID of the
+            uploaded (or existing) file and the ingestion job id.
 
     Raises:
         HTTPException: If there's an error in file type, format, or database operations.
@@ -144,48 +162,294 @@ async def file_upload(
         )
         raise HTTPException(status_code=422, detail="Invalid file type")
 
-    # save uploaded pdf file
-    docs_contents = docs_file.file.read()
-    with open(f"./files/{file_uuid}.{file_extension}", "wb") as f:
-        f.write(docs_contents)
+    if docs_format not in ["docx", "pptx"]:
+        logger.error(pformat(f"Unsupported file format: {docs_format}"))
+        raise HTTPException(status_code=422, detail="Unsupported file format")
+
+    # stream the upload to a temporary file, hashing it on the way
+    temporary_path = f"./files/{file_uuid}.{file_extension}.part"
+    file_hash = await io_executor.run(_store_upload, docs_file.file, temporary_path)
 
-    # files identify
-    if docs_format == "docx":
-        splitted_content = docs_client.document_splitter(
-            f"./files/{file_uuid}.docx", "docx"
+    existing_file = await mysql_client.query_file_by_hash(file_hash, collection)
+    existing_job = ingestion_queue.find_upload(file_hash, collection)
+    if existing_file is not None or existing_job is not None:
+        await io_executor.run(os.remove, temporary_path)
+        logger.info(f"Skipped duplicate upload {filename} of {file_hash}")
+
+        response.status_code = 200
+        return IngestionJobAcceptedModel(
+            status_code=200,
+            file_id=(
+                existing_file.file_id
+                if existing_file is not None
+                else existing_job.file_id  # type: ignore[union-attr]
+            ),
+            job_id=None if existing_job is None else existing_job.job_id,
+            duplicate=True,
         )
-        logger.debug(pformat(splitted_content))
 
-    elif docs_format == "pptx":
-        splitted_content = docs_client.document_splitter(
-            f"./files/{file_uuid}.pptx", "pptx"
+    # a new version of a document of the collection is indexed incrementally
+    previous_file = await mysql_client.query_file_by_name(filename, collection)
+    if previous_file is not None:
+        # claimed before the next await, a concurrent re-upload gets a 409
+        if not ingestion_queue.reserve(previous_file.file_id):
+            await io_executor.run(os.remove, temporary_path)
+            raise HTTPException(status_code=409, detail="Document is being indexed")
+
+        # staged for the job, the stored file keeps matching the indexed chunks
+        job_id = str(uuid.uuid4())
+        staged_path = ingestion_queue.staged_path(
+            previous_file.file_id, job_id, file_extension
         )
-        logger.debug(pformat(splitted_content))
-    else:
-        logger.error(pformat(f"Unsupported file format: {docs_format}"))
-        raise HTTPException(status_code=422, detail="Unsupported file format")
+        try:
+            await io_executor.run(os.replace, temporary_path, staged_path)
+
+            job = await ingestion_queue.submit(
+                file_uuid=previous_file.file_id,
+                filename=filename,
+                tags=file_tags,
+                collection=collection,
+                kind="reindex",
+                file_hash=file_hash,
+                job_id=job_id,
+            )
+        except RuntimeError as error:
+            logger.error(error)
+            await io_executor.run(os.remove, staged_path)
+            raise HTTPException(status_code=500, detail="Internal server error")
+        finally:
+            ingestion_queue.release(previous_file.file_id)
+
+        return IngestionJobAcceptedModel(
+            status_code=202,
+            file_id=previous_file.file_id,
+            job_id=job.job_id,
+            replaced=True,
+        )
+
+    await io_executor.run(
+        os.replace, temporary_path, f"./files/{file_uuid}.{file_extension}"
+    )
 
-    # insert to milvus
-    for sentence in splitted_content:
-        vector = encoder_client.encoder(sentence)
-        insert_info = milvus_client.insert_sentence(
-            docs_filename=filename,
-            vector=vector,
-            content=sentence,
+    try:
+        job = await ingestion_queue.submit(
             file_uuid=file_uuid,
+            filename=filename,
+            tags=file_tags,
             collection=collection,
+            file_hash=file_hash,
         )
+    except RuntimeError as error:
+        logger.error(error)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    return IngestionJobAcceptedModel(
+        status_code=202,
+        file_id=file_uuid,
+        job_id=job.job_id,
+    )
+
+
+@router.get("/documentation/job/{job_id}/", status_code=200)
+async def get_ingestion_job(job_id: str) -> IngestionJobStatusModel:
+    """
+    Report the status, progress and error of an ingestion job.
+
+    Args:
+        job_id (str): The unique identifier of the job.
+
+    Returns:
+        IngestionJobStatusModel: A model containing the status code, the job and
+            the fraction of chunks embedded so far.
+
+    Raises:
+        HTTPException: If the job does not exist.
+    """
+    job = await ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if job.status == "succeeded":
+        progress = 1.0
+    elif job.total_chunks:
+        progress = job.embedded_chunks / job.total_chunks
+    else:
+        progress = 0.0
+
+    return IngestionJobStatusModel(status_code=200, job=job, progress=progress)
+
+
+@router.put("/documentation/{file_uuid}/expire/", status_code=200)
+async def expire_document(file_uuid: str, expired: bool = True) -> DocumentUpdateModel:
+    """
+    Expire a document, or restore an expired one.
+
+    Expired documents keep their vectors but are excluded from retrieval by a
+    filter on `file_uuid`, so restoring them needs no re-indexing.
+
+    Args:
+        file_uuid (str): The unique identifier of the document.
+        expired (bool, optional): False to restore the document. Defaults to True.
+
+    Returns:
+        DocumentUpdateModel: A model containing the status code and the new state of the document.
+
+    Raises:
+        HTTPException: If the document does not exist or the database update fails.
+    """
+    file_record = await mysql_client.query_file(file_uuid)
+    if file_record is None:
+        raise HTTPException(status_code=404, detail="Document not found")
 
-        logger.debug(pformat(insert_info))
+    if not await mysql_client.update_file_expired(file_uuid, expired):
+        raise HTTPException(status_code=500, detail="Internal server error")
 
-    success = mysql_client.insert_file(
-        file_uuid=file_uuid, filename=filename, tags=file_tags, collection=collection
+    expired_documents.mark(file_record.collection, file_uuid, expired)
+    answer_cache.invalidate_collection(file_record.collection)
+
+    return DocumentUpdateModel(status_code=200, file_id=file_uuid, expired=expired)
+
+
+@router.delete("/documentation/{file_uuid}", status_code=200)
+async def delete_document(file_uuid: str) -> DocumentUpdateModel:
+    """
+    Delete the chunks of a document and expire it.
+
+    The file record and the stored file are kept, chat records citing the
+    document still resolve, and re-indexing the document restores it.
+
+    Args:
+        file_uuid (str): The unique identifier of the document.
+
+    Returns:
+        DocumentUpdateModel: A model containing the status code and the number of removed chunks.
+
+    Raises:
+        HTTPException: If the document does not exist, is being indexed, or the
+            database update fails.
+    """
+    file_record = await mysql_client.query_file(file_uuid)
+    if file_record is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    # claimed before the next await, no re-index can start while deleting
+    if not ingestion_queue.reserve(file_uuid):
+        raise HTTPException(status_code=409, detail="Document is being indexed")
+
+    try:
+        if not await mysql_client.delete_file(file_uuid):
+            raise HTTPException(status_code=500, detail="Internal server error")
+
+        # excluded from retrieval before its chunks are removed
+        expired_documents.mark(file_record.collection, file_uuid, True)
+
+        removed_count = await ingestion_queue.remove_document_chunks(
+            file_uuid, file_record.collection
+        )
+    finally:
+        ingestion_queue.release(file_uuid)
+
+    return DocumentUpdateModel(
+        status_code=200,
+        file_id=file_uuid,
+        expired=True,
+        removed_count=removed_count,
     )
 
-    if success:
-        return FileUploadSuccessModel(
-            status_code=200,
-            file_id=file_uuid,
+
+@router.post("/documentation/{file_uuid}/reindex/", status_code=202)
+async def reindex_document(
+    file_uuid: str, docs_file: UploadFile | None = None
+) -> IngestionJobAcceptedModel:
+    """
+    Queue a document to be re-indexed, optionally replacing its content with a new file.
+
+    The ingestion job splits the document again and diffs the chunk content
+    hashes against the indexed chunks: only new chunks are embedded and
+    inserted, and only vanished ones deleted. The job reports the added,
+    removed and unchanged chunk counts. Re-indexing also restores an expired
+    document; other documents of the collection are left untouched. A new file
+    replaces the stored one once the job succeeded.
+
+    Args:
+        file_uuid (str): The unique identifier of the document.
+        docs_file (UploadFile | None, optional): New content of the document, in the
+            same format as the original. Defaults to re-indexing the stored file.
+
+    Returns:
+        IngestionJobAcceptedModel: A model containing the status code, the UUID of the document and the ingestion job id.
+
+    Raises:
+        HTTPException: If the document does not exist or is being indexed, the new
+            file has another format, or the job could not be stored.
+    """
+    file_record = await mysql_client.query_file(file_uuid)
+    if file_record is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    docs_format = json.loads(file_record.tags).get(
+        "docs_format", file_record.file_name.split(".")[-1]
+    )
+    filename = file_record.file_name
+    file_path = f"./files/{file_uuid}.{docs_format}"
+    file_hash = None
+    job_id = str(uuid.uuid4())
+    # a new version is staged for the job, the stored file keeps matching the
+    # indexed chunks until the job succeeded
+    staged_path = ingestion_queue.staged_path(file_uuid, job_id, docs_format)
+
+    if docs_file is not None:
+        filename = str(docs_file.filename)
+        if filename.split(".")[-1] != docs_format:
+            logger.warning(
+                pformat(f"Invalid file type: {filename}, prefer: {docs_format}")
+            )
+            raise HTTPException(status_code=422, detail="Invalid file type")
+
+    # claimed before the next await, a concurrent re-index gets a 409
+    if not ingestion_queue.reserve(file_uuid):
+        raise HTTPException(status_code=409, detail="Document is being indexed")
+
+    try:
+        if docs_file is not None:
+            file_hash = await io_executor.run(
+                _store_upload, docs_file.file, staged_path
+            )
+
+        elif not path.exists(file_path):
+            raise HTTPException(status_code=404, detail="Document file not found")
+
+        job = await ingestion_queue.submit(
+            file_uuid=file_uuid,
+            filename=filename,
+            tags=file_record.tags,
+            collection=file_record.collection,
+            kind="reindex",
+            file_hash=file_hash,
+            job_id=job_id,
         )
+    except RuntimeError as error:
+        logger.error(error)
+        if path.exists(staged_path):
+            await io_executor.run(os.remove, staged_path)
+        raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        ingestion_queue.release(file_uuid)
+
+    return IngestionJobAcceptedModel(
+        status_code=202,
+        file_id=file_uuid,
+        job_id=job.job_id,
+    )
+
+
+def _store_upload(source: BinaryIO, file_path: str) -> str:
+    """copy an upload to disk in chunks, returns the sha256 of its content"""
+    file_hash = hashlib.sha256()
+
+    with open(file_path, "wb") as f:
+        while chunk := source.read(UPLOAD_CHUNK_SIZE):
+            file_hash.update(chunk)
+            f.write(chunk)
 
-    raise HTTPException(status_code=500, detail="Internal server error")
+    return file_hash.hexdigest()
@@ -1,9 +1,13 @@
 # Code by AkinoAlice@TyrantRey
 
 from Backend.api.v1 import authorization, chatroom, documentation
+from Backend.utils.database.write_behind import ChatRecordWriter
+from Backend.utils.RAG.ingestion_queue import IngestionQueue
+from Backend.utils.RAG.lexical_index import LexicalIndex
 from Backend.utils.helper.logger import CustomLoggerHandler
 
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 import os
@@ -17,8 +21,29 @@ if __name__ == "__main__":
 # logging setup
 logger = CustomLoggerHandler(__name__).setup_logging()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    chat_record_writer = ChatRecordWriter()
+    chat_record_writer.start()
+
+    # resumes the ingestion jobs left unfinished by the previous run
+    ingestion_queue = IngestionQueue()
+    await ingestion_queue.start()
+
+    yield
+
+    await ingestion_queue.stop()
+
+    # write the BM25 changes still waiting for their coalesced save
+    LexicalIndex().flush()
+
+    # flush queued chat records before the worker exits
+    await chat_record_writer.stop()
+
+
 # fastapi app setup
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 
 def CORS_environmental_handler(cors_allowed_origin: str) -> list[str]:
@@ -0,0 +1,222 @@
+# Code by AkinoAlice@TyrantRey
+
+from Backend.utils.helper.model.RAG.answer_cache import (
+    CachedAnswerModel,
+    SemanticCacheConfig,
+    SemanticCacheStatsModel,
+)
+from Backend.utils.helper.logger import CustomLoggerHandler
+
+from collections import OrderedDict
+from typing import Literal
+from os import getenv
+
+import numpy as np
+import threading
+import time
+
+CacheScope = tuple[str, str, str]
+
+
+class SemanticAnswerCache(object):
+    """
+    Answer cache keyed by question embedding similarity.
+
+    Entries are grouped by (collection, language, question_type). A lookup
+    returns the cached answer of the most similar question in the same group
+    when its cosine similarity reaches the configured threshold.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SemanticAnswerCache, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self) -> None:
+        self.config = SemanticCacheConfig(
+            similarity_threshold=float(getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+            max_size=int(getenv("SEMANTIC_CACHE_MAX_SIZE", "1024")),
+            ttl=int(getenv("SEMANTIC_CACHE_TTL", "3600")),
+        )
+
+        self.logger = CustomLoggerHandler(__name__).setup_logging()
+
+        self._lock = threading.Lock()
+        self._next_id = 0
+        # entry id -> (scope, expire time, answer), ordered from least to most recently used
+        self._entries: OrderedDict[
+            int, tuple[CacheScope, float, CachedAnswerModel]
+        ] = OrderedDict()
+        # scope -> entry id -> unit vector
+        self._vectors: dict[CacheScope, dict[int, np.ndarray]] = {}
+        # scope -> (entry ids, stacked unit vectors), rebuilt lazily after changes
+        self._matrices: dict[CacheScope, tuple[list[int], np.ndarray]] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.max_size > 0
+
+    def lookup(
+        self,
+        question_vector: np.ndarray,
+        collection: str,
+        language: Literal["ENGLISH", "CHINESE"],
+        question_type: Literal["CHATTING", "TESTING", "THEOREM"],
+    ) -> CachedAnswerModel | None:
+        """
+        Find a cached answer for a similar question.
+
+        Args:
+            question_vector (np.ndarray): Embedding of the question.
+            collection (str): Collection the question was asked against.
+            language (Literal["ENGLISH", "CHINESE"]): Language of the response.
+            question_type (Literal["CHATTING", "TESTING", "THEOREM"]): Type of prompt.
+
+        Returns:
+            CachedAnswerModel | None: The cached answer, or None on a miss.
+        """
+        if not self.enabled:
+            return None
+
+        scope = (collection, language, question_type)
+        unit_vector = self._normalize(question_vector)
+
+        with self._lock:
+            self._evict_expired()
+
+            if scope not in self._vectors:
+                self.misses += 1
+                return None
+
+            if scope not in self._matrices:
+                entry_ids = list(self._vectors[scope])
+                self._matrices[scope] = (
+                    entry_ids,
+                    np.stack([self._vectors[scope][i] for i in entry_ids]),
+                )
+
+            entry_ids, matrix = self._matrices[scope]
+            similarity = matrix @ unit_vector
+            best = int(np.argmax(similarity))
+
+            if similarity[best] < self.config.similarity_threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            entry_id = entry_ids[best]
+            self._entries.move_to_end(entry_id)
+
+            self.logger.debug(
+                f"Semantic cache hit, similarity: {similarity[best]:.4f}, {self.stats()}"
+            )
+            return self._entries[entry_id][2]
+
+    def store(
+        self,
+        question_vector: np.ndarray,
+        collection: str,
+        language: Literal["ENGLISH", "CHINESE"],
+        question_type: Literal["CHATTING", "TESTING", "THEOREM"],
+        answer: CachedAnswerModel,
+    ) -> None:
+        """
+        Cache the answer of a question.
+
+        Args:
+            question_vector (np.ndarray): Embedding of the question.
+            collection (str): Collection the question was asked against.
+            language (Literal["ENGLISH", "CHINESE"]): Language of the response.
+            question_type (Literal["CHATTING", "TESTING", "THEOREM"]): Type of prompt.
+            answer (CachedAnswerModel): The generated answer and its source files.
+        """
+        if not self.enabled:
+            return
+
+        scope = (collection, language, question_type)
+        unit_vector = self._normalize(question_vector)
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+
+            expire_time = (
+                time.monotonic() + self.config.ttl if self.config.ttl else float("inf")
+            )
+            self._entries[entry_id] = (scope, expire_time, answer)
+            self._vectors.setdefault(scope, {})[entry_id] = unit_vector
+            self._matrices.pop(scope, None)
+
+            while len(self._entries) > self.config.max_size:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.evictions += 1
+
+    def invalidate_collection(self, collection: str) -> int:
+        """
+        Drop every cached answer of a collection, e.g. after new documents were added.
+
+        Args:
+            collection (str): Collection name.
+
+        Returns:
+            int: Number of removed entries.
+        """
+        with self._lock:
+            entry_ids = [
+                entry_id
+                for entry_id, (scope, _, _) in self._entries.items()
+                if scope[0] == collection
+            ]
+            for entry_id in entry_ids:
+                self._remove(entry_id)
+
+            self.invalidations += len(entry_ids)
+
+        self.logger.info(
+            f"Invalidated {len(entry_ids)} cached answers of collection `{collection}`"
+        )
+        return len(entry_ids)
+
+    def stats(self) -> SemanticCacheStatsModel:
+        return SemanticCacheStatsModel(
+            size=len(self._entries),
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            invalidations=self.invalidations,
+        )
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        expired_ids = [
+            entry_id
+            for entry_id, (_, expire_time, _) in self._entries.items()
+            if expire_time <= now
+        ]
+        for entry_id in expired_ids:
+            self._remove(entry_id)
+            self.evictions += 1
+
+    def _remove(self, entry_id: int) -> None:
+        scope, _, _ = self._entries.pop(entry_id)
+        scope_vectors = self._vectors[scope]
+        scope_vectors.pop(entry_id)
+        self._matrices.pop(scope, None)
+
+        if not scope_vectors:
+            self._vectors.pop(scope)
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        unit_vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(unit_vector)
+        return unit_vector / norm if norm else unit_vector
@@ -0,0 +1,260 @@
+# Code by AkinoAlice@TyrantRey
+
+from Backend.utils.helper.model.RAG.context_builder import (
+    ContextBudgetConfig,
+    ConversationContextModel,
+)
+from Backend.utils.helper.logger import CustomLoggerHandler
+from Backend.utils.RAG.prompt import PROMPT, SUMMARY_PROMPT
+
+from tokenizers import Tokenizer
+
+from typing import Literal
+from os import getenv
+
+import re
+
+# role, separators and end of turn tokens added by chat templates
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# one token per CJK character, word or punctuation mark
+ESTIMATE_TOKEN_PATTERN = re.compile(
+    r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]"
+    r"|[A-Za-z0-9]+|[^\sA-Za-z0-9]"
+)
+
+
+class TokenCounter(object):
+    """
+    Count tokens with a local tokenizer.
+
+    Loads a Hugging Face `tokenizer.json` from `TOKENIZER_PATH`, or a tokenizer
+    by name from `TOKENIZER_NAME`. Without either, tokens are estimated as one
+    per CJK character, word or punctuation mark.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(TokenCounter, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self) -> None:
+        self.logger = CustomLoggerHandler(__name__).setup_logging()
+        self.tokenizer: Tokenizer | None = None
+
+        _tokenizer_path = getenv("TOKENIZER_PATH")
+        _tokenizer_name = getenv("TOKENIZER_NAME")
+
+        try:
+            if _tokenizer_path:
+                self.tokenizer = Tokenizer.from_file(_tokenizer_path)
+            elif _tokenizer_name:
+                self.tokenizer = Tokenizer.from_pretrained(_tokenizer_name)
+        except Exception as e:
+            self.logger.error(f"Failed to load tokenizer, estimating tokens: {e}")
+
+        if self.tokenizer is None:
+            self.logger.warning("No tokenizer configured, estimating token counts")
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+        return len(ESTIMATE_TOKEN_PATTERN.findall(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """cut a text after its first `max_tokens` tokens"""
+        if max_tokens <= 0:
+            return ""
+
+        if self.tokenizer is not None:
+            offsets = self.tokenizer.encode(text, add_special_tokens=False).offsets
+            if len(offsets) <= max_tokens:
+                return text
+            return text[: offsets[max_tokens - 1][1]]
+
+        for count, match in enumerate(ESTIMATE_TOKEN_PATTERN.finditer(text), start=1):
+            if count == max_tokens:
+                return text[: match.end()]
+
+        return text
+
+    def count_messages(self, messages: list[dict[str, str]]) -> int:
+        return sum(
+            self.count(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+            for message in messages
+        )
+
+
+class ContextBuilder(object):
+    """
+    Assemble the conversation sent to the LLM within a token budget.
+
+    The budget is `LLM_CONTEXT_WINDOW` minus `LLM_MIN_RESPONSE_TOKENS`. When the
+    prompt does not fit, the oldest history turns are dropped first, then the
+    lowest ranked documents.
+    """
+
+    def __init__(self) -> None:
+        self.config = ContextBudgetConfig(
+            context_window=int(getenv("LLM_CONTEXT_WINDOW", "8192")),
+            min_response_tokens=int(getenv("LLM_MIN_RESPONSE_TOKENS", "1024")),
+        )
+
+        assert (
+            self.config.context_window > self.config.min_response_tokens
+        ), "LLM_CONTEXT_WINDOW must be larger than LLM_MIN_RESPONSE_TOKENS"
+
+        self.logger = CustomLoggerHandler(__name__).setup_logging()
+        self.token_counter = TokenCounter()
+
+    @property
+    def prompt_budget(self) -> int:
+        return self.config.context_window - self.config.min_response_tokens
+
+    def build(
+        self,
+        queried_document: list[str],
+        chat_history: list[str],
+        language: Literal["ENGLISH", "CHINESE"] = "CHINESE",
+        question_type: Literal["CHATTING", "TESTING", "THEOREM"] = "CHATTING",
+        max_tokens: int = 8192,
+        summary: str = "",
+    ) -> ConversationContextModel:
+        """
+        Build the conversation messages within the prompt token budget.
+
+        Args:
+            queried_document (list[str]): Retrieved documents, best ranked first.
+            chat_history (list[str]): Alternating user questions and answers,
+                ending with the current question.
+            language (Literal["ENGLISH", "CHINESE"], optional): Language for the response. Defaults to "CHINESE".
+            question_type (Literal["CHATTING", "TESTING", "THEOREM"], optional): Type of prompt to generate. Defaults to "CHATTING".
+            max_tokens (int, optional): Requested maximum response tokens. Defaults to 8192.
+            summary (str, optional): Rolling summary of turns older than `chat_history`. Defaults to "".
+
+        Returns:
+            ConversationContextModel: The conversation, its planned prompt token
+                count, the response tokens left in the context window and the
+                number of dropped turns and documents.
+        """
+        prompt = PROMPT[language][question_type]
+
+        leading_messages = [
+            {
+                "role": "system",
+                "content": prompt["system"],
+            },
+            {
+                "role": "assistant",
+                "content": prompt["assistant"],
+            },
+        ]
+        if summary:
+            leading_messages.append(
+                {
+                    "role": "system",
+                    "content": SUMMARY_PROMPT[language]["history"].format(
+                        summary=summary
+                    ),
+                }
+            )
+        fixed_tokens = self.token_counter.count_messages(leading_messages)
+
+        # first question = user question, second = RAG response, so on
+        history = chat_history[:-1]
+        history_tokens = [
+            self.token_counter.count(chats) + MESSAGE_OVERHEAD_TOKENS
+            for chats in history
+        ]
+        document_tokens = [
+            self.token_counter.count(document) + 1 for document in queried_document
+        ]
+        question = chat_history[-1]
+        question_tokens = (
+            self.token_counter.count(
+                prompt["user"].format(question=question, search_documents="")
+            )
+            + MESSAGE_OVERHEAD_TOKENS
+        )
+
+        # drop the oldest turns, then the lowest ranked documents
+        kept_history_from = 0
+        kept_documents = len(queried_document)
+        total_tokens = (
+            fixed_tokens + sum(history_tokens) + sum(document_tokens) + question_tokens
+        )
+
+        while total_tokens > self.prompt_budget and kept_history_from < len(history):
+            total_tokens -= history_tokens[kept_history_from]
+            kept_history_from += 1
+
+        # keep user/assistant alternation, history must start with a question
+        if kept_history_from % 2 == 1 and kept_history_from < len(history):
+            total_tokens -= history_tokens[kept_history_from]
+            kept_history_from += 1
+
+        while total_tokens > self.prompt_budget and kept_documents > 0:
+            kept_documents -= 1
+            total_tokens -= document_tokens[kept_documents]
+
+        # the response still needs `min_response_tokens`, cut the question
+        if total_tokens > self.prompt_budget:
+            self.logger.warning(
+                f"Question alone exceeds the prompt budget, truncating it: {total_tokens} > {self.prompt_budget}"
+            )
+            question = self.token_counter.truncate(
+                question,
+                self.token_counter.count(question)
+                - (total_tokens - self.prompt_budget),
+            )
+
+            truncated_question_tokens = (
+                self.token_counter.count(
+                    prompt["user"].format(question=question, search_documents="")
+                )
+                + MESSAGE_OVERHEAD_TOKENS
+            )
+            total_tokens += truncated_question_tokens - question_tokens
+
+        conversation_messages = list(leading_messages)
+        for i, chats in enumerate(history[kept_history_from:], start=kept_history_from):
+            conversation_messages.append(
+                {
+                    "role": "user" if i % 2 == 0 else "assistant",
+                    "content": chats,
+                }
+            )
+
+        conversation_messages.append(
+            {
+                "role": "user",
+                "content": prompt["user"].format(
+                    question=question,
+                    search_documents="\n".join(queried_document[:kept_documents]),
+                ),
+            }
+        )
+
+        context = ConversationContextModel(
+            conversation=conversation_messages,
+            prompt_tokens=total_tokens,
+            # never more than the context window holds after the prompt
+            max_tokens=max(
+                min(max_tokens, self.config.context_window - total_tokens), 0
+            ),
+            dropped_turns=kept_history_from,
+            dropped_documents=len(queried_document) - kept_documents,
+        )
+
+        self.logger.debug(
+            f"Planned prompt tokens: {context.prompt_tokens}, max tokens: {context.max_tokens}, "
+            f"dropped turns: {context.dropped_turns}, dropped documents: {context.dropped_documents}"
+        )
+        return context
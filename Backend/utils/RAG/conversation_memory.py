@@ -0,0 +1,191 @@
+# Code by AkinoAlice@TyrantRey
+
+from Backend.utils.helper.model.RAG.conversation_memory import (
+    ConversationMemoryConfig,
+    ConversationStateModel,
+    ConversationTurnModel,
+)
+from Backend.utils.database.write_behind import ChatRecordWriter
+from Backend.utils.database.database import AsyncMySQLHandler
+from Backend.utils.RAG.response_handler import ResponseHandler
+from Backend.utils.helper.logger import CustomLoggerHandler
+
+from collections import OrderedDict
+from typing import Literal
+from os import getenv
+
+import asyncio
+
+
+class ConversationMemory(object):
+    """
+    Server-side history of recent conversations.
+
+    Conversations are rebuilt from the `qa` table by `chat_id` and kept in an
+    LRU. Once a conversation has more than `CONVERSATION_SUMMARY_AFTER` turns,
+    all but the last `CONVERSATION_KEEP_TURNS` turns are condensed into a rolling
+    summary in the background, so the prompt stays the same size as the
+    conversation grows.
+    """
+
+    def __init__(self, response_handler: ResponseHandler) -> None:
+        self.config = ConversationMemoryConfig(
+            max_size=int(getenv("CONVERSATION_MEMORY_SIZE", "1024")),
+            summary_after=int(getenv("CONVERSATION_SUMMARY_AFTER", "6")),
+            keep_turns=int(getenv("CONVERSATION_KEEP_TURNS", "4")),
+            max_load_turns=int(getenv("CONVERSATION_MAX_LOAD_TURNS", "50")),
+        )
+
+        assert self.config.max_size >= 1, "CONVERSATION_MEMORY_SIZE must be positive"
+        assert (
+            0 <= self.config.keep_turns < self.config.summary_after
+        ), "CONVERSATION_KEEP_TURNS must be smaller than CONVERSATION_SUMMARY_AFTER"
+
+        self.logger = CustomLoggerHandler(__name__).setup_logging()
+        self.response_handler = response_handler
+        self.mysql_client = AsyncMySQLHandler()
+        self.chat_record_writer = ChatRecordWriter()
+
+        self._conversations: OrderedDict[str, ConversationStateModel] = OrderedDict()
+        self._summarizing: dict[str, asyncio.Task] = {}
+
+    async def get(
+        self, chat_id: str, language: Literal["ENGLISH", "CHINESE"] = "CHINESE"
+    ) -> ConversationStateModel:
+        """
+        Get the conversation of a chat, loading it from the database on a miss.
+
+        Args:
+            chat_id (str): The unique identifier for the chat session.
+            language (Literal["ENGLISH", "CHINESE"], optional): Language of the summary. Defaults to "CHINESE".
+
+        Returns:
+            ConversationStateModel: The unsummarized turns and the rolling summary.
+        """
+        state = self._conversations.get(chat_id)
+        if state is not None:
+            self._conversations.move_to_end(chat_id)
+            return state
+
+        chat_history = await self.mysql_client.query_chat_history(
+            chat_id, self.config.max_load_turns
+        )
+        turns = [
+            ConversationTurnModel(question=turn["question"], answer=turn["answer"])
+            for turn in chat_history
+        ]
+
+        # records still in the write-behind queue are not in the table yet, a
+        # record committed since is matched by id, not by its (repeatable) text
+        loaded_qa_ids = {turn["qa_id"] for turn in chat_history}
+        for record in self.chat_record_writer.pending_records(chat_id):
+            if record.qa_id not in loaded_qa_ids:
+                turns.append(
+                    ConversationTurnModel(question=record.question, answer=record.answer)
+                )
+
+        # another request may have loaded the chat in the meantime
+        state = self._conversations.get(chat_id)
+        if state is None:
+            state = ConversationStateModel(turns=turns[-self.config.max_load_turns :])
+            self._store(chat_id, state)
+            self._schedule_summary(chat_id, state, language)
+
+        return state
+
+    def history(self, state: ConversationStateModel, question: str) -> list[str]:
+        """
+        Flatten the unsummarized turns and the new question for `ContextBuilder`.
+
+        Args:
+            state (ConversationStateModel): The conversation.
+            question (str): The current question.
+
+        Returns:
+            list[str]: Alternating questions and answers, ending with `question`.
+        """
+        chat_history = []
+        for turn in state.turns:
+            chat_history.extend((turn.question, turn.answer))
+        chat_history.append(question)
+
+        return chat_history
+
+    def append_turn(
+        self,
+        chat_id: str,
+        question: str,
+        answer: str,
+        language: Literal["ENGLISH", "CHINESE"] = "CHINESE",
+    ) -> None:
+        """
+        Add an answered question to the conversation.
+
+        Args:
+            chat_id (str): The unique identifier for the chat session.
+            question (str): The question.
+            answer (str): The generated answer.
+            language (Literal["ENGLISH", "CHINESE"], optional): Language of the summary. Defaults to "CHINESE".
+        """
+        state = self._conversations.get(chat_id)
+        if state is None:
+            state = ConversationStateModel()
+            self._store(chat_id, state)
+        else:
+            self._conversations.move_to_end(chat_id)
+
+        state.turns.append(ConversationTurnModel(question=question, answer=answer))
+        self._schedule_summary(chat_id, state, language)
+
+    def _store(self, chat_id: str, state: ConversationStateModel) -> None:
+        self._conversations[chat_id] = state
+        while len(self._conversations) > self.config.max_size:
+            self._conversations.popitem(last=False)
+
+    def _schedule_summary(
+        self,
+        chat_id: str,
+        state: ConversationStateModel,
+        language: Literal["ENGLISH", "CHINESE"],
+    ) -> None:
+        if len(state.turns) <= self.config.summary_after:
+            return
+
+        task = self._summarizing.get(chat_id)
+        if task is not None and not task.done():
+            return
+
+        task = asyncio.create_task(self._summarize(chat_id, state, language))
+        self._summarizing[chat_id] = task
+        task.add_done_callback(lambda _: self._summarizing.pop(chat_id, None))
+
+    async def _summarize(
+        self,
+        chat_id: str,
+        state: ConversationStateModel,
+        language: Literal["ENGLISH", "CHINESE"],
+    ) -> None:
+        condensed = len(state.turns) - self.config.keep_turns
+        conversation = []
+        for turn in state.turns[:condensed]:
+            conversation.extend((turn.question, turn.answer))
+
+        try:
+            summary = await self.response_handler.async_summarize(
+                conversation=conversation,
+                summary=state.summary,
+                language=language,
+            )
+        except Exception as error:
+            # keep the turns, the next answered question retries
+            self.logger.error(f"Failed to summarize chat {chat_id}: {error}")
+            return
+
+        if not summary:
+            self.logger.warning(f"Empty summary for chat {chat_id}")
+            return
+
+        # turns answered while summarizing were appended after `condensed`
+        state.summary = summary
+        del state.turns[:condensed]
+        self.logger.debug(f"Summarized {condensed} turns of chat {chat_id}")
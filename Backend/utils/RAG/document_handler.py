@@ -1,6 +1,11 @@
 # Code by AkinoAlice@TyrantRey
 
+from Backend.utils.helper.model.RAG.document_handler import (
+    DocumentSplitterConfig,
+    DocumentChunkModel,
+)
 from Backend.utils.helper.error import FormatError, UnsupportedFileFormat
+from Backend.utils.RAG.context_builder import TokenCounter
 
 from unstructured.partition.pptx import partition_pptx
 from unstructured.partition.docx import partition_docx
@@ -9,37 +14,97 @@ from unstructured.partition.doc import partition_doc
 from unstructured.partition.pdf import partition_pdf
 
 from typing import Optional, Literal
+from os import getenv
+
+import re
+
+# Chinese and Japanese characters and full width punctuation, written without
+# spaces in between
+WIDE_CHARACTERS = (
+    r"\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff"
+    r"\uf900-\ufaff\uff00-\uffef"
+)
+WIDE_CHARACTER_PATTERN = re.compile(rf"[{WIDE_CHARACTERS}]")
+WIDE_SPACE_PATTERN = re.compile(rf"(?<=[{WIDE_CHARACTERS}])\s+(?=[{WIDE_CHARACTERS}])")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# full width marks end a sentence on their own, Latin ones before whitespace
+# so that decimals and versions (3.14, v1.2) are not split
+SENTENCE_BOUNDARY_PATTERN = re.compile(r"(?<=[。！？；])\s*|(?<=[.!?])\s+")
+
+# a sentence without any letter (page numbers, bullets, rules) is dropped
+LETTER_PATTERN = re.compile(r"[^\W\d_]")
+
+# pieces of a sentence longer than a chunk: one CJK character or one word
+UNIT_PATTERN = re.compile(rf"[{WIDE_CHARACTERS}]|[^\s{WIDE_CHARACTERS}]+\s*")
+
+
+def join_sentences(left: str, right: str) -> str:
+    """
+    Join two sentences, with a space unless either side is CJK.
+
+    Args:
+        left (str): The leading text.
+        right (str): The following text.
+
+    Returns:
+        str: The joined text.
+    """
+    if not left or not right:
+        return left + right
+
+    if WIDE_CHARACTER_PATTERN.match(left[-1]) or WIDE_CHARACTER_PATTERN.match(right[0]):
+        return left + right
+
+    return f"{left} {right}"
 
 
 class DocumentSplitter(object):
-    def __init__(self) -> None: ...
+    """
+    Split documents into chunks of about `CHUNK_TOKENS` tokens.
+
+    Text is split into sentences on 。！？；.!? and element boundaries, then
+    sentences are packed into chunks, each starting with up to
+    `CHUNK_OVERLAP_TOKENS` tokens of the previous chunk.
+    """
+
+    def __init__(self) -> None:
+        self.config = DocumentSplitterConfig(
+            chunk_tokens=int(getenv("CHUNK_TOKENS", "256")),
+            overlap_tokens=int(getenv("CHUNK_OVERLAP_TOKENS", "32")),
+            min_chunk_tokens=int(getenv("CHUNK_MIN_TOKENS", "8")),
+            max_chunk_bytes=int(getenv("CHUNK_MAX_BYTES", "4096")),
+        )
+
+        assert (
+            self.config.chunk_tokens > self.config.overlap_tokens
+        ), "CHUNK_TOKENS must be larger than CHUNK_OVERLAP_TOKENS"
+
+        self.token_counter = TokenCounter()
 
     def document_splitter(
         self,
         document_path: str,
         file_type: Literal["pptx", "docx", "ppt", "doc", "pdf"],
-    ) -> list[str]:
+    ) -> list[DocumentChunkModel]:
         """
-        Split a document into a list of content strings.
+        Split a document into chunks.
 
         This method takes a document path and its file type, verifies the file extension,
-        extracts the content using the appropriate partition function, and then processes
-        the extracted content into a list of strings.
+        extracts the content using the appropriate partition function, and then packs
+        the sentences of the extracted content into chunks.
 
         Args:
             document_path (str): The path to the document file.
             file_type (Literal["pptx", "docx", "ppt", "doc", "pdf"]): The type of the document file.
 
         Returns:
-            list[str]: A list of strings, each representing a portion of the document's content.
+            list[DocumentChunkModel]: The chunks in document order, with their page or
+                slide numbers and ordinal.
 
         Raises:
             FormatError: If the document's extension doesn't match the specified file_type.
             UnsupportedFileFormat: If the specified file_type is not supported.
-
-        Note:
-            The method removes all newlines and spaces from the extracted content and
-            splits it into sentences using the '。' character as a delimiter.
         """
 
         document_extension = document_path.split(".")[-1]
@@ -67,12 +132,168 @@ class DocumentSplitter(object):
             # TO BE COMPLETED: Implement other file types (e.g., txt, jpg, png) splitters here.
             raise UnsupportedFileFormat(file_type)
 
-        extracted_page = list(filter(lambda x: str(x) != "", extracted_page))
-        splitted_page_content = "".join(
-            [
-                str(page_content).replace("\n", "").replace(" ", "")
-                for page_content in extracted_page
-            ]
-        ).split("。")
+        sentences = [
+            (getattr(element.metadata, "page_number", None), sentence)
+            for element in extracted_page
+            for sentence in self.split_sentences(str(element))
+        ]
+
+        return self.chunk_sentences(sentences)
+
+    def split_sentences(self, text: str) -> list[str]:
+        """
+        Normalize whitespace and split text into sentences.
+
+        Whitespace between CJK characters is removed, other runs of whitespace
+        become one space. Sentences without any letter are dropped.
+
+        Args:
+            text (str): Text of one document element.
+
+        Returns:
+            list[str]: The sentences of the text.
+        """
+        text = WHITESPACE_PATTERN.sub(" ", WIDE_SPACE_PATTERN.sub("", text)).strip()
+
+        return [
+            sentence.strip()
+            for sentence in SENTENCE_BOUNDARY_PATTERN.split(text)
+            if LETTER_PATTERN.search(sentence)
+        ]
+
+    def chunk_sentences(
+        self, sentences: list[tuple[Optional[int], str]]
+    ) -> list[DocumentChunkModel]:
+        """
+        Pack sentences into overlapping chunks.
+
+        A chunk ends before the sentence that would exceed `chunk_tokens` or
+        `max_chunk_bytes`; sentences longer than a chunk are split into words or
+        characters first. A last chunk under `min_chunk_tokens` is merged into the
+        previous one.
+
+        Args:
+            sentences (list[tuple[Optional[int], str]]): The page number and text of
+                each sentence, in document order.
+
+        Returns:
+            list[DocumentChunkModel]: The chunks.
+        """
+        # (page, text, tokens, bytes) of the sentences in the current chunk
+        window: list[tuple[Optional[int], str, int, int]] = []
+        # sentences of the window not already in the previous chunk
+        new_sentences = 0
+        windows: list[list[tuple[Optional[int], str, int, int]]] = []
+
+        for page, sentence in sentences:
+            for text, tokens in self._split_long_sentence(sentence):
+                # one separator per sentence at most
+                size = len(text.encode()) + 1
+
+                if new_sentences and not self._fits(window, tokens, size):
+                    windows.append(window)
+
+                    window = self._overlap(window)
+                    new_sentences = 0
+
+                # the overlap must leave room for the sentence
+                while window and not self._fits(window, tokens, size):
+                    window = window[1:]
+
+                window.append((page, text, tokens, size))
+                new_sentences += 1
+
+        if new_sentences:
+            tail = window[len(window) - new_sentences :]
+            merged = windows[-1] + tail if windows else tail
+
+            if (
+                windows
+                and sum(item[2] for item in tail) < self.config.min_chunk_tokens
+                and sum(item[3] for item in merged) <= self.config.max_chunk_bytes
+            ):
+                windows[-1] = merged
+            else:
+                windows.append(window)
+
+        chunks = []
+        for ordinal, chunk_window in enumerate(windows):
+            content = ""
+            for _, text, _, _ in chunk_window:
+                content = join_sentences(content, text)
+
+            pages = [page for page, _, _, _ in chunk_window if page is not None]
+            chunks.append(
+                DocumentChunkModel(
+                    content=content,
+                    page=pages[0] if pages else None,
+                    end_page=pages[-1] if pages else None,
+                    ordinal=ordinal,
+                    tokens=sum(item[2] for item in chunk_window),
+                )
+            )
+
+        return chunks
+
+    def _fits(
+        self,
+        window: list[tuple[Optional[int], str, int, int]],
+        tokens: int,
+        size: int,
+    ) -> bool:
+        return (
+            sum(item[2] for item in window) + tokens <= self.config.chunk_tokens
+            and sum(item[3] for item in window) + size <= self.config.max_chunk_bytes
+        )
+
+    def _overlap(
+        self, window: list[tuple[Optional[int], str, int, int]]
+    ) -> list[tuple[Optional[int], str, int, int]]:
+        overlap_tokens = 0
+        start = len(window)
+
+        while start > 0 and (
+            overlap_tokens + window[start - 1][2] <= self.config.overlap_tokens
+        ):
+            start -= 1
+            overlap_tokens += window[start][2]
+
+        return window[start:]
+
+    def _split_long_sentence(self, sentence: str) -> list[tuple[str, int]]:
+        tokens = self.token_counter.count(sentence)
+        if (
+            tokens <= self.config.chunk_tokens
+            and len(sentence.encode()) < self.config.max_chunk_bytes
+        ):
+            return [(sentence, tokens)]
+
+        # one UTF-8 character is at most 4 bytes
+        max_characters = max(1, (self.config.max_chunk_bytes - 1) // 4)
+        units = [
+            unit[start : start + max_characters]
+            for unit in UNIT_PATTERN.findall(sentence)
+            for start in range(0, len(unit), max_characters)
+        ]
+
+        pieces: list[tuple[str, int]] = []
+        piece = ""
+        piece_tokens = 0
+        for unit in units:
+            unit_tokens = self.token_counter.count(unit)
+
+            if piece and (
+                piece_tokens + unit_tokens > self.config.chunk_tokens
+                or len((piece + unit).encode()) >= self.config.max_chunk_bytes
+            ):
+                pieces.append((piece.strip(), piece_tokens))
+                piece = ""
+                piece_tokens = 0
+
+            piece += unit
+            piece_tokens += unit_tokens
+
+        if piece.strip():
+            pieces.append((piece.strip(), piece_tokens))
 
-        return splitted_page_content
+        return pieces
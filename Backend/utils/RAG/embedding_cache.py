@@ -0,0 +1,277 @@
+# Code by AkinoAlice@TyrantRey
+
+from Backend.utils.helper.model.RAG.embedding_cache import (
+    EmbeddingCacheConfig,
+    EmbeddingCacheStatsModel,
+)
+from Backend.utils.helper.executor import io_executor
+from Backend.utils.helper.logger import CustomLoggerHandler
+
+from collections import OrderedDict
+from os import getenv, path
+
+import numpy as np
+import unicodedata
+import threading
+import hashlib
+import sqlite3
+import re
+
+
+class EmbeddingCache(object):
+    """
+    Embedding cache keyed by (model name, normalized text hash).
+
+    Vectors are kept as float32 in an in-process LRU. When `EMBEDDING_CACHE_PATH`
+    is set, they are also written to a SQLite file so the cache survives restarts.
+    The async methods only touch the LRU on the event loop and run SQLite reads
+    and writes on the io executor.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(EmbeddingCache, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self) -> None:
+        self.config = EmbeddingCacheConfig(
+            max_size=int(getenv("EMBEDDING_CACHE_SIZE", "4096")),
+            database_path=getenv("EMBEDDING_CACHE_PATH", ""),
+        )
+
+        self.logger = CustomLoggerHandler(__name__).setup_logging()
+
+        # the LRU is used on the event loop, SQLite on the io executor, so they
+        # have separate locks and a slow commit never blocks a memory lookup
+        self._lock = threading.Lock()
+        self._database_lock = threading.Lock()
+        self._vectors: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        self.connection: sqlite3.Connection | None = None
+        if self.config.database_path:
+            self._setup_database(self.config.database_path)
+
+    def _setup_database(self, database_path: str) -> None:
+        database_directory = path.dirname(database_path)
+        assert not database_directory or path.isdir(
+            database_directory
+        ), f"EMBEDDING_CACHE_PATH directory {database_directory} does not exist"
+
+        self.connection = sqlite3.connect(database_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS `embedding` (
+                `model_name` TEXT NOT NULL,
+                `text_hash` TEXT NOT NULL,
+                `vector` BLOB NOT NULL,
+                PRIMARY KEY (`model_name`, `text_hash`)
+            )
+            """
+        )
+        self.connection.commit()
+
+        self.logger.info(f"Using embedding cache database {database_path}")
+
+    def get(self, model_name: str, text: str) -> np.ndarray | None:
+        """
+        Get the cached embedding of a text.
+
+        Args:
+            model_name (str): Name of the embedding model.
+            text (str): Text that was embedded.
+
+        Returns:
+            np.ndarray | None: float32 vector, or None if it is not cached.
+        """
+        return self.get_many(model_name, [text])[0]
+
+    async def async_get(self, model_name: str, text: str) -> np.ndarray | None:
+        """Non-blocking version of `get`, SQLite is read on the io executor."""
+        return (await self.async_get_many(model_name, [text]))[0]
+
+    def put(self, model_name: str, text: str, vector: np.ndarray) -> np.ndarray:
+        """
+        Cache the embedding of a text.
+
+        Args:
+            model_name (str): Name of the embedding model.
+            text (str): Text that was embedded.
+            vector (np.ndarray): Embedding of the text.
+
+        Returns:
+            np.ndarray: The cached float32 vector.
+        """
+        return self.put_many(model_name, [text], np.asarray([vector]))[0]
+
+    async def async_put(
+        self, model_name: str, text: str, vector: np.ndarray
+    ) -> np.ndarray:
+        """Non-blocking version of `put`, SQLite is written on the io executor."""
+        return (await self.async_put_many(model_name, [text], np.asarray([vector])))[0]
+
+    def get_many(self, model_name: str, texts: list[str]) -> list[np.ndarray | None]:
+        """
+        Get the cached embeddings of many texts.
+
+        Args:
+            model_name (str): Name of the embedding model.
+            texts (list[str]): Texts that were embedded.
+
+        Returns:
+            list[np.ndarray | None]: float32 vector of each text, None if it is not cached.
+        """
+        keys = [(model_name, self.text_hash(text)) for text in texts]
+        vectors = self._recall(keys)
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing and self.connection is not None:
+            loaded = self._load([keys[i] for i in missing])
+            for i, vector in zip(missing, loaded):
+                vectors[i] = vector
+
+        self._count(vectors)
+        return vectors
+
+    def put_many(
+        self, model_name: str, texts: list[str], vectors: np.ndarray
+    ) -> list[np.ndarray]:
+        """
+        Cache the embeddings of many texts, written to SQLite in one transaction.
+
+        Args:
+            model_name (str): Name of the embedding model.
+            texts (list[str]): Texts that were embedded.
+            vectors (np.ndarray): One embedding per text.
+
+        Returns:
+            list[np.ndarray]: The cached float32 vectors.
+        """
+        keys, cached_vectors = self._remember_many(model_name, texts, vectors)
+
+        if self.connection is not None:
+            self._store(keys, cached_vectors)
+
+        return cached_vectors
+
+    async def async_get_many(
+        self, model_name: str, texts: list[str]
+    ) -> list[np.ndarray | None]:
+        """Non-blocking version of `get_many`, SQLite is read on the io executor."""
+        keys = [(model_name, self.text_hash(text)) for text in texts]
+        vectors = self._recall(keys)
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing and self.connection is not None:
+            loaded = await io_executor.run(self._load, [keys[i] for i in missing])
+            for i, vector in zip(missing, loaded):
+                vectors[i] = vector
+
+        self._count(vectors)
+        return vectors
+
+    async def async_put_many(
+        self, model_name: str, texts: list[str], vectors: np.ndarray
+    ) -> list[np.ndarray]:
+        """Non-blocking version of `put_many`, SQLite is written on the io executor."""
+        keys, cached_vectors = self._remember_many(model_name, texts, vectors)
+
+        if self.connection is not None:
+            await io_executor.run(self._store, keys, cached_vectors)
+
+        return cached_vectors
+
+    def stats(self) -> EmbeddingCacheStatsModel:
+        return EmbeddingCacheStatsModel(
+            size=len(self._vectors),
+            hits=self.hits,
+            misses=self.misses,
+        )
+
+    def _recall(self, keys: list[tuple[str, str]]) -> list[np.ndarray | None]:
+        """vectors of the in-memory LRU, cheap enough for the event loop"""
+        with self._lock:
+            vectors: list[np.ndarray | None] = []
+            for key in keys:
+                vector = self._vectors.get(key)
+                if vector is not None:
+                    self._vectors.move_to_end(key)
+                vectors.append(vector)
+
+        return vectors
+
+    def _count(self, vectors: list[np.ndarray | None]) -> None:
+        with self._lock:
+            hits = sum(vector is not None for vector in vectors)
+            self.hits += hits
+            self.misses += len(vectors) - hits
+
+    def _remember_many(
+        self, model_name: str, texts: list[str], vectors: np.ndarray
+    ) -> tuple[list[tuple[str, str]], list[np.ndarray]]:
+        keys = [(model_name, self.text_hash(text)) for text in texts]
+        cached_vectors = []
+        for vector in vectors:
+            vector = np.array(vector, dtype=np.float32)
+            # cached vectors are shared between callers
+            vector.setflags(write=False)
+            cached_vectors.append(vector)
+
+        with self._lock:
+            for key, vector in zip(keys, cached_vectors):
+                self._remember(key, vector)
+
+        return keys, cached_vectors
+
+    def _load(self, keys: list[tuple[str, str]]) -> list[np.ndarray | None]:
+        """read vectors from SQLite into the LRU, blocking"""
+        assert self.connection is not None
+
+        vectors: list[np.ndarray | None] = []
+        with self._database_lock:
+            for key in keys:
+                row = self.connection.execute(
+                    "SELECT `vector` FROM `embedding` WHERE `model_name` = ? AND `text_hash` = ?",
+                    key,
+                ).fetchone()
+                vectors.append(
+                    None if not row else np.frombuffer(row[0], dtype=np.float32)
+                )
+
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                if vector is not None:
+                    self._remember(key, vector)
+
+        return vectors
+
+    def _store(
+        self, keys: list[tuple[str, str]], vectors: list[np.ndarray]
+    ) -> None:
+        """write vectors to SQLite in one transaction, blocking"""
+        assert self.connection is not None
+
+        with self._database_lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO `embedding` (`model_name`, `text_hash`, `vector`) VALUES (?, ?, ?)",
+                [(*key, vector.tobytes()) for key, vector in zip(keys, vectors)],
+            )
+            self.connection.commit()
+
+    def _remember(self, key: tuple[str, str], vector: np.ndarray) -> None:
+        self._vectors[key] = vector
+        self._vectors.move_to_end(key)
+
+        while len(self._vectors) > self.config.max_size:
+            self._vectors.popitem(last=False)
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """sha256 of the NFKC normalized text with collapsed whitespace"""
+        normalized_text = re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text))
+        return hashlib.sha256(normalized_text.strip().encode("utf-8")).hexdigest()
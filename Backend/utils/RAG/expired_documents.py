@@ -0,0 +1,75 @@
+# Code by AkinoAlice@TyrantRey
+
+from Backend.utils.database.database import AsyncMySQLHandler
+from Backend.utils.helper.logger import CustomLoggerHandler
+
+import asyncio
+
+
+class ExpiredDocuments(object):
+    """
+    The expired documents of each collection, excluded from retrieval.
+
+    Loaded from the `expired` column of the `file` table on first use and kept in
+    sync by the documentation endpoints, so searches never wait on MySQL.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ExpiredDocuments, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self) -> None:
+        self.logger = CustomLoggerHandler(__name__).setup_logging()
+        self.mysql_client = AsyncMySQLHandler()
+
+        self._expired: dict[str, set[str]] = {}
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    async def file_uuids(self, collection: str) -> list[str]:
+        """
+        Get the expired documents of a collection.
+
+        Args:
+            collection (str): Collection name.
+
+        Returns:
+            list[str]: The file_uuid of each expired document.
+        """
+        if not self._loaded:
+            await self._load()
+
+        return list(self._expired.get(collection, ()))
+
+    def mark(self, collection: str, file_uuid: str, expired: bool) -> None:
+        """
+        Record that a document was expired or restored.
+
+        Args:
+            collection (str): Collection of the document.
+            file_uuid (str): Unique identifier of the document.
+            expired (bool): True if the document is expired.
+        """
+        if expired:
+            self._expired.setdefault(collection, set()).add(file_uuid)
+        else:
+            self._expired.get(collection, set()).discard(file_uuid)
+
+    async def _load(self) -> None:
+        async with self._load_lock:
+            if self._loaded:
+                return
+
+            for file_record in await self.mysql_client.query_expired_files():
+                self._expired.setdefault(file_record.collection, set()).add(
+                    file_record.file_id
+                )
+
+            self._loaded = True
+            self.logger.info(
+                f"Loaded expired documents: { {collection: len(file_uuids) for collection, file_uuids in self._expired.items()} }"
+            )
@@ -0,0 +1,156 @@
+# Code by AkinoAlice@TyrantRey
+
+from Backend.utils.helper.model.database.vector_database import (
+    BatchSearchSimilarityModel,
+    SearchSimilarityModel,
+)
+from Backend.utils.helper.model.RAG.hybrid_retriever import HybridRetrieverConfig
+from Backend.utils.database.vector_store import (
+    reciprocal_rank_fusion,
+    get_vector_store,
+)
+from Backend.utils.RAG.expired_documents import ExpiredDocuments
+from Backend.utils.RAG.lexical_index import LexicalIndex
+from Backend.utils.helper.logger import CustomLoggerHandler
+
+from pprint import pformat
+from os import getenv
+
+import numpy as np
+
+
+class HybridRetriever(object):
+    """
+    Retrieve chunks with both the vector store (dense) and BM25 (lexical) search.
+
+    Both searches return `HYBRID_CANDIDATE_LIMIT` candidates, which are fused
+    with reciprocal rank fusion into the best `HYBRID_SEARCH_LIMIT` chunks.
+    Expired documents are filtered out by both searches.
+    """
+
+    def __init__(self) -> None:
+        self.config = HybridRetrieverConfig(
+            limit=int(getenv("HYBRID_SEARCH_LIMIT", "3")),
+            candidate_limit=int(getenv("HYBRID_CANDIDATE_LIMIT", "10")),
+            rrf_k=int(getenv("HYBRID_RRF_K", "60")),
+        )
+
+        self.logger = CustomLoggerHandler(__name__).setup_logging()
+        self.vector_store = get_vector_store()
+        self.lexical_index = LexicalIndex()
+        self.expired_documents = ExpiredDocuments()
+
+    async def search(
+        self,
+        question: str,
+        question_vector: np.ndarray,
+        collection: str = "default",
+        file_uuids: list[str] | None = None,
+    ) -> list[SearchSimilarityModel]:
+        """
+        Search a collection for the chunks relevant to a question.
+
+        Args:
+            question (str): Question text, used for the lexical search.
+            question_vector (np.ndarray): Question embedding, used for the dense search.
+            collection (str, optional): Collection name. Defaults to "default".
+            file_uuids (list[str] | None, optional): Only search the chunks of these
+                documents. Defaults to every document.
+
+        Returns:
+            list[SearchSimilarityModel]: Relevant chunks, best first.
+        """
+        expired_file_uuids = await self.expired_documents.file_uuids(collection)
+
+        dense_result = await self.vector_store.async_search_similarity(
+            question_vector,
+            collection_name=collection,
+            limit=self.config.candidate_limit,
+            file_uuids=file_uuids,
+            exclude_file_uuids=expired_file_uuids,
+        )
+        lexical_result = self.lexical_index.search(
+            collection,
+            question,
+            limit=self.config.candidate_limit,
+            file_uuids=file_uuids,
+            exclude_file_uuids=expired_file_uuids,
+        )
+
+        fused_result = reciprocal_rank_fusion(
+            [dense_result, lexical_result],
+            limit=self.config.limit,
+            k=self.config.rrf_k,
+        )
+
+        self.logger.debug(
+            pformat(
+                {
+                    "dense": len(dense_result),
+                    "lexical": len(lexical_result),
+                    "fused": fused_result,
+                }
+            )
+        )
+        return fused_result
+
+    async def search_batch(
+        self,
+        questions: list[str],
+        question_vectors: np.ndarray,
+        collection: str = "default",
+        file_uuids: list[str] | None = None,
+    ) -> BatchSearchSimilarityModel:
+        """
+        Search a collection for several questions at once, e.g. the rewrites of a
+        question or the questions of an exam sheet.
+
+        The dense searches of all questions are sent as one batched search.
+
+        Args:
+            questions (list[str]): Question texts, used for the lexical searches.
+            question_vectors (np.ndarray): One embedding per question.
+            collection (str, optional): Collection name. Defaults to "default".
+            file_uuids (list[str] | None, optional): Only search the chunks of these
+                documents. Defaults to every document.
+
+        Returns:
+            BatchSearchSimilarityModel: The relevant chunks of each question and their
+                fusion, duplicates merged.
+        """
+        expired_file_uuids = await self.expired_documents.file_uuids(collection)
+
+        dense_result = await self.vector_store.async_search_similarity_batch(
+            question_vectors,
+            collection_name=collection,
+            limit=self.config.candidate_limit,
+            file_uuids=file_uuids,
+            exclude_file_uuids=expired_file_uuids,
+            fusion_k=self.config.rrf_k,
+        )
+
+        results = []
+        for question, dense_ranking in zip(questions, dense_result.results):
+            lexical_ranking = self.lexical_index.search(
+                collection,
+                question,
+                limit=self.config.candidate_limit,
+                file_uuids=file_uuids,
+                exclude_file_uuids=expired_file_uuids,
+            )
+            results.append(
+                reciprocal_rank_fusion(
+                    [dense_ranking, lexical_ranking],
+                    limit=self.config.limit,
+                    k=self.config.rrf_k,
+                )
+            )
+
+        fused_result = reciprocal_rank_fusion(
+            results, limit=self.config.limit, k=self.config.rrf_k
+        )
+
+        self.logger.debug(
+            pformat({"questions": len(questions), "fused": fused_result})
+        )
+        return BatchSearchSimilarityModel(results=results, fused=fused_result)
@@ -0,0 +1,447 @@
+# Code by AkinoAlice@TyrantRey
+
+from Backend.utils.helper.model.database.vector_database import ChunkPositionModel
+from Backend.utils.helper.model.RAG.ingestion_queue import IngestionQueueConfig
+from Backend.utils.helper.model.database.database import IngestionJobModel
+from Backend.utils.database.vector_store import chunk_hash, get_vector_store
+from Backend.utils.RAG.expired_documents import ExpiredDocuments
+from Backend.utils.RAG.answer_cache import SemanticAnswerCache
+from Backend.utils.RAG.document_handler import DocumentSplitter
+from Backend.utils.RAG.vector_extractor import VectorHandler
+from Backend.utils.RAG.lexical_index import LexicalIndex
+from Backend.utils.database.database import AsyncMySQLHandler
+from Backend.utils.helper.executor import io_executor
+from Backend.utils.helper.logger import CustomLoggerHandler
+
+from pprint import pformat
+from os import getenv, path
+
+import asyncio
+import json
+import uuid
+import os
+
+
+class IngestionQueue(object):
+    """
+    Background queue parsing, embedding and indexing uploaded documents.
+
+    Jobs are stored in the `ingestion_job` table and run by
+    `INGESTION_WORKERS` concurrent workers. Unfinished jobs are queued again at
+    startup; a job interrupted while running starts over, which is cheap because
+    only chunks missing from the vector store are embedded and inserted.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(IngestionQueue, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self) -> None:
+        self.config = IngestionQueueConfig(
+            workers=int(getenv("INGESTION_WORKERS", "2")),
+            progress_interval=int(getenv("INGESTION_PROGRESS_INTERVAL", "32")),
+        )
+
+        self.logger = CustomLoggerHandler(__name__).setup_logging()
+        self.mysql_client = AsyncMySQLHandler()
+        self.vector_store = get_vector_store()
+        self.docs_client = DocumentSplitter()
+        self.encoder_client = VectorHandler()
+        self.lexical_index = LexicalIndex()
+        self.answer_cache = SemanticAnswerCache()
+        self.expired_documents = ExpiredDocuments()
+
+        self._queue: asyncio.Queue[str] | None = None
+        self._workers: list[asyncio.Task] = []
+        # job_id -> job, while queued or running
+        self._jobs: dict[str, IngestionJobModel] = {}
+        # file_uuid of documents whose job is being prepared, see `reserve`
+        self._reserved: set[str] = set()
+
+    async def start(self) -> None:
+        """Start the workers on the running event loop and resume unfinished jobs."""
+        if self._workers:
+            return
+
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._run()) for _ in range(self.config.workers)
+        ]
+
+        self._jobs = {}
+        unfinished_jobs = await self.mysql_client.query_unfinished_ingestion_jobs()
+        for job in unfinished_jobs:
+            job.status = "queued"
+            self._jobs[job.job_id] = job
+            self._queue.put_nowait(job.job_id)
+
+        self.logger.info(
+            f"Ingestion queue started with {self.config.workers} workers, resumed {len(unfinished_jobs)} jobs"
+        )
+
+    async def stop(self) -> None:
+        """Stop the workers, unfinished jobs are resumed at the next start."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+        self._workers = []
+        self._queue = None
+        self.logger.info(f"Ingestion queue stopped, unfinished jobs: {len(self._jobs)}")
+
+    async def submit(
+        self,
+        file_uuid: str,
+        filename: str,
+        tags: str,
+        collection: str = "default",
+        kind: str = "upload",
+        file_hash: str | None = None,
+        job_id: str | None = None,
+    ) -> IngestionJobModel:
+        """
+        Queue a stored document to be indexed.
+
+        A re-index job indexes the new version of the document at `staged_path`
+        if there is one, and moves it over the stored file once it succeeded.
+
+        Args:
+            file_uuid (str): The unique identifier of the document, stored as
+                `./files/{file_uuid}.{docs_format}`.
+            filename (str): The name of the document.
+            tags (str): The JSON tags of the document, including `docs_format`.
+            collection (str, optional): The collection to index into. Defaults to "default".
+            kind (str, optional): "upload" for a new document, "reindex" to replace
+                the chunks of an existing one. Defaults to "upload".
+            file_hash (str | None, optional): sha256 of the uploaded content, recorded
+                in the file table once indexed. Defaults to None.
+            job_id (str | None, optional): Identifier of the job, chosen by the caller
+                to stage a new version of the document. Defaults to a new UUID.
+
+        Returns:
+            IngestionJobModel: The queued job.
+
+        Raises:
+            RuntimeError: If the job could not be stored.
+        """
+        await self.start()
+        assert self._queue is not None
+
+        job = IngestionJobModel(
+            job_id=job_id or str(uuid.uuid4()),
+            file_id=file_uuid,
+            file_name=filename,
+            collection=collection,
+            tags=tags,
+            kind=kind,
+            file_hash=file_hash,
+        )
+        if not await self.mysql_client.insert_ingestion_job(job):
+            raise RuntimeError(f"Failed to store ingestion job of {file_uuid}")
+
+        self._jobs[job.job_id] = job
+        self._queue.put_nowait(job.job_id)
+
+        self.logger.info(f"Queued {kind} job {job.job_id} of {filename}")
+        return job
+
+    @staticmethod
+    def staged_path(file_uuid: str, job_id: str, docs_format: str) -> str:
+        """
+        Where a new version of a stored document waits for its re-index job.
+
+        Args:
+            file_uuid (str): The unique identifier of the document.
+            job_id (str): The unique identifier of the re-index job.
+            docs_format (str): The file extension of the document.
+
+        Returns:
+            str: Path of the staged file.
+        """
+        return f"./files/{file_uuid}.{job_id}.{docs_format}"
+
+    async def get(self, job_id: str) -> IngestionJobModel | None:
+        """
+        Get the status and progress of a job.
+
+        Args:
+            job_id (str): The unique identifier of the job.
+
+        Returns:
+            IngestionJobModel | None: The job, or None if it does not exist.
+        """
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.model_copy()
+
+        return await self.mysql_client.query_ingestion_job(job_id)
+
+    def is_active(self, file_uuid: str) -> bool:
+        """
+        Check whether a document has a queued or running job.
+
+        Args:
+            file_uuid (str): The unique identifier of the document.
+
+        Returns:
+            bool: True if the document is being indexed.
+        """
+        return file_uuid in self._reserved or any(
+            job.file_id == file_uuid for job in self._jobs.values()
+        )
+
+    def reserve(self, file_uuid: str) -> bool:
+        """
+        Claim a document before preparing its job, so concurrent requests can't
+        queue a second job for it. Synchronous, call it before the first await
+        and `release` it once the job is submitted or preparing it failed.
+
+        Args:
+            file_uuid (str): The unique identifier of the document.
+
+        Returns:
+            bool: False if the document is already reserved or being indexed.
+        """
+        if self.is_active(file_uuid):
+            return False
+
+        self._reserved.add(file_uuid)
+        return True
+
+    def release(self, file_uuid: str) -> None:
+        """
+        Release a document claimed with `reserve`.
+
+        Args:
+            file_uuid (str): The unique identifier of the document.
+        """
+        self._reserved.discard(file_uuid)
+
+    def find_upload(self, file_hash: str, collection: str) -> IngestionJobModel | None:
+        """
+        Find a queued or running upload of the same content.
+
+        Args:
+            file_hash (str): sha256 of the file content.
+            collection (str): The collection the file is uploaded to.
+
+        Returns:
+            IngestionJobModel | None: The upload job, or None if there is none.
+        """
+        for job in self._jobs.values():
+            if (
+                job.kind == "upload"
+                and job.file_hash == file_hash
+                and job.collection == collection
+            ):
+                return job.model_copy()
+
+        return None
+
+    async def remove_document_chunks(self, file_uuid: str, collection: str) -> int:
+        """
+        Remove the chunks of a document from the vector store and BM25 index.
+
+        Args:
+            file_uuid (str): The unique identifier of the document.
+            collection (str): Collection of the document.
+
+        Returns:
+            int: Number of removed chunks.
+        """
+        removed_count = await self.vector_store.async_delete_document(
+            file_uuid=file_uuid, collection=collection
+        )
+
+        if await io_executor.run(
+            self.lexical_index.remove_document, collection, file_uuid
+        ):
+            self.lexical_index.schedule_save()
+
+        self.answer_cache.invalidate_collection(collection)
+
+        self.logger.info(f"Removed {removed_count} chunks of {file_uuid} in {collection}")
+        return removed_count
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+
+        while True:
+            job = self._jobs[await self._queue.get()]
+            try:
+                await self._process(job)
+                job.status = "succeeded"
+            except asyncio.CancelledError:
+                # left as running in MySQL, resumed at the next start
+                raise
+            except Exception as error:
+                self.logger.error(f"Ingestion job {job.job_id} failed: {error}")
+                job.status = "failed"
+                job.error = str(error)
+
+                # the stored file still matches the file record, drop the new version
+                try:
+                    await io_executor.run(self._discard_staged_file, job)
+                except (OSError, ValueError) as error:
+                    self.logger.error(
+                        f"Failed to remove the staged file of {job.job_id}: {error}"
+                    )
+
+            try:
+                await self.mysql_client.update_ingestion_job(job)
+            except Exception as error:
+                self.logger.error(f"Failed to store ingestion job {job.job_id}: {error}")
+            finally:
+                self._jobs.pop(job.job_id, None)
+
+    def _discard_staged_file(self, job: IngestionJobModel) -> None:
+        docs_format = json.loads(job.tags).get("docs_format")
+        staged_path = self.staged_path(job.file_id, job.job_id, str(docs_format))
+        if path.exists(staged_path):
+            os.remove(staged_path)
+
+    async def _process(self, job: IngestionJobModel) -> None:
+        job.status = "running"
+        job.error = None
+        await self.mysql_client.update_ingestion_job(job)
+
+        docs_format = json.loads(job.tags)["docs_format"]
+        if docs_format not in ["docx", "pptx"]:
+            raise ValueError(f"Unsupported file format: {docs_format}")
+
+        file_path = f"./files/{job.file_id}.{docs_format}"
+        staged_path = self.staged_path(job.file_id, job.job_id, docs_format)
+        staged = path.exists(staged_path)
+
+        chunks = await io_executor.run(
+            self.docs_client.document_splitter,
+            staged_path if staged else file_path,
+            docs_format,
+        )
+        splitted_content = [chunk.content for chunk in chunks]
+        positions = [
+            ChunkPositionModel(
+                page=chunk.page, end_page=chunk.end_page, ordinal=chunk.ordinal
+            )
+            for chunk in chunks
+        ]
+        self.logger.debug(
+            f"Split {job.file_name} into {len(chunks)} chunks of {sum(chunk.tokens for chunk in chunks)} tokens"
+        )
+
+        # diff against the chunks already indexed for the file, a re-upload only
+        # embeds new chunks and an interrupted job skips what it inserted
+        content_hashes = [
+            chunk_hash(job.file_name, content) for content in splitted_content
+        ]
+        indexed_chunks = await self.vector_store.async_document_chunk_hashes(
+            job.file_id, job.collection
+        )
+        new_hashes = set(content_hashes)
+
+        # first occurrence of each new chunk, unchanged chunks keep their position
+        first_indices: dict[str, int] = {}
+        for i, content_hash in enumerate(content_hashes):
+            first_indices.setdefault(content_hash, i)
+        added_indices = [
+            i
+            for content_hash, i in first_indices.items()
+            if content_hash not in indexed_chunks
+        ]
+        added_content = [splitted_content[i] for i in added_indices]
+        removed_ids = [
+            chunk_id
+            for content_hash, chunk_ids in indexed_chunks.items()
+            if content_hash not in new_hashes
+            for chunk_id in chunk_ids
+        ]
+
+        job.added_chunks = len(added_content)
+        job.removed_chunks = len(removed_ids)
+        job.unchanged_chunks = len(indexed_chunks.keys() & new_hashes)
+        job.total_chunks = job.added_chunks
+        job.embedded_chunks = 0
+        await self.mysql_client.update_ingestion_job(job)
+
+        if job.kind == "upload":
+            # write the file row first so that attachments can reference the file
+            # as soon as a chunk is retrievable; it stays expired until every chunk
+            # is indexed, and may exist if the job was interrupted
+            if await self.mysql_client.query_file(job.file_id) is None:
+                if not await self.mysql_client.insert_file(
+                    file_uuid=job.file_id,
+                    filename=job.file_name,
+                    tags=job.tags,
+                    collection=job.collection,
+                    file_hash=job.file_hash,
+                    expired=True,
+                ):
+                    raise RuntimeError(
+                        f"Failed to store the file record of {job.file_id}"
+                    )
+            self.expired_documents.mark(job.collection, job.file_id, True)
+
+        saved_progress = 0
+
+        async def _report_progress(embedded_chunks: int) -> None:
+            nonlocal saved_progress
+
+            job.embedded_chunks = embedded_chunks
+            if embedded_chunks - saved_progress >= self.config.progress_interval:
+                saved_progress = embedded_chunks
+                await self.mysql_client.update_ingestion_job(job)
+
+        vectors = await self.encoder_client.async_encode_batch(
+            added_content, on_progress=_report_progress
+        )
+
+        if removed_ids:
+            await self.vector_store.async_delete_chunks(removed_ids, job.collection)
+
+        # already deduplicated against this file; the collection wide check would
+        # skip chunks held by another document of the same name
+        insert_info = await self.vector_store.async_insert_sentences(
+            vectors=vectors,
+            contents=added_content,
+            sources=[job.file_name] * len(added_content),
+            file_uuids=[job.file_id] * len(added_content),
+            collection=job.collection,
+            remove_duplicates=False,
+            positions=[positions[i] for i in added_indices],
+        )
+        self.logger.debug(pformat(insert_info))
+
+        # keep the BM25 index in sync with the vector store
+        await io_executor.run(
+            self.lexical_index.replace_document,
+            collection=job.collection,
+            source=job.file_name,
+            file_uuid=job.file_id,
+            contents=splitted_content,
+            positions=positions,
+        )
+        self.lexical_index.schedule_save()
+
+        # cached answers of this collection may be outdated by the new chunks
+        if added_content or removed_ids:
+            self.answer_cache.invalidate_collection(job.collection)
+
+        # the stored file is only replaced once its new version is indexed
+        if staged:
+            await io_executor.run(os.replace, staged_path, file_path)
+
+        # restores the file, an upload was inserted expired above
+        if not await self.mysql_client.update_file(
+            job.file_id, job.file_name, job.file_hash, job.tags
+        ):
+            raise RuntimeError(f"Failed to store the file record of {job.file_id}")
+        self.expired_documents.mark(job.collection, job.file_id, False)
+
+        self.logger.info(
+            f"Ingestion job {job.job_id} of {job.file_name}: {job.added_chunks} added, "
+            f"{job.removed_chunks} removed, {job.unchanged_chunks} unchanged chunks"
+        )
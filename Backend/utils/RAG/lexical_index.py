@@ -0,0 +1,527 @@
+# Code by AkinoAlice@TyrantRey
+
+from Backend.utils.helper.model.database.vector_database import (
+    ChunkPositionModel,
+    SearchSimilarityModel,
+)
+from Backend.utils.helper.model.RAG.lexical_index import (
+    LexicalIndexConfig,
+    LexicalIndexStatsModel,
+)
+from Backend.utils.helper.logger import CustomLoggerHandler
+
+from collections import Counter
+from os import getenv, path
+
+import unicodedata
+import threading
+import tempfile
+import heapq
+import json
+import gzip
+import math
+import os
+import re
+
+# version 1 snapshots have no chunk positions
+SNAPSHOT_VERSION = 2
+
+CJK_PATTERN = r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]"
+TOKEN_PATTERN = re.compile(rf"{CJK_PATTERN}+|[a-z0-9]+(?:\.[0-9]+)?")
+CJK_RUN_PATTERN = re.compile(rf"{CJK_PATTERN}+")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split text into index terms.
+
+    Latin text is split into lowercase words and numbers. CJK text has no word
+    boundaries, so each run of CJK characters is split into overlapping bigrams
+    (a single character run is kept as is).
+
+    Args:
+        text (str): Text to tokenize.
+
+    Returns:
+        list[str]: Index terms in order of appearance.
+    """
+    terms = []
+    for match in TOKEN_PATTERN.finditer(unicodedata.normalize("NFKC", text).lower()):
+        token = match.group()
+        if len(token) > 1 and CJK_RUN_PATTERN.fullmatch(token):
+            terms.extend(token[i : i + 2] for i in range(len(token) - 1))
+        else:
+            terms.append(token)
+
+    return terms
+
+
+class BM25Index(object):
+    """Okapi BM25 inverted index over the chunks of one collection."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+
+        # None for removed chunks, the ids are compacted when the snapshot is loaded
+        self.documents: list[SearchSimilarityModel | None] = []
+        self.document_lengths: list[int] = []
+        self.document_count = 0
+        # term -> {document id: term frequency}
+        self.postings: dict[str, dict[int, int]] = {}
+        # (file_uuid, content) -> document id, chunks are deduplicated per file
+        self._document_ids: dict[tuple[str, str], int] = {}
+        # file_uuid -> ids of the chunks of the document
+        self._file_documents: dict[str, list[int]] = {}
+        self._total_length = 0
+        # k1 * (1 - b + b * length / average length), rebuilt after changes
+        self._length_norms: list[float] | None = None
+
+    def add(
+        self,
+        source: str,
+        file_uuid: str,
+        content: str,
+        position: ChunkPositionModel | None = None,
+    ) -> None:
+        """
+        Index a chunk, skipped if the document already has a chunk with the same
+        content.
+
+        Args:
+            source (str): Filename of the document.
+            file_uuid (str): Unique identifier of the document.
+            content (str): Chunk content.
+            position (ChunkPositionModel | None, optional): Page and ordinal of the
+                chunk. Defaults to unknown.
+        """
+        document_id = self._document_ids.get((file_uuid, content))
+        if document_id is not None:
+            return
+
+        document_id = len(self.documents)
+        term_frequency = Counter(tokenize(content))
+
+        self.documents.append(
+            SearchSimilarityModel(
+                source=source,
+                content=content,
+                file_uuid=file_uuid,
+                **(position.model_dump() if position is not None else {}),
+            )
+        )
+        self._document_ids[(file_uuid, content)] = document_id
+        self._file_documents.setdefault(file_uuid, []).append(document_id)
+        self.document_count += 1
+
+        document_length = sum(term_frequency.values())
+        self.document_lengths.append(document_length)
+        self._total_length += document_length
+
+        for term, frequency in term_frequency.items():
+            self.postings.setdefault(term, {})[document_id] = frequency
+
+        self._length_norms = None
+
+    def remove(self, file_uuid: str) -> int:
+        """
+        Remove the chunks of a document, only their own postings are updated.
+
+        Args:
+            file_uuid (str): Unique identifier of the document.
+
+        Returns:
+            int: Number of removed chunks.
+        """
+        document_ids = self._file_documents.pop(file_uuid, [])
+
+        for document_id in document_ids:
+            document = self.documents[document_id]
+            assert document is not None
+
+            for term in set(tokenize(document.content)):
+                posting = self.postings.get(term)
+                if posting is None:
+                    continue
+
+                posting.pop(document_id, None)
+                if not posting:
+                    del self.postings[term]
+
+            self._total_length -= self.document_lengths[document_id]
+            self.document_lengths[document_id] = 0
+            del self._document_ids[(file_uuid, document.content)]
+            self.documents[document_id] = None
+
+        if document_ids:
+            self.document_count -= len(document_ids)
+            self._length_norms = None
+
+        return len(document_ids)
+
+    def live_documents(self) -> list[SearchSimilarityModel]:
+        return [document for document in self.documents if document is not None]
+
+    def search(
+        self,
+        query: str,
+        limit: int = 10,
+        file_uuids: set[str] | None = None,
+        exclude_file_uuids: set[str] | None = None,
+    ) -> list[SearchSimilarityModel]:
+        """
+        Rank chunks by BM25 score.
+
+        Args:
+            query (str): Search query.
+            limit (int, optional): Maximum number of chunks. Defaults to 10.
+            file_uuids (set[str] | None, optional): Only rank the chunks of these
+                documents. Defaults to every document.
+            exclude_file_uuids (set[str] | None, optional): Skip the chunks of these
+                documents. Defaults to none.
+
+        Returns:
+            list[SearchSimilarityModel]: Matching chunks, best first.
+        """
+        if not self.document_count:
+            return []
+
+        document_count = self.document_count
+        if self._length_norms is None:
+            average_length = self._total_length / document_count or 1
+            self._length_norms = [
+                self.k1 * (1 - self.b + self.b * length / average_length)
+                for length in self.document_lengths
+            ]
+        length_norms = self._length_norms
+        k1_plus_one = self.k1 + 1
+
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+
+            idf = math.log(
+                1 + (document_count - len(posting) + 0.5) / (len(posting) + 0.5)
+            )
+            for document_id, frequency in posting.items():
+                # postings only reference chunks that were not removed
+                document_file_uuid = self.documents[document_id].file_uuid  # type: ignore[union-attr]
+                if (
+                    file_uuids is not None and document_file_uuid not in file_uuids
+                ) or (exclude_file_uuids and document_file_uuid in exclude_file_uuids):
+                    continue
+                scores[document_id] = scores.get(document_id, 0.0) + idf * (
+                    frequency * k1_plus_one / (frequency + length_norms[document_id])
+                )
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [
+            self.documents[document_id].model_copy(update={"score": score})  # type: ignore[union-attr]
+            for document_id, score in best
+        ]
+
+
+class LexicalIndex(object):
+    """
+    In-process BM25 indexes, one per collection.
+
+    Kept in sync with the chunks inserted into Milvus. When `BM25_INDEX_PATH` is
+    set, the chunks are saved to a gzip JSON snapshot and re-indexed from it at
+    startup. Changes are coalesced and saved at most once per `BM25_SAVE_DELAY`
+    seconds, `flush` saves the pending ones at shutdown.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(LexicalIndex, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self) -> None:
+        self.config = LexicalIndexConfig(
+            k1=float(getenv("BM25_K1", "1.5")),
+            b=float(getenv("BM25_B", "0.75")),
+            snapshot_path=getenv("BM25_INDEX_PATH", "./bm25_index.json.gz"),
+            save_delay=float(getenv("BM25_SAVE_DELAY", "5")),
+        )
+
+        self.logger = CustomLoggerHandler(__name__).setup_logging()
+
+        self._lock = threading.Lock()
+        self._indexes: dict[str, BM25Index] = {}
+
+        # serializes snapshot writes, held without `_lock` while writing
+        self._save_lock = threading.Lock()
+        self._save_timer: threading.Timer | None = None
+        # bumped on every change, the snapshot is only written when it moved
+        self._version = 0
+        self._saved_version = 0
+
+        if self.config.snapshot_path and path.exists(self.config.snapshot_path):
+            self._load(self.config.snapshot_path)
+
+    def add_documents(
+        self,
+        collection: str,
+        source: str,
+        file_uuid: str,
+        contents: list[str],
+        positions: list[ChunkPositionModel] | None = None,
+    ) -> None:
+        """
+        Index the chunks of a document.
+
+        Args:
+            collection (str): Collection the chunks were inserted into.
+            source (str): Filename of the document.
+            file_uuid (str): Unique identifier of the document.
+            contents (list[str]): Chunk contents.
+            positions (list[ChunkPositionModel] | None, optional): Page and ordinal
+                of each chunk. Defaults to unknown.
+        """
+        with self._lock:
+            index = self._indexes.setdefault(
+                collection, BM25Index(k1=self.config.k1, b=self.config.b)
+            )
+            for content, position in zip(
+                contents, positions or [None] * len(contents)
+            ):
+                index.add(
+                    source=source,
+                    file_uuid=file_uuid,
+                    content=content,
+                    position=position,
+                )
+            self._version += 1
+
+    def remove_document(self, collection: str, file_uuid: str) -> int:
+        """
+        Remove the chunks of a document.
+
+        Only the postings of the removed chunks are updated, so the cost depends
+        on the size of the document, not of the collection.
+
+        Args:
+            collection (str): Collection the chunks were inserted into.
+            file_uuid (str): Unique identifier of the document.
+
+        Returns:
+            int: Number of removed chunks.
+        """
+        with self._lock:
+            index = self._indexes.get(collection)
+            if index is None:
+                return 0
+
+            removed_count = index.remove(file_uuid)
+            if removed_count:
+                self._version += 1
+
+        if removed_count:
+            self.logger.debug(f"Removed {removed_count} chunks of {file_uuid} from {collection}")
+        return removed_count
+
+    def replace_document(
+        self,
+        collection: str,
+        source: str,
+        file_uuid: str,
+        contents: list[str],
+        positions: list[ChunkPositionModel] | None = None,
+    ) -> None:
+        """
+        Replace the chunks of a document in one step, searches never see it half
+        indexed.
+
+        Args:
+            collection (str): Collection the chunks were inserted into.
+            source (str): Filename of the document.
+            file_uuid (str): Unique identifier of the document.
+            contents (list[str]): Chunk contents.
+            positions (list[ChunkPositionModel] | None, optional): Page and ordinal
+                of each chunk. Defaults to unknown.
+        """
+        with self._lock:
+            index = self._indexes.setdefault(
+                collection, BM25Index(k1=self.config.k1, b=self.config.b)
+            )
+            index.remove(file_uuid)
+            for content, position in zip(
+                contents, positions or [None] * len(contents)
+            ):
+                index.add(
+                    source=source,
+                    file_uuid=file_uuid,
+                    content=content,
+                    position=position,
+                )
+            self._version += 1
+
+    def search(
+        self,
+        collection: str,
+        query: str,
+        limit: int = 10,
+        file_uuids: list[str] | None = None,
+        exclude_file_uuids: list[str] | None = None,
+    ) -> list[SearchSimilarityModel]:
+        """
+        Rank the chunks of a collection by BM25 score.
+
+        Args:
+            collection (str): Collection to search.
+            query (str): Search query.
+            limit (int, optional): Maximum number of chunks. Defaults to 10.
+            file_uuids (list[str] | None, optional): Only rank the chunks of these
+                documents. Defaults to every document.
+            exclude_file_uuids (list[str] | None, optional): Skip the chunks of these
+                documents. Defaults to none.
+
+        Returns:
+            list[SearchSimilarityModel]: Matching chunks, best first.
+        """
+        with self._lock:
+            index = self._indexes.get(collection)
+            if index is None:
+                return []
+
+            return index.search(
+                query,
+                limit,
+                None if file_uuids is None else set(file_uuids),
+                set(exclude_file_uuids) if exclude_file_uuids else None,
+            )
+
+    def schedule_save(self) -> None:
+        """
+        Save the snapshot in `BM25_SAVE_DELAY` seconds, changes made meanwhile are
+        written by the same save.
+        """
+        if not self.config.snapshot_path:
+            return
+
+        with self._lock:
+            if self._save_timer is not None:
+                return
+
+            self._save_timer = threading.Timer(
+                self.config.save_delay, self._scheduled_save
+            )
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self) -> None:
+        """Cancel the scheduled save and write the pending changes now."""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+
+        self.save()
+
+    def save(self) -> None:
+        """Write the snapshot if it changed, replacing the previous one atomically."""
+        if not self.config.snapshot_path:
+            return
+
+        with self._save_lock:
+            with self._lock:
+                if self._version == self._saved_version:
+                    return
+
+                version = self._version
+                snapshot = {
+                    "version": SNAPSHOT_VERSION,
+                    "collections": {
+                        collection: [
+                            [
+                                document.source,
+                                document.file_uuid,
+                                document.content,
+                                document.page,
+                                document.end_page,
+                                document.ordinal,
+                            ]
+                            for document in index.live_documents()
+                        ]
+                        for collection, index in self._indexes.items()
+                    },
+                }
+
+            # unique name in the same directory, so `os.replace` stays atomic
+            descriptor, temporary_path = tempfile.mkstemp(
+                dir=path.dirname(path.abspath(self.config.snapshot_path)),
+                prefix=f"{path.basename(self.config.snapshot_path)}.",
+                suffix=".tmp",
+            )
+            try:
+                with os.fdopen(descriptor, "wb") as raw_file:
+                    with gzip.open(raw_file, "wt", encoding="utf-8") as f:
+                        json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+                os.replace(temporary_path, self.config.snapshot_path)
+            except BaseException:
+                if path.exists(temporary_path):
+                    os.remove(temporary_path)
+                raise
+
+            self._saved_version = version
+
+        self.logger.debug(f"Saved BM25 snapshot {self.config.snapshot_path}")
+
+    def _scheduled_save(self) -> None:
+        with self._lock:
+            self._save_timer = None
+
+        try:
+            self.save()
+        except OSError as error:
+            self.logger.error(
+                f"Failed to save BM25 snapshot {self.config.snapshot_path}: {error}"
+            )
+
+    def stats(self) -> list[LexicalIndexStatsModel]:
+        with self._lock:
+            return [
+                LexicalIndexStatsModel(
+                    collection=collection,
+                    documents=index.document_count,
+                    terms=len(index.postings),
+                )
+                for collection, index in self._indexes.items()
+            ]
+
+    def _load(self, snapshot_path: str) -> None:
+        try:
+            with gzip.open(snapshot_path, "rt", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as error:
+            self.logger.error(f"Failed to load BM25 snapshot {snapshot_path}: {error}")
+            return
+
+        if snapshot.get("version") not in (1, SNAPSHOT_VERSION):
+            self.logger.warning(
+                f"Ignoring BM25 snapshot version {snapshot.get('version')}"
+            )
+            return
+
+        for collection, documents in snapshot["collections"].items():
+            index = BM25Index(k1=self.config.k1, b=self.config.b)
+            for source, file_uuid, content, *position in documents:
+                index.add(
+                    source=source,
+                    file_uuid=file_uuid,
+                    content=content,
+                    position=ChunkPositionModel(
+                        **dict(zip(ChunkPositionModel.model_fields, position))
+                    ),
+                )
+            self._indexes[collection] = index
+
+        self.logger.info(
+            f"Loaded BM25 snapshot {snapshot_path}: {[stats.model_dump() for stats in self.stats()]}"
+        )
+
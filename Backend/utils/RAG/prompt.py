@@ -34,3 +34,16 @@ PROMPT = {
         },
     },
 }
+
+SUMMARY_PROMPT = {
+    "ENGLISH": {
+        "system": "You are summarizing a conversation between a student and an economics professor. Keep the questions the student asked, the key concepts, formulas and conclusions of the answers, and anything the student said about themselves. Write a concise summary in English.",
+        "user": """Previous summary:{summary} Conversation:{conversation} Updated summary:""",
+        "history": """Summary of the earlier conversation:{summary}""",
+    },
+    "CHINESE": {
+        "system": "你正在總結一段學生與經濟學教授之間的對話,請保留學生提出的問題,回答中的重要概念,公式和結論,以及學生提到關於自己的資訊,並用中文撰寫簡潔的摘要",
+        "user": """先前的摘要：{summary} 對話內容：{conversation} 更新後的摘要：""",
+        "history": """先前對話的摘要：{summary}""",
+    },
+}
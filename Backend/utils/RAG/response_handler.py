@@ -4,19 +4,36 @@ from Backend.utils.helper.model.RAG.response_handler import (
     AFSConfig,
     OLLAMAConfig,
     DeployModel,
+    SchedulerConfig,
+    SchedulerStatsModel,
 )
+from Backend.utils.helper.error import SchedulerQueueFullError, SchedulerUserLimitError
+from Backend.utils.RAG.context_builder import ContextBuilder
+from Backend.utils.RAG.prompt import SUMMARY_PROMPT
 from Backend.utils.helper.logger import CustomLoggerHandler
-from Backend.utils.RAG.prompt import PROMPT
 
-from ollama import Client
+from ollama import AsyncClient, Client
 
 from pydantic import HttpUrl
 
-from typing import Literal, Union
+from typing import AsyncIterator, Literal, Union
+from contextlib import asynccontextmanager
+from collections import Counter
 from os import getenv
 
 import requests  # type: ignore
+import asyncio
+import heapq
+import httpx
 import json
+import time
+
+# lower value is scheduled first
+QUESTION_TYPE_PRIORITY = {
+    "TESTING": 0,
+    "THEOREM": 1,
+    "CHATTING": 2,
+}
 
 
 class ResponseHandler(object):
@@ -58,6 +75,9 @@ class ResponseHandler(object):
 
         self.Responser.initialization()
 
+        self.scheduler = LLMScheduler.for_backend(self.LLM_DEPLOY_MODE)
+        self.context_builder = ContextBuilder()
+
     def override_deploy_mode(
         self, deploy_mode: Literal["local", "openai", "ollama", "afs"]
     ) -> bool:
@@ -103,7 +123,7 @@ class ResponseHandler(object):
 
         return True
 
-    def generate_response(
+    async def async_generate_response(
         self,
         question: list[str],
         queried_document: list[str],
@@ -114,96 +134,338 @@ class ResponseHandler(object):
         top_k: int = 30,
         top_p: int = 1,
         frequence_penalty: int = 1,
+        user_id: str = "Anonymous",
+        priority: int | None = None,
+        summary: str = "",
     ) -> tuple[str, int]:
+        """
+        Generate a response once a slot of the backend's `LLMScheduler` is free.
+
+        Args:
+            user_id (str, optional): Requesting user, used for fairness. Defaults to "Anonymous".
+            priority (int | None, optional): Scheduling priority, lower goes first.
+                Defaults to the priority of `question_type`.
+            summary (str, optional): Rolling summary of turns older than `question`. Defaults to "".
+
+        Raises:
+            SchedulerQueueFullError: If the wait queue of the backend is full.
+            SchedulerUserLimitError: If the user already has too many queued requests.
+        """
 
-        conversation = self._format_conversation_messages(
+        context = self.context_builder.build(
+            queried_document=queried_document,
             chat_history=question,
             language=language,
             question_type=question_type,
-            queried_document=queried_document,
-        )
-
-        answer, token = self.Responser.response(
-            conversation=conversation,
             max_tokens=max_tokens,
-            temperature=temperature,
-            top_k=top_k,
-            top_p=top_p,
-            frequence_penalty=frequence_penalty,
+            summary=summary,
         )
 
+        if priority is None:
+            priority = QUESTION_TYPE_PRIORITY[question_type]
+
+        async with self.scheduler.slot(user_id=user_id, priority=priority):
+            answer, token = await self.Responser.async_response(
+                conversation=context.conversation,
+                max_tokens=context.max_tokens,
+                temperature=temperature,
+                top_k=top_k,
+                top_p=top_p,
+                frequence_penalty=frequence_penalty,
+            )
+
         self.logger.debug(f"Response: {answer} ,Token count: {token}")
 
         return answer, token
 
-    def _format_conversation_messages(
+    async def async_generate_response_stream(
         self,
+        question: list[str],
         queried_document: list[str],
-        chat_history: list[str] = [""],
-        language: Literal["ENGLISH", "CHINESE"] = "CHINESE",
         question_type: Literal["CHATTING", "TESTING", "THEOREM"] = "CHATTING",
-    ) -> list[dict[str, str]]:
+        language: Literal["ENGLISH", "CHINESE"] = "CHINESE",
+        max_tokens: int = 8192,
+        temperature: float = 0.6,
+        top_k: int = 30,
+        top_p: int = 1,
+        frequence_penalty: int = 1,
+        user_id: str = "Anonymous",
+        priority: int | None = None,
+        summary: str = "",
+    ) -> AsyncIterator[tuple[str, int]]:
+        """
+        Generate a response token by token.
+
+        Same arguments as `async_generate_response`, but the answer is yielded as
+        soon as the backend produces it. The scheduler slot is held until the
+        stream is exhausted or closed.
+
+        Yields:
+            tuple[str, int]: A tuple containing:
+                - The next piece of generated text
+                - Number of prompt tokens used (0 until the backend reports it)
+        """
+
+        context = self.context_builder.build(
+            queried_document=queried_document,
+            chat_history=question,
+            language=language,
+            question_type=question_type,
+            max_tokens=max_tokens,
+            summary=summary,
+        )
+
+        if priority is None:
+            priority = QUESTION_TYPE_PRIORITY[question_type]
+
+        async with self.scheduler.slot(user_id=user_id, priority=priority):
+            async for content, prompt_tokens in self.Responser.async_response_stream(
+                conversation=context.conversation,
+                max_tokens=context.max_tokens,
+                temperature=temperature,
+                top_k=top_k,
+                top_p=top_p,
+                frequence_penalty=frequence_penalty,
+            ):
+                yield content, prompt_tokens
+
+    async def async_summarize(
+        self,
+        conversation: list[str],
+        summary: str = "",
+        language: Literal["ENGLISH", "CHINESE"] = "CHINESE",
+        max_tokens: int = 512,
+    ) -> str:
         """
-        Format the conversation messages for the RAG system.
+        Fold conversation turns into a rolling summary.
+
+        Runs behind every question in the scheduler, summaries are never urgent.
 
         Args:
-            queried_document (list[str]): List of relevant documents retrieved for the query.
-            chat_history (list[str], optional): Previous conversation history. Defaults to [""].
-            language (Literal["ENGLISH", "CHINESE"], optional): Language for the response. Defaults to "CHINESE".
-            question_type (Literal["CHATTING", "TESTING", "THEOREM"], optional): Type of prompt to generate. Defaults to "CHATTING".
+            conversation (list[str]): Alternating user questions and answers.
+            summary (str, optional): The current summary to extend. Defaults to "".
+            language (Literal["ENGLISH", "CHINESE"], optional): Language of the summary. Defaults to "CHINESE".
+            max_tokens (int, optional): Maximum summary tokens. Defaults to 512.
 
         Returns:
-            list[dict[str, str]]: Formatted conversation messages for RAG
+            str: The updated summary.
         """
-        system_content = PROMPT[language][question_type]["system"]
-        assistant_content = PROMPT[language][question_type]["assistant"]
+        prompt = SUMMARY_PROMPT[language]
+        turns = "\n".join(
+            f"{'user' if i % 2 == 0 else 'assistant'}: {chats}"
+            for i, chats in enumerate(conversation)
+        )
 
-        conversation_messages = [
+        messages = [
             {
                 "role": "system",
-                "content": system_content,
+                "content": prompt["system"],
             },
             {
-                "role": "assistant",
-                "content": assistant_content,
+                "role": "user",
+                "content": prompt["user"].format(summary=summary, conversation=turns),
             },
         ]
 
-        if len(chat_history) == 1:
-            human_content = PROMPT[language][question_type]["user"]
-            search_documents = "".join(queried_document)
-
-            conversation_messages.append(
-                {
-                    "role": "user",
-                    "content": human_content.format(
-                        question=chat_history[-1],
-                        search_documents=search_documents,
-                    ),
-                }
+        async with self.scheduler.slot(
+            user_id="system", priority=max(QUESTION_TYPE_PRIORITY.values()) + 1
+        ):
+            updated_summary, _ = await self.Responser.async_response(
+                conversation=messages,
+                max_tokens=max_tokens,
+                temperature=0.2,
             )
-        else:
-            for i, chats in enumerate(chat_history):
-                # first question = user question
-                # second question = RAG response, so on
-                # odd number = user question
-                # even number = RAG response
-                if i % 2 == 1:
-                    conversation_messages.append(
-                        {
-                            "role": "user",
-                            "content": chats,
-                        }
-                    )
-                else:
-                    conversation_messages.append(
-                        {
-                            "role": "assistant",
-                            "content": chats,
-                        }
-                    )
-
-        return conversation_messages
+
+        return updated_summary.strip()
+
+
+class LLMScheduler(object):
+    """
+    Admission control for LLM generations of one backend.
+
+    At most `max_concurrency` generations run at the same time. Further requests
+    wait in a bounded priority queue ordered by (priority, number of requests the
+    user already has running or queued, arrival order), so one user cannot starve
+    the others. Requests are rejected immediately once the queue is full.
+    """
+
+    _schedulers: dict[str, "LLMScheduler"] = {}
+
+    def __init__(self, backend: str, config: SchedulerConfig) -> None:
+        self.backend = backend
+        self.config = config
+        self.logger = CustomLoggerHandler(__name__).setup_logging()
+
+        self._active = 0
+        self._sequence = 0
+        # (priority, user load, sequence, enqueue time, user_id, future)
+        self._queue: list[tuple[int, int, int, float, str, asyncio.Future]] = []
+        self._user_load: Counter[str] = Counter()
+        self._user_queued: Counter[str] = Counter()
+
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    @classmethod
+    def for_backend(cls, backend: str) -> "LLMScheduler":
+        """
+        Get the shared scheduler of a backend.
+
+        The limits are read from `LLM_MAX_CONCURRENCY`, `LLM_MAX_QUEUE_SIZE`,
+        `LLM_MAX_QUEUED_PER_USER` and `LLM_RETRY_AFTER`. Each of them can be
+        overridden per backend with a suffix, e.g. `LLM_MAX_CONCURRENCY_OLLAMA`.
+
+        Args:
+            backend (str): LLM deploy mode.
+
+        Returns:
+            LLMScheduler: The scheduler of the backend.
+        """
+        if backend not in cls._schedulers:
+
+            def _config(name: str, default: str) -> int:
+                return int(getenv(f"{name}_{backend.upper()}", getenv(name, default)))
+
+            cls._schedulers[backend] = cls(
+                backend=backend,
+                config=SchedulerConfig(
+                    max_concurrency=_config("LLM_MAX_CONCURRENCY", "4"),
+                    max_queue_size=_config("LLM_MAX_QUEUE_SIZE", "64"),
+                    max_queued_per_user=_config("LLM_MAX_QUEUED_PER_USER", "4"),
+                    retry_after=_config("LLM_RETRY_AFTER", "10"),
+                ),
+            )
+
+        return cls._schedulers[backend]
+
+    def check_admission(self, user_id: str) -> None:
+        """
+        Fail fast if a request of the user would be rejected right now.
+
+        Used before a streaming response is started, since its status code can't
+        be changed afterwards.
+
+        Raises:
+            SchedulerQueueFullError: If the wait queue is full.
+            SchedulerUserLimitError: If the user already has too many queued requests.
+        """
+        if self._active < self.config.max_concurrency and not self._queue:
+            return
+
+        if len(self._queue) >= self.config.max_queue_size:
+            self.rejected += 1
+            self.logger.warning(
+                f"LLM queue of {self.backend} is full, rejected request of {user_id}"
+            )
+            raise SchedulerQueueFullError(retry_after=self.config.retry_after)
+
+        if self._user_queued[user_id] >= self.config.max_queued_per_user:
+            self.rejected += 1
+            self.logger.warning(f"Too many queued LLM requests of {user_id}")
+            raise SchedulerUserLimitError(retry_after=self.config.retry_after)
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, priority: int) -> AsyncIterator[None]:
+        """
+        Wait for a generation slot and hold it for the duration of the context.
+
+        Args:
+            user_id (str): Requesting user.
+            priority (int): Scheduling priority, lower goes first.
+
+        Raises:
+            SchedulerQueueFullError: If the wait queue is full.
+            SchedulerUserLimitError: If the user already has too many queued requests.
+        """
+        await self._acquire(user_id, priority)
+        try:
+            yield
+        finally:
+            self._release(user_id)
+
+    async def _acquire(self, user_id: str, priority: int) -> None:
+        if self._active < self.config.max_concurrency and not self._queue:
+            self._active += 1
+            self._user_load[user_id] += 1
+            self._record_wait(0.0)
+            return
+
+        self.check_admission(user_id)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (
+            priority,
+            self._user_load[user_id],
+            self._sequence,
+            time.monotonic(),
+            user_id,
+            future,
+        )
+        self._sequence += 1
+        self._user_load[user_id] += 1
+        self._user_queued[user_id] += 1
+        heapq.heappush(self._queue, entry)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # admitted right before the cancellation, give the slot back
+                self._release(user_id)
+            else:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                self._decrement(self._user_load, user_id)
+                self._decrement(self._user_queued, user_id)
+            raise
+
+    def _release(self, user_id: str) -> None:
+        self._active -= 1
+        self._decrement(self._user_load, user_id)
+
+        while self._queue and self._active < self.config.max_concurrency:
+            _, _, _, enqueue_time, queued_user_id, future = heapq.heappop(self._queue)
+            if future.cancelled():
+                # counted down by the cancelled waiter itself
+                continue
+
+            self._decrement(self._user_queued, queued_user_id)
+            self._active += 1
+            self._record_wait(time.monotonic() - enqueue_time)
+            future.set_result(None)
+
+    @staticmethod
+    def _decrement(counter: Counter[str], user_id: str) -> None:
+        counter[user_id] -= 1
+        if counter[user_id] <= 0:
+            del counter[user_id]
+
+    def _record_wait(self, wait_time: float) -> None:
+        self.admitted += 1
+        self.total_wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+
+    def stats(self) -> SchedulerStatsModel:
+        now = time.monotonic()
+        return SchedulerStatsModel(
+            backend=self.backend,
+            active=self._active,
+            queue_depth=len(self._queue),
+            max_concurrency=self.config.max_concurrency,
+            max_queue_size=self.config.max_queue_size,
+            admitted=self.admitted,
+            rejected=self.rejected,
+            average_wait_time=(
+                self.total_wait_time / self.admitted if self.admitted else 0.0
+            ),
+            max_wait_time=self.max_wait_time,
+            oldest_wait_time=max(
+                (now - entry[3] for entry in self._queue), default=0.0
+            ),
+        )
 
 
 class AFSResponser(object):
@@ -223,6 +485,41 @@ class AFSResponser(object):
         self.api_key = self.AFS_config.afs_api_key
         self.model_name = self.AFS_config.afs_model_name
 
+        # generation can take minutes, same as the blocking `requests` calls
+        self.async_client = httpx.AsyncClient(timeout=None)
+
+    def _request_body(
+        self,
+        conversation: list[dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        top_k: int,
+        top_p: int,
+        frequence_penalty: int,
+        stream: bool = False,
+    ) -> tuple[dict[str, str], dict]:
+        headers = {
+            "Content-Type": "application/json",
+            "X-API-HOST": "afs-inference",
+            "X-API-KEY": self.api_key,
+        }
+
+        data = {
+            "model": self.model_name,
+            "messages": conversation,
+            "parameters": {
+                "max_new_tokens": max_tokens,
+                "temperature": temperature,
+                "top_k": top_k,
+                "top_p": top_p,
+                "frequence_penalty": frequence_penalty,
+            },
+        }
+        if stream:
+            data["stream"] = True
+
+        return headers, data
+
     def response(
         self,
         conversation: list[dict[str, str]],
@@ -255,23 +552,14 @@ class AFSResponser(object):
             ValueError: If the API response is invalid or missing expected data.
         """
 
-        headers = {
-            "Content-Type": "application/json",
-            "X-API-HOST": "afs-inference",
-            "X-API-KEY": self.api_key,
-        }
-
-        data = {
-            "model": self.model_name,
-            "messages": conversation,
-            "parameters": {
-                "max_new_tokens": max_tokens,
-                "temperature": temperature,
-                "top_k": top_k,
-                "top_p": top_p,
-                "frequence_penalty": frequence_penalty,
-            },
-        }
+        headers, data = self._request_body(
+            conversation=conversation,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            top_k=top_k,
+            top_p=top_p,
+            frequence_penalty=frequence_penalty,
+        )
 
         response = requests.post(self.url, headers=headers, data=json.dumps(data))
         response_data = response.json()
@@ -279,6 +567,76 @@ class AFSResponser(object):
             "prompt_tokens"
         )
 
+    async def async_response(
+        self,
+        conversation: list[dict[str, str]],
+        max_tokens: int = 8192,
+        temperature: float = 0.6,
+        top_k: int = 30,
+        top_p: int = 1,
+        frequence_penalty: int = 1,
+    ) -> tuple[str, int]:
+        """Non-blocking version of `response` using httpx."""
+
+        headers, data = self._request_body(
+            conversation=conversation,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            top_k=top_k,
+            top_p=top_p,
+            frequence_penalty=frequence_penalty,
+        )
+
+        response = await self.async_client.post(
+            self.url, headers=headers, content=json.dumps(data)
+        )
+        response_data = response.json()
+        return response_data.get("generated_text").replace("**", ""), response_data.get(
+            "prompt_tokens"
+        )
+
+    async def async_response_stream(
+        self,
+        conversation: list[dict[str, str]],
+        max_tokens: int = 8192,
+        temperature: float = 0.6,
+        top_k: int = 30,
+        top_p: int = 1,
+        frequence_penalty: int = 1,
+    ) -> AsyncIterator[tuple[str, int]]:
+        """
+        Stream a response from the AFS conversation API using httpx.
+
+        The API sends server-sent events (`data: {...}`) when `stream` is enabled,
+        each event carrying the next piece of `generated_text`. The final event
+        also carries `prompt_tokens`.
+
+        Yields:
+            tuple[str, int]: The next piece of generated text and the number of
+                prompt tokens used (0 until reported).
+        """
+
+        headers, data = self._request_body(
+            conversation=conversation,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            top_k=top_k,
+            top_p=top_p,
+            frequence_penalty=frequence_penalty,
+            stream=True,
+        )
+
+        async with self.async_client.stream(
+            "POST", self.url, headers=headers, content=json.dumps(data)
+        ) as response:
+            async for line in response.aiter_lines():
+                if not line or not line.startswith("data:"):
+                    continue
+
+                event_data = json.loads(line.removeprefix("data:").strip())
+                token = event_data.get("generated_text") or ""
+                yield token.replace("**", ""), event_data.get("prompt_tokens") or 0
+
 
 class OpenaiCompatibleResponser(object):
     def __init__(self) -> None:
@@ -296,6 +654,35 @@ class OpenaiCompatibleResponser(object):
     ) -> tuple[str, int]:
         return "", 0
 
+    async def async_response(
+        self,
+        conversation: list[dict[str, str]],
+        max_tokens: int = 8192,
+        temperature: float = 0.6,
+        top_k: int = 30,
+        top_p: int = 1,
+        frequence_penalty: int = 1,
+    ) -> tuple[str, int]:
+        return "", 0
+
+    async def async_response_stream(
+        self,
+        conversation: list[dict[str, str]],
+        max_tokens: int = 8192,
+        temperature: float = 0.6,
+        top_k: int = 30,
+        top_p: int = 1,
+        frequence_penalty: int = 1,
+    ) -> AsyncIterator[tuple[str, int]]:
+        yield await self.async_response(
+            conversation=conversation,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            top_k=top_k,
+            top_p=top_p,
+            frequence_penalty=frequence_penalty,
+        )
+
 
 class OllamaResponser(object):
     def __init__(self) -> None:
@@ -327,6 +714,9 @@ class OllamaResponser(object):
             self.ollama_client = Client(
                 host=self.ollama_host_url,
             )
+            self.async_ollama_client = AsyncClient(
+                host=self.ollama_host_url,
+            )
         except Exception as e:
             self.logger.error(f"Failed to initialize OLLAMA client: {e}")
 
@@ -345,6 +735,40 @@ class OllamaResponser(object):
             messages=conversation,
             options={
                 "max_tokens": max_tokens,
+                "num_predict": max_tokens,
+                "temperature": temperature,
+                "top_k": top_k,
+                "top_p": top_p,
+                "frequency_penalty": frequence_penalty,
+            },
+        )
+
+        if not response.message.content:
+            self.logger.error("Failed to generate OLLAMA response")
+            return "", 0
+        if not response.prompt_eval_count:
+            self.logger.error("Failed to generate OLLAMA response")
+            return "", 0
+
+        return response.message.content, response.prompt_eval_count
+
+    async def async_response(
+        self,
+        conversation: list[dict[str, str]],
+        max_tokens: int = 8192,
+        temperature: float = 0.6,
+        top_k: int = 30,
+        top_p: int = 1,
+        frequence_penalty: int = 1,
+    ) -> tuple[str, int]:
+        """Non-blocking version of `response` using `ollama.AsyncClient`."""
+        self.logger.info(conversation)
+        response = await self.async_ollama_client.chat(
+            model=self.ollama_model_name,
+            messages=conversation,
+            options={
+                "max_tokens": max_tokens,
+                "num_predict": max_tokens,
                 "temperature": temperature,
                 "top_k": top_k,
                 "top_p": top_p,
@@ -361,6 +785,44 @@ class OllamaResponser(object):
 
         return response.message.content, response.prompt_eval_count
 
+    async def async_response_stream(
+        self,
+        conversation: list[dict[str, str]],
+        max_tokens: int = 8192,
+        temperature: float = 0.6,
+        top_k: int = 30,
+        top_p: int = 1,
+        frequence_penalty: int = 1,
+    ) -> AsyncIterator[tuple[str, int]]:
+        """
+        Stream a response from Ollama using `AsyncClient.chat(stream=True)`.
+
+        Yields:
+            tuple[str, int]: The next piece of generated text and the number of
+                prompt tokens used (only set on the final chunk).
+        """
+        self.logger.info(conversation)
+        stream = await self.async_ollama_client.chat(
+            model=self.ollama_model_name,
+            messages=conversation,
+            options={
+                "max_tokens": max_tokens,
+                "num_predict": max_tokens,
+                "temperature": temperature,
+                "top_k": top_k,
+                "top_p": top_p,
+                "frequency_penalty": frequence_penalty,
+            },
+            stream=True,
+        )
+
+        async for chunk in stream:
+            content = chunk.message.content or ""
+            prompt_tokens = (chunk.prompt_eval_count or 0) if chunk.done else 0
+
+            if content or prompt_tokens:
+                yield content, prompt_tokens
+
 
 # class LocalResponser(object):
 #     def __init__(self) -> None:
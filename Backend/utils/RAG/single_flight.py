@@ -0,0 +1,54 @@
+# Code by AkinoAlice@TyrantRey
+
+from Backend.utils.helper.logger import CustomLoggerHandler
+
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+import asyncio
+
+T = TypeVar("T")
+
+
+class SingleFlight(object):
+    """
+    Coalesce concurrent calls that share a key into one execution.
+
+    The first caller starts the work as its own task, later callers with the
+    same key await that task instead of starting another one. The task is
+    shielded, so a disconnecting client does not cancel the work for the others.
+    """
+
+    def __init__(self) -> None:
+        self.logger = CustomLoggerHandler(__name__).setup_logging()
+
+        self._in_flight: dict[Hashable, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, function: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run `function` once for all concurrent callers with the same key.
+
+        Args:
+            key (Hashable): Identity of the work.
+            function (Callable[[], Awaitable[T]]): Coroutine function doing the work.
+
+        Returns:
+            T: The shared result of `function`.
+        """
+        task = self._in_flight.get(key)
+
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(function())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+            self.logger.debug(f"Coalesced in-flight request, total: {self.coalesced}")
+
+        return await asyncio.shield(task)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
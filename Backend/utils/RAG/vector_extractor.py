@@ -1,19 +1,25 @@
 # Code by AkinoAlice@TyrantRey
 
 from Backend.utils.helper.model.RAG.vector_extractor import (
-    AFSEmbeddingConfig,
+    OPENAIEmbeddingConfig,
     OLLAMAEmbeddingConfig,
+    EmbeddingBatchConfig,
     EmbeddingDeployModel,
+    AFSEmbeddingConfig,
 )
+from Backend.utils.RAG.embedding_cache import EmbeddingCache
 from Backend.utils.helper.logger import CustomLoggerHandler
 
-from typing import Union, overload
-from ollama import Client
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Union, overload
+from ollama import AsyncClient, Client
 from os import getenv
 
 import numpy as np
 import requests  # type: ignore
+import asyncio
 import ollama
+import httpx
 import json
 
 
@@ -23,19 +29,19 @@ class VectorHandler(object):
     def __init__(self) -> None:
         _mode = getenv("EMBEDDING_DEPLOY_MODE")
 
-        _vector_dim = getenv("MILVUS_VECTOR_DIM")
-
         assert (
             _mode is not None
             and _mode != ""
             and _mode in ["local", "openai", "ollama", "afs"]
         ), "EMBEDDING_DEPLOY_MODE environment variable is not set or not valid"
-        assert (
-            _vector_dim is not None and _vector_dim != "" and int(_vector_dim) >= 8
-        ), "MILVUS_VECTOR_DIM environment variable is not set or not valid"
 
         self.EMBEDDING_DEPLOY_MODE = EmbeddingDeployModel(mode=_mode).mode
-        self.vector_dim = int(_vector_dim)
+        self._vector_dim: int | None = None
+
+        self.batch_config = EmbeddingBatchConfig(
+            batch_size=int(getenv("EMBEDDING_BATCH_SIZE", "32")),
+            max_in_flight=int(getenv("EMBEDDING_MAX_IN_FLIGHT", "4")),
+        )
 
         self.logger = CustomLoggerHandler(__name__).setup_logging()
         self.vector_encoder: Union[
@@ -65,15 +71,183 @@ class VectorHandler(object):
 
         self.vector_encoder.initialization()
 
+        self.embedding_model_name = (
+            f"{self.EMBEDDING_DEPLOY_MODE}:{self.vector_encoder.model_name}"
+        )
+        self.embedding_cache = EmbeddingCache()
+
+    @property
+    def vector_dim(self) -> int:
+        """Native dimension of the embedding model, probed with one encoding."""
+        if self._vector_dim is None:
+            self._vector_dim = len(self.encoder("dimension"))
+            self.logger.info(
+                f"Embedding model {self.embedding_model_name} has dimension {self._vector_dim}"
+            )
+
+        return self._vector_dim
+
     def encoder(self, text: str) -> np.ndarray:
-        vector = self.vector_encoder.encode(text)
+        """
+        Embed a text at the native dimension of the model.
+
+        Args:
+            text (str): Text to embed.
 
-        return np.pad(
-            vector,
-            (0, self.vector_dim - len(vector)),
-            mode="constant",
-            constant_values=0,
+        Returns:
+            np.ndarray: Read-only float32 vector.
+        """
+        vector = self.embedding_cache.get(self.embedding_model_name, text)
+        if vector is None:
+            vector = self.embedding_cache.put(
+                self.embedding_model_name, text, self.vector_encoder.encode(text)
+            )
+
+        return vector
+
+    async def async_encoder(self, text: str) -> np.ndarray:
+        """Non-blocking version of `encoder` for use on the event loop."""
+        vector = await self.embedding_cache.async_get(self.embedding_model_name, text)
+        if vector is None:
+            vector = await self.embedding_cache.async_put(
+                self.embedding_model_name,
+                text,
+                await self.vector_encoder.async_encode(text),
+            )
+
+        return vector
+
+    def encode_batch(self, texts: list[str]) -> np.ndarray:
+        """
+        Embed many texts, sending the uncached ones in batches of `EMBEDDING_BATCH_SIZE`.
+
+        At most `EMBEDDING_MAX_IN_FLIGHT` batches are requested at the same time.
+
+        Args:
+            texts (list[str]): Texts to embed.
+
+        Returns:
+            np.ndarray: float32 array with one row per text.
+        """
+        vectors = self.embedding_cache.get_many(self.embedding_model_name, texts)
+        batches, pending = self._plan_batches(texts, vectors)
+
+        with ThreadPoolExecutor(max_workers=self.batch_config.max_in_flight) as executor:
+            for batch, batch_vectors in zip(
+                batches, executor.map(self.vector_encoder.encode_batch, batches)
+            ):
+                self._check_batch(batch, batch_vectors)
+                self._fill_batch(
+                    vectors,
+                    pending,
+                    batch,
+                    self.embedding_cache.put_many(
+                        self.embedding_model_name, batch, batch_vectors
+                    ),
+                )
+
+        return self._stack(vectors)
+
+    async def async_encode_batch(
+        self,
+        texts: list[str],
+        on_progress: Callable[[int], Awaitable[None]] | None = None,
+    ) -> np.ndarray:
+        """
+        Non-blocking version of `encode_batch` for use on the event loop.
+
+        The embedding cache is read and written on the io executor.
+
+        Args:
+            texts (list[str]): Texts to embed.
+            on_progress (Callable[[int], Awaitable[None]] | None, optional): Awaited with
+                the number of texts embedded so far, cached ones included, after
+                every batch. Defaults to None.
+
+        Returns:
+            np.ndarray: float32 array with one row per text.
+        """
+        vectors = await self.embedding_cache.async_get_many(
+            self.embedding_model_name, texts
         )
+        batches, pending = self._plan_batches(texts, vectors)
+        in_flight = asyncio.Semaphore(self.batch_config.max_in_flight)
+        embedded_count = sum(vector is not None for vector in vectors)
+
+        async def _encode(batch: list[str]) -> None:
+            nonlocal embedded_count
+
+            async with in_flight:
+                batch_vectors = await self.vector_encoder.async_encode_batch(batch)
+
+            self._check_batch(batch, batch_vectors)
+            cached_vectors = await self.embedding_cache.async_put_many(
+                self.embedding_model_name, batch, batch_vectors
+            )
+
+            embedded_count += self._fill_batch(vectors, pending, batch, cached_vectors)
+            if on_progress is not None:
+                await on_progress(embedded_count)
+
+        if on_progress is not None and embedded_count:
+            await on_progress(embedded_count)
+
+        await asyncio.gather(*[_encode(batch) for batch in batches])
+
+        return self._stack(vectors)
+
+    def _plan_batches(
+        self, texts: list[str], vectors: list[np.ndarray | None]
+    ) -> tuple[list[list[str]], dict[str, list[int]]]:
+        """
+        split the distinct uncached texts into batches, each text is hashed once
+
+        Returns the batches and, for each text sent, the indices of every text it embeds.
+        """
+        # text_hash -> the text sent and the indices it fills
+        uncached_texts: dict[str, tuple[str, list[int]]] = {}
+        for i, (text, vector) in enumerate(zip(texts, vectors)):
+            if vector is None:
+                uncached_texts.setdefault(
+                    self.embedding_cache.text_hash(text), (text, [])
+                )[1].append(i)
+
+        pending = {text: indices for text, indices in uncached_texts.values()}
+        distinct_texts = list(pending)
+        batch_size = self.batch_config.batch_size
+        return [
+            distinct_texts[i : i + batch_size]
+            for i in range(0, len(distinct_texts), batch_size)
+        ], pending
+
+    @staticmethod
+    def _check_batch(batch: list[str], batch_vectors: np.ndarray) -> None:
+        if len(batch_vectors) != len(batch):
+            raise ValueError(
+                f"Embedding server returned {len(batch_vectors)} vectors for {len(batch)} texts"
+            )
+
+    @staticmethod
+    def _fill_batch(
+        vectors: list[np.ndarray | None],
+        pending: dict[str, list[int]],
+        batch: list[str],
+        cached_vectors: list[np.ndarray],
+    ) -> int:
+        """fill every text embedded by a batch, returns the filled count"""
+        filled_count = 0
+        for text, vector in zip(batch, cached_vectors):
+            for i in pending[text]:
+                vectors[i] = vector
+                filled_count += 1
+
+        return filled_count
+
+    def _stack(self, vectors: list[np.ndarray | None]) -> np.ndarray:
+        if not vectors:
+            return np.empty((0, self._vector_dim or 0), dtype=np.float32)
+
+        return np.stack(vectors).astype(np.float32, copy=False)
 
 
 class OllamaEmbeddingEncoder(object):
@@ -102,41 +276,58 @@ class OllamaEmbeddingEncoder(object):
         self.ollama_embedding_model_name = (
             self.ollama_config.ollama_embedding_model_name
         )
+        self.model_name = self.ollama_embedding_model_name
         self.ollama_host_url = f"{self.ollama_host}:{self.ollama_port}"
         
         try:
             self.ollama_client = Client(
                 host=self.ollama_host_url
             )
+            self.async_ollama_client = AsyncClient(
+                host=self.ollama_host_url
+            )
         except Exception as e:
             self.logger.error(f"Failed to initialize OLLAMA client: {e}")
 
-    def encode(self, text: str) -> list[float]:
-        vector = self.ollama_client.embeddings(
+    def encode(self, text: str) -> np.ndarray:
+        return self.encode_batch([text])[0]
+
+    async def async_encode(self, text: str) -> np.ndarray:
+        return (await self.async_encode_batch([text]))[0]
+
+    def encode_batch(self, texts: list[str]) -> np.ndarray:
+        response = self.ollama_client.embed(
+            model=self.ollama_embedding_model_name,
+            input=texts,
+        )
+        return np.asarray(response.embeddings, dtype=np.float32)
+
+    async def async_encode_batch(self, texts: list[str]) -> np.ndarray:
+        response = await self.async_ollama_client.embed(
             model=self.ollama_embedding_model_name,
-            prompt=text,
+            input=texts,
         )
-        return [i for i in vector.embedding]
+        return np.asarray(response.embeddings, dtype=np.float32)
 
 
 class AfsEmbeddingEncoder(object):
     def initialization(self) -> None:
-        _api_key = str(getenv("AFS_API_URL"))
-        _url = str(getenv("AFS_API_KEY"))
-        _embedding_model = str(getenv("AFS_EMBEDDING_MODEL_NAME"))
+        _url = getenv("AFS_API_URL")
+        _api_key = getenv("AFS_API_KEY")
+        _embedding_model = getenv("AFS_EMBEDDING_MODEL_NAME")
 
         assert (
             _api_key is not None and _api_key != ""
-        ), "API_KEY environment variable is not set"
+        ), "AFS_API_KEY environment variable is not set"
         assert (
             _url is not None and _url != ""
-        ), "API_URL environment variable is not set"
+        ), "AFS_API_URL environment variable is not set"
         assert (
             _embedding_model is not None and _embedding_model != ""
         ), "AFS_EMBEDDING_MODEL_NAME environment variable is not set"
 
         self.config = AFSEmbeddingConfig(
-            url=_url + "/models/conversation",
+            url=_url.rstrip("/") + "/models/embeddings",
             api_key=_api_key,
             embedding_model_name=_embedding_model,
         )
@@ -144,6 +335,9 @@ class AfsEmbeddingEncoder(object):
         self.url = self.config.url
         self.api_key = self.config.api_key
         self.embedding_model_name = self.config.embedding_model_name
+        self.model_name = self.embedding_model_name
+
+        self.async_client = httpx.AsyncClient(timeout=None)
 
     def encode(self, text: str) -> np.ndarray:
         """convert text to ndarray (vector)
@@ -154,29 +348,52 @@ class AfsEmbeddingEncoder(object):
         Returns:
             ndarray: numpy array (vector)
         """
+        return self.encode_batch([text])[0]
+
+    async def async_encode(self, text: str) -> np.ndarray:
+        """Non-blocking version of `encode` using httpx."""
+        return (await self.async_encode_batch([text]))[0]
+
+    def encode_batch(self, texts: list[str]) -> np.ndarray:
+        """convert texts to a 2-D ndarray in one request
+
+        Args:
+            texts (list[str]): texts to be converted
+
+        Returns:
+            ndarray: float32 array with one row per text
+        """
+        response = requests.post(
+            self.url,
+            headers=self._headers(),
+            data=json.dumps({"model": self.embedding_model_name, "inputs": texts}),
+        )
+        response.raise_for_status()
+
+        return self._embeddings(response.json())
+
+    async def async_encode_batch(self, texts: list[str]) -> np.ndarray:
+        """Non-blocking version of `encode_batch` using httpx."""
+        response = await self.async_client.post(
+            self.url,
+            headers=self._headers(),
+            content=json.dumps({"model": self.embedding_model_name, "inputs": texts}),
+        )
+        response.raise_for_status()
+
+        return self._embeddings(response.json())
 
-        headers = {
+    def _headers(self) -> dict[str, str]:
+        return {
             "Content-Type": "application/json",
             "X-API-HOST": "afs-inference",
             "X-API-KEY": self.api_key,
         }
 
-        data = {"model": self.embedding_model_name, "inputs": [text]}
-
-        response = requests.post(self.url, headers=headers, data=json.dumps(data))
-        response_data = response.json()
-        print(response_data)
-        embeddings_vector = response_data["data"][0]["embedding"]
-        unpadded_vector = np.asarray(embeddings_vector, dtype=float)
-
-        # return np.pad(
-        #     unpadded_vector,
-        #     (0, 4096 - len(unpadded_vector)),
-        #     mode="constant",
-        #     constant_values=0,
-        # )
-
-        return unpadded_vector
+    @staticmethod
+    def _embeddings(response_data: dict) -> np.ndarray:
+        data = sorted(response_data["data"], key=lambda item: item.get("index", 0))
+        return np.asarray([item["embedding"] for item in data], dtype=np.float32)
 
     # def encoder(self, text: str) -> np.ndarray:
     #     """convert text to ndarray (vector)
@@ -213,5 +430,58 @@ class AfsEmbeddingEncoder(object):
 
 
 class OpenaiEmbeddingEncoder(object):
-    def initialization(self): ...
-    def encode(self, text: str) -> list[float]: ...
+    """Any server implementing the OpenAI `/embeddings` API."""
+
+    def initialization(self) -> None:
+        _api_url = getenv("OPENAI_API_URL")
+        _api_key = getenv("OPENAI_API_KEY")
+        _embedding_model = getenv("OPENAI_EMBEDDING_MODEL_NAME")
+
+        assert _api_url, "OPENAI_API_URL environment variable is not set"
+        assert _api_key, "OPENAI_API_KEY environment variable is not set"
+        assert (
+            _embedding_model
+        ), "OPENAI_EMBEDDING_MODEL_NAME environment variable is not set"
+
+        self.config = OPENAIEmbeddingConfig(
+            api_url=_api_url.rstrip("/") + "/embeddings",
+            api_key=_api_key,
+            embedding_model_name=_embedding_model,
+        )
+        self.model_name = self.config.embedding_model_name
+
+        self.client = httpx.Client(timeout=None)
+        self.async_client = httpx.AsyncClient(timeout=None)
+
+    def encode(self, text: str) -> np.ndarray:
+        return self.encode_batch([text])[0]
+
+    async def async_encode(self, text: str) -> np.ndarray:
+        return (await self.async_encode_batch([text]))[0]
+
+    def encode_batch(self, texts: list[str]) -> np.ndarray:
+        response = self.client.post(
+            self.config.api_url, headers=self._headers(), json=self._payload(texts)
+        )
+        response.raise_for_status()
+
+        return self._embeddings(response.json())
+
+    async def async_encode_batch(self, texts: list[str]) -> np.ndarray:
+        response = await self.async_client.post(
+            self.config.api_url, headers=self._headers(), json=self._payload(texts)
+        )
+        response.raise_for_status()
+
+        return self._embeddings(response.json())
+
+    def _headers(self) -> dict[str, str]:
+        return {"Authorization": f"Bearer {self.config.api_key}"}
+
+    def _payload(self, texts: list[str]) -> dict:
+        return {"model": self.config.embedding_model_name, "input": texts}
+
+    @staticmethod
+    def _embeddings(response_data: dict) -> np.ndarray:
+        data = sorted(response_data["data"], key=lambda item: item["index"])
+        return np.asarray([item["embedding"] for item in data], dtype=np.float32)
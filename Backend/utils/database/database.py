@@ -2,8 +2,12 @@
 
 from Backend.utils.helper.model.database.database import (
     QueryDocumentationTypeListModel,
+    IngestionJobModel,
+    FileRecordModel,
+    ChatRecordModel,
     UserInfoModel,
 )
+from Backend.utils.helper.executor import mysql_executor
 from Backend.utils.helper.logger import CustomLoggerHandler
 from typing import Literal
 
@@ -120,6 +124,68 @@ class SetupMYSQL(object):
             self.connection.database = self.DATABASE
             self.cursor = self.connection.cursor(dictionary=True, prepared=True)
 
+        self.create_ingestion_job_table()
+        self.add_column_if_missing(
+            "file", "file_hash", "CHAR(64) DEFAULT NULL, ADD INDEX `file_hash` (`file_hash`)"
+        )
+        self.add_column_if_missing("ingestion_job", "file_hash", "CHAR(64) DEFAULT NULL")
+        for column in ["added_chunks", "removed_chunks", "unchanged_chunks"]:
+            self.add_column_if_missing("ingestion_job", column, "INT NOT NULL DEFAULT 0")
+
+    def add_column_if_missing(self, table: str, column: str, definition: str) -> None:
+        """
+        Add a column to a table of a database created before the column existed.
+
+        Args:
+            table (str): Table name.
+            column (str): Column name.
+            definition (str): Column definition, optionally followed by more
+                `ALTER TABLE` clauses such as an index.
+        """
+        self.cursor.execute(
+            """SELECT COUNT(*) AS `count`
+            FROM information_schema.columns
+            WHERE table_schema = %s AND table_name = %s AND column_name = %s
+            """,
+            (self.DATABASE, table, column),
+        )
+        if self.cursor.fetchone()["count"]:
+            return
+
+        self.logger.info(f"Adding column `{column}` to table `{table}`")
+        self.cursor.execute(
+            f"ALTER TABLE `{self.DATABASE}`.`{table}` ADD COLUMN `{column}` {definition};"
+        )
+        self.connection.commit()
+
+    def create_ingestion_job_table(self) -> None:
+        """Create the INGESTION_JOB table, also in databases created before it existed."""
+        self.cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS `{self.DATABASE}`.`ingestion_job` (
+                `job_id` VARCHAR(45) NOT NULL,
+                `file_id` VARCHAR(45) NOT NULL,
+                `file_name` VARCHAR(255) NOT NULL,
+                `collection` VARCHAR(45) NOT NULL DEFAULT "default",
+                `tags` JSON NOT NULL DEFAULT (JSON_OBJECT()),
+                `kind` VARCHAR(16) NOT NULL DEFAULT "upload",
+                `status` VARCHAR(16) NOT NULL DEFAULT "queued",
+                `embedded_chunks` INT NOT NULL DEFAULT 0,
+                `total_chunks` INT NOT NULL DEFAULT 0,
+                `error` TEXT DEFAULT NULL,
+                `file_hash` CHAR(64) DEFAULT NULL,
+                `added_chunks` INT NOT NULL DEFAULT 0,
+                `removed_chunks` INT NOT NULL DEFAULT 0,
+                `unchanged_chunks` INT NOT NULL DEFAULT 0,
+                `created_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                `updated_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                PRIMARY KEY (`job_id`),
+                INDEX `status` (`status`)
+            );
+            """
+        )
+        self.connection.commit()
+
     def create_database(self) -> None:
         self.cursor.execute(f"CREATE DATABASE {self.DATABASE};")
         self.connection.connect(database=self.DATABASE)
@@ -192,8 +258,10 @@ class SetupMYSQL(object):
                 `last_update` TIMESTAMP NOT NULL DEFAULT NOW(),
                 `expired` TINYINT NOT NULL DEFAULT "0",
                 `tags` JSON NOT NULL DEFAULT (JSON_OBJECT()),
+                `file_hash` CHAR(64) DEFAULT NULL,
                 PRIMARY KEY (`file_id`, `collection`),
-                UNIQUE INDEX `file_id` (`file_id` ASC)
+                UNIQUE INDEX `file_id` (`file_id` ASC),
+                INDEX `file_hash` (`file_hash`)
             );
             """
         )
@@ -491,7 +559,13 @@ class MySQLHandler(SetupMYSQL):
     #     """
 
     def insert_file(
-        self, file_uuid: str, filename: str, tags: str, collection: str = "default"
+        self,
+        file_uuid: str,
+        filename: str,
+        tags: str,
+        collection: str = "default",
+        file_hash: str | None = None,
+        expired: bool = False,
     ) -> bool:
         """
         Insert a file record into the database.
@@ -503,26 +577,349 @@ class MySQLHandler(SetupMYSQL):
             filename (str): The name of the file.
             tags (str): A string representation of tags associated with the file.
             collection (str, optional): The collection to which the file belongs. Defaults to "default".
+            file_hash (str | None, optional): sha256 of the file content. Defaults to None.
+            expired (bool, optional): Insert the file excluded from retrieval. Defaults to False.
 
         Returns:
             bool: True if the file record was successfully inserted, False otherwise.
         """
         self.connection.ping(attempts=3)
         self.logger.debug(
-            pformat(f"insert_file {file_uuid} {filename} {tags} {collection}")
+            pformat(
+                f"insert_file {file_uuid} {filename} {tags} {collection} {file_hash} {expired}"
+            )
         )
 
         self.cursor.execute(
             """
-            INSERT INTO `file` (file_id, file_name, tags, collection)
+            INSERT INTO `file` (file_id, file_name, tags, collection, file_hash, expired)
             VALUES (
-                %s, %s, %s, %s
+                %s, %s, %s, %s, %s, %s
             );""",
-            (file_uuid, filename, tags, collection),
+            (file_uuid, filename, tags, collection, file_hash, expired),
         )
 
         return self.commit()
 
+    def query_file(self, file_uuid: str) -> FileRecordModel | None:
+        """
+        Retrieve the record of a file.
+
+        Args:
+            file_uuid (str): The unique identifier of the file.
+
+        Returns:
+            FileRecordModel | None: The file record, or None if the file does not exist.
+        """
+        self.connection.ping(attempts=3)
+        self.cursor.execute(
+            f"""SELECT file_id, file_name, collection, expired, tags, file_hash
+            FROM `{self.DATABASE}`.`file`
+            WHERE file_id = %s
+            """,
+            (file_uuid,),
+        )
+
+        self.sql_query_logger()
+        file_record = self.cursor.fetchone()
+        if not file_record:
+            return None
+
+        return self._file_record(file_record)
+
+    def query_file_by_hash(
+        self, file_hash: str, collection: str = "default"
+    ) -> FileRecordModel | None:
+        """
+        Retrieve the record of a file of a collection by its content hash.
+
+        Args:
+            file_hash (str): sha256 of the file content.
+            collection (str, optional): The collection of the file. Defaults to "default".
+
+        Returns:
+            FileRecordModel | None: The file record, or None if no file has this content.
+        """
+        self.connection.ping(attempts=3)
+        self.cursor.execute(
+            f"""SELECT file_id, file_name, collection, expired, tags, file_hash
+            FROM `{self.DATABASE}`.`file`
+            WHERE file_hash = %s AND collection = %s
+            LIMIT 1
+            """,
+            (file_hash, collection),
+        )
+
+        self.sql_query_logger()
+        file_record = self.cursor.fetchone()
+        if not file_record:
+            return None
+
+        return self._file_record(file_record)
+
+    def query_file_by_name(
+        self, filename: str, collection: str = "default"
+    ) -> FileRecordModel | None:
+        """
+        Retrieve the most recently updated file of a collection with a given name.
+
+        Args:
+            filename (str): The name of the file.
+            collection (str, optional): The collection of the file. Defaults to "default".
+
+        Returns:
+            FileRecordModel | None: The file record, or None if no file has this name.
+        """
+        self.connection.ping(attempts=3)
+        self.cursor.execute(
+            f"""SELECT file_id, file_name, collection, expired, tags, file_hash
+            FROM `{self.DATABASE}`.`file`
+            WHERE file_name = %s AND collection = %s
+            ORDER BY last_update DESC
+            LIMIT 1
+            """,
+            (filename, collection),
+        )
+
+        self.sql_query_logger()
+        file_record = self.cursor.fetchone()
+        if not file_record:
+            return None
+
+        return self._file_record(file_record)
+
+    def query_expired_files(self) -> list[FileRecordModel]:
+        """
+        Retrieve the records of every expired file.
+
+        Returns:
+            list[FileRecordModel]: The expired file records.
+        """
+        self.connection.ping(attempts=3)
+        self.cursor.execute(
+            f"""SELECT file_id, file_name, collection, expired, tags, file_hash
+            FROM `{self.DATABASE}`.`file`
+            WHERE `expired` = 1
+            """
+        )
+
+        self.sql_query_logger()
+        return [
+            self._file_record(file_record) for file_record in self.cursor.fetchall()
+        ]
+
+    @staticmethod
+    def _file_record(file_record: dict) -> FileRecordModel:
+        return FileRecordModel(
+            file_id=file_record["file_id"],
+            file_name=file_record["file_name"],
+            collection=file_record["collection"],
+            expired=bool(file_record["expired"]),
+            tags=str(file_record["tags"]),
+            file_hash=file_record["file_hash"],
+        )
+
+    def update_file_expired(self, file_uuid: str, expired: bool) -> bool:
+        """
+        Mark a file as expired or active.
+
+        Args:
+            file_uuid (str): The unique identifier of the file.
+            expired (bool): True to expire the file, False to restore it.
+
+        Returns:
+            bool: True if the file record was successfully updated, False otherwise.
+        """
+        self.connection.ping(attempts=3)
+        self.logger.info(f"update_file_expired {file_uuid}:{expired}")
+
+        self.cursor.execute(
+            """
+            UPDATE `file`
+            SET expired = %s
+            WHERE file_id = %s;""",
+            (expired, file_uuid),
+        )
+
+        return self.commit()
+
+    def update_file(
+        self,
+        file_uuid: str,
+        filename: str,
+        file_hash: str | None = None,
+        tags: str | None = None,
+    ) -> bool:
+        """
+        Record that a file was re-indexed, which also restores an expired file.
+
+        Args:
+            file_uuid (str): The unique identifier of the file.
+            filename (str): The name of the new file content.
+            file_hash (str | None, optional): sha256 of the new file content. Defaults
+                to keeping the current hash.
+            tags (str | None, optional): The JSON tags of the new file content.
+                Defaults to keeping the current tags.
+
+        Returns:
+            bool: True if the file record was successfully updated, False otherwise.
+        """
+        self.connection.ping(attempts=3)
+        self.logger.debug(
+            pformat(f"update_file {file_uuid} {filename} {file_hash} {tags}")
+        )
+
+        self.cursor.execute(
+            """
+            UPDATE `file`
+            SET file_name = %s, file_hash = COALESCE(%s, file_hash), tags = COALESCE(%s, tags),
+                last_update = NOW(), expired = 0
+            WHERE file_id = %s;""",
+            (filename, file_hash, tags, file_uuid),
+        )
+
+        return self.commit()
+
+    def delete_file(self, file_uuid: str) -> bool:
+        """
+        Soft delete a file: it is expired and its content hash cleared, the record
+        is kept for the chat attachments citing it.
+
+        A re-upload of the same content is indexed again instead of being
+        reported as a duplicate, and re-indexing restores the file.
+
+        Args:
+            file_uuid (str): The unique identifier of the file.
+
+        Returns:
+            bool: True if the file record was successfully updated, False otherwise.
+        """
+        self.connection.ping(attempts=3)
+        self.logger.info(f"delete_file {file_uuid}")
+
+        self.cursor.execute(
+            """
+            UPDATE `file`
+            SET expired = 1, file_hash = NULL, last_update = NOW()
+            WHERE file_id = %s;""",
+            (file_uuid,),
+        )
+
+        return self.commit()
+
+    def insert_ingestion_job(self, job: IngestionJobModel) -> bool:
+        """
+        Insert a queued ingestion job.
+
+        Args:
+            job (IngestionJobModel): The job to insert.
+
+        Returns:
+            bool: True if the job was successfully inserted, False otherwise.
+        """
+        self.connection.ping(attempts=3)
+        self.logger.debug(pformat(f"insert_ingestion_job {job.job_id} {job.file_id}"))
+
+        self.cursor.execute(
+            """
+            INSERT INTO `ingestion_job` (job_id, file_id, file_name, collection, tags, kind, status, file_hash)
+            VALUES (
+                %s, %s, %s, %s, %s, %s, %s, %s
+            );""",
+            (
+                job.job_id,
+                job.file_id,
+                job.file_name,
+                job.collection,
+                job.tags,
+                job.kind,
+                job.status,
+                job.file_hash,
+            ),
+        )
+
+        return self.commit()
+
+    def update_ingestion_job(self, job: IngestionJobModel) -> bool:
+        """
+        Update the status, progress, chunk counts and error of an ingestion job.
+
+        Args:
+            job (IngestionJobModel): The job to update.
+
+        Returns:
+            bool: True if the job was successfully updated, False otherwise.
+        """
+        self.connection.ping(attempts=3)
+
+        self.cursor.execute(
+            """
+            UPDATE `ingestion_job`
+            SET status = %s, embedded_chunks = %s, total_chunks = %s, error = %s,
+                added_chunks = %s, removed_chunks = %s, unchanged_chunks = %s
+            WHERE job_id = %s;""",
+            (
+                job.status,
+                job.embedded_chunks,
+                job.total_chunks,
+                job.error,
+                job.added_chunks,
+                job.removed_chunks,
+                job.unchanged_chunks,
+                job.job_id,
+            ),
+        )
+
+        return self.commit()
+
+    def query_ingestion_job(self, job_id: str) -> IngestionJobModel | None:
+        """
+        Retrieve an ingestion job.
+
+        Args:
+            job_id (str): The unique identifier of the job.
+
+        Returns:
+            IngestionJobModel | None: The job, or None if it does not exist.
+        """
+        self.connection.ping(attempts=3)
+        self.cursor.execute(
+            f"""SELECT *
+            FROM `{self.DATABASE}`.`ingestion_job`
+            WHERE job_id = %s
+            """,
+            (job_id,),
+        )
+
+        self.sql_query_logger()
+        job = self.cursor.fetchone()
+        if not job:
+            return None
+
+        return IngestionJobModel(**{**job, "tags": str(job["tags"])})
+
+    def query_unfinished_ingestion_jobs(self) -> list[IngestionJobModel]:
+        """
+        Retrieve the queued and running ingestion jobs, oldest first.
+
+        Returns:
+            list[IngestionJobModel]: The unfinished jobs.
+        """
+        self.connection.ping(attempts=3)
+        self.cursor.execute(
+            f"""SELECT *
+            FROM `{self.DATABASE}`.`ingestion_job`
+            WHERE status IN ("queued", "running")
+            ORDER BY created_at
+            """
+        )
+
+        self.sql_query_logger()
+        return [
+            IngestionJobModel(**{**job, "tags": str(job["tags"])})
+            for job in self.cursor.fetchall()
+        ]
+
     def update_rating(self, question_uuid: str, rating: bool) -> bool:
         """
         Update the rating of an answer in the database.
@@ -640,6 +1037,133 @@ class MySQLHandler(SetupMYSQL):
 
         return success
 
+    def insert_chatting_batch(self, records: list[ChatRecordModel]) -> None:
+        """
+        Insert many chat records in a single transaction.
+
+        The chat, qa and attachment rows of all records are written with one
+        multi-row INSERT per table and a single commit.
+
+        Args:
+            records (list[ChatRecordModel]): The chat records to insert.
+
+        Raises:
+            connector.Error: If the transaction fails, after it was rolled back.
+        """
+        if not records:
+            return
+
+        self.connection.ping(reconnect=True, attempts=3)
+
+        usernames = list({record.sent_by for record in records} | {"Anonymous"})
+        username_placeholders = ", ".join(["%s"] * len(usernames))
+        self.cursor.execute(
+            f"""SELECT user_id, username FROM user WHERE username IN ({username_placeholders})""",
+            tuple(usernames),
+        )
+        user_ids = {row["username"]: row["user_id"] for row in self.cursor.fetchall()}
+
+        chat_rows = []
+        qa_rows = []
+        attachment_rows = []
+        for record in records:
+            if record.sent_by not in user_ids:
+                self.logger.warning(
+                    f"Unknown user {record.sent_by}, storing {record.qa_id} as Anonymous"
+                )
+
+            chat_rows.append(
+                (
+                    record.chat_id,
+                    user_ids.get(record.sent_by, user_ids["Anonymous"]),
+                    record.answer[:10],
+                )
+            )
+            qa_rows.append(
+                (
+                    record.chat_id,
+                    record.qa_id,
+                    record.question,
+                    record.answer,
+                    record.token_size,
+                    record.rating,
+                    record.sent_time,
+                    record.sent_by,
+                )
+            )
+            attachment_rows.extend(
+                (record.chat_id, record.qa_id, file_id)
+                for file_id in set(record.file_ids)
+            )
+
+        self.logger.debug(pformat(f"insert_chatting_batch {len(records)} records"))
+
+        try:
+            self._insert_rows(
+                f"INSERT IGNORE INTO `{self.DATABASE}`.`chat` (chat_id, user_id, chat_name)",
+                chat_rows,
+            )
+            self._insert_rows(
+                f"""INSERT INTO `{self.DATABASE}`.`qa`
+                (chat_id, qa_id, question, answer, token_size, rating, sent_time, sent_by)""",
+                qa_rows,
+            )
+            self._insert_rows(
+                f"INSERT IGNORE INTO `{self.DATABASE}`.`attachment` (chat_id, qa_id, file_id)",
+                attachment_rows,
+            )
+            self.sql_query_logger()
+            self.connection.commit()
+        except connector.Error as error:
+            self.logger.error(error)
+            self.connection.rollback()
+            raise
+
+    def _insert_rows(self, insert_statement: str, rows: list[tuple]) -> None:
+        """execute a multi-row INSERT of same sized rows"""
+        if not rows:
+            return
+
+        placeholder = f"({', '.join(['%s'] * len(rows[0]))})"
+        self.cursor.execute(
+            f"{insert_statement} VALUES {', '.join([placeholder] * len(rows))}",
+            tuple(value for row in rows for value in row),
+        )
+
+    def query_chat_history(self, chat_id: str, limit: int = 50) -> list[dict[str, str]]:
+        """
+        Retrieve the most recent questions and answers of a chat.
+
+        Args:
+            chat_id (str): The unique identifier for the chat session.
+            limit (int, optional): Maximum number of turns to return. Defaults to 50.
+
+        Returns:
+            list[dict[str, str]]: The `qa_id`, `question` and `answer` of each turn,
+                oldest first.
+        """
+        self.connection.ping(attempts=3)
+        self.logger.debug(pformat(f"query_chat_history {chat_id}"))
+
+        self.cursor.execute(
+            f"""SELECT qa_id, question, answer
+            FROM `{self.DATABASE}`.`qa`
+            WHERE chat_id = %s
+            ORDER BY sent_time DESC
+            LIMIT %s
+            """,
+            (chat_id, limit),
+        )
+
+        self.sql_query_logger()
+        chat_history = [
+            {"qa_id": row["qa_id"], "question": row["question"], "answer": row["answer"]}
+            for row in self.cursor.fetchall()
+        ]
+        chat_history.reverse()
+
+        return chat_history
+
     # def query_docs_id(self, docs_name: str) -> str:
     #     """
     #         search documents by id
@@ -777,6 +1301,163 @@ class MySQLHandler(SetupMYSQL):
                 self.logger.debug(pformat("Mysql connection closed"))
 
 
+class AsyncMySQLHandler(object):
+    """
+    Non-blocking facade over `MySQLHandler` for use on the event loop.
+
+    Every call runs on the single-worker MySQL executor, so queries on the
+    shared connection never interleave.
+    """
+
+    def __init__(self) -> None:
+        self.mysql_client = MySQLHandler()
+
+    async def create_user(
+        self,
+        username: str,
+        hashed_password: str,
+        role_name: Literal["user", "admin"] = "user",
+    ) -> int | bool:
+        return await mysql_executor.run(
+            self.mysql_client.create_user, username, hashed_password, role_name
+        )
+
+    async def insert_login_token(self, user_id: int, jwt_token: str) -> bool:
+        return await mysql_executor.run(
+            self.mysql_client.insert_login_token, user_id, jwt_token
+        )
+
+    async def get_user_info(
+        self, username: str, hashed_password: str
+    ) -> tuple[int, UserInfoModel] | tuple[int, str]:
+        return await mysql_executor.run(
+            self.mysql_client.get_user_info, username, hashed_password
+        )
+
+    async def insert_file(
+        self,
+        file_uuid: str,
+        filename: str,
+        tags: str,
+        collection: str = "default",
+        file_hash: str | None = None,
+        expired: bool = False,
+    ) -> bool:
+        return await mysql_executor.run(
+            self.mysql_client.insert_file,
+            file_uuid=file_uuid,
+            filename=filename,
+            tags=tags,
+            collection=collection,
+            file_hash=file_hash,
+            expired=expired,
+        )
+
+    async def query_file(self, file_uuid: str) -> FileRecordModel | None:
+        return await mysql_executor.run(self.mysql_client.query_file, file_uuid)
+
+    async def query_file_by_hash(
+        self, file_hash: str, collection: str = "default"
+    ) -> FileRecordModel | None:
+        return await mysql_executor.run(
+            self.mysql_client.query_file_by_hash, file_hash, collection
+        )
+
+    async def query_file_by_name(
+        self, filename: str, collection: str = "default"
+    ) -> FileRecordModel | None:
+        return await mysql_executor.run(
+            self.mysql_client.query_file_by_name, filename, collection
+        )
+
+    async def query_expired_files(self) -> list[FileRecordModel]:
+        return await mysql_executor.run(self.mysql_client.query_expired_files)
+
+    async def update_file_expired(self, file_uuid: str, expired: bool) -> bool:
+        return await mysql_executor.run(
+            self.mysql_client.update_file_expired,
+            file_uuid=file_uuid,
+            expired=expired,
+        )
+
+    async def update_file(
+        self,
+        file_uuid: str,
+        filename: str,
+        file_hash: str | None = None,
+        tags: str | None = None,
+    ) -> bool:
+        return await mysql_executor.run(
+            self.mysql_client.update_file,
+            file_uuid=file_uuid,
+            filename=filename,
+            file_hash=file_hash,
+            tags=tags,
+        )
+
+    async def delete_file(self, file_uuid: str) -> bool:
+        return await mysql_executor.run(self.mysql_client.delete_file, file_uuid)
+
+    async def insert_ingestion_job(self, job: IngestionJobModel) -> bool:
+        return await mysql_executor.run(self.mysql_client.insert_ingestion_job, job)
+
+    async def update_ingestion_job(self, job: IngestionJobModel) -> bool:
+        return await mysql_executor.run(self.mysql_client.update_ingestion_job, job)
+
+    async def query_ingestion_job(self, job_id: str) -> IngestionJobModel | None:
+        return await mysql_executor.run(self.mysql_client.query_ingestion_job, job_id)
+
+    async def query_unfinished_ingestion_jobs(self) -> list[IngestionJobModel]:
+        return await mysql_executor.run(
+            self.mysql_client.query_unfinished_ingestion_jobs
+        )
+
+    async def update_rating(self, question_uuid: str, rating: bool) -> bool:
+        return await mysql_executor.run(
+            self.mysql_client.update_rating,
+            question_uuid=question_uuid,
+            rating=rating,
+        )
+
+    async def insert_chatting(
+        self,
+        chat_id: str,
+        qa_id: str,
+        question: str,
+        answer: str,
+        token_size: int,
+        sent_by: str,
+        file_ids: list[str],
+    ) -> bool:
+        return await mysql_executor.run(
+            self.mysql_client.insert_chatting,
+            chat_id=chat_id,
+            qa_id=qa_id,
+            question=question,
+            answer=answer,
+            token_size=token_size,
+            sent_by=sent_by,
+            file_ids=file_ids,
+        )
+
+    async def query_chat_history(
+        self, chat_id: str, limit: int = 50
+    ) -> list[dict[str, str]]:
+        return await mysql_executor.run(
+            self.mysql_client.query_chat_history, chat_id, limit
+        )
+
+    async def query_docs_name(self, docs_id: str) -> str:
+        return await mysql_executor.run(self.mysql_client.query_docs_name, docs_id)
+
+    async def query_documentation_type_list(
+        self, documentation_type: str
+    ) -> list[QueryDocumentationTypeListModel]:
+        return await mysql_executor.run(
+            self.mysql_client.query_documentation_type_list, documentation_type
+        )
+
+
 if __name__ == "__main__":
     from dotenv import load_dotenv
 
@@ -0,0 +1,616 @@
+# Code by AkinoAlice@TyrantRey
+
+from Backend.utils.helper.model.database.embedded_vector_store import (
+    EmbeddedCollectionManifestModel,
+    EmbeddedVectorStoreConfig,
+)
+from Backend.utils.helper.model.database.vector_database import (
+    ChunkPositionModel,
+    InsertSentencesResultModel,
+    SearchSimilarityModel,
+)
+from Backend.utils.database.vector_store import VectorStore, chunk_hash
+from Backend.utils.helper.logger import CustomLoggerHandler
+
+from os import getenv, path
+
+import numpy as np
+import threading
+import json
+import os
+
+# rows per block when assigning vectors to IVF centroids
+ASSIGN_BLOCK_ROWS = 65536
+KMEANS_ITERATIONS = 10
+
+
+class EmbeddedSegment(object):
+    """
+    Immutable block of rows.
+
+    Vectors are a float32 `.npy` matrix opened memory-mapped, the other fields
+    are stored next to it as JSON. Segments built by compaction may carry an IVF
+    index in `.ivf.npz`.
+    """
+
+    def __init__(self, directory: str, name: str) -> None:
+        self.name = name
+        self.vectors: np.ndarray = np.load(
+            path.join(directory, f"{name}.npy"), mmap_mode="r"
+        )
+
+        with open(path.join(directory, f"{name}.json"), encoding="utf-8") as f:
+            # [id, source, file_uuid, content, content_hash, page, end_page, ordinal],
+            # segments written before the positions were stored end at content_hash
+            self.rows: list[list] = json.load(f)
+
+        self.ids = np.asarray([row[0] for row in self.rows], dtype=np.int64)
+        self.file_uuids = np.asarray([row[2] for row in self.rows], dtype=str)
+        self.squared_norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+        self.live = np.ones(len(self.rows), dtype=bool)
+
+        self.centroids: np.ndarray | None = None
+        self.list_order: np.ndarray | None = None
+        self.list_offsets: np.ndarray | None = None
+
+        ivf_path = path.join(directory, f"{name}.ivf.npz")
+        if path.exists(ivf_path):
+            with np.load(ivf_path) as ivf:
+                self.centroids = ivf["centroids"]
+                self.list_order = ivf["order"]
+                self.list_offsets = ivf["offsets"]
+
+    def apply_deleted(self, deleted_ids: np.ndarray) -> None:
+        self.live = ~np.isin(self.ids, deleted_ids)
+
+    def candidates(self, query: np.ndarray, metric_type: str, nprobe: int) -> np.ndarray:
+        """row indices to score, the rows of the `nprobe` nearest IVF lists if indexed"""
+        if (
+            self.centroids is None
+            or self.list_order is None
+            or self.list_offsets is None
+            or nprobe >= len(self.centroids)
+        ):
+            return np.arange(len(self.rows))
+
+        centroid_scores = _scores(self.centroids, None, query[None], metric_type)[:, 0]
+        nearest_lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+        return np.concatenate(
+            [
+                self.list_order[self.list_offsets[i] : self.list_offsets[i + 1]]
+                for i in nearest_lists
+            ]
+        )
+
+
+def _scores(
+    vectors: np.ndarray,
+    squared_norms: np.ndarray | None,
+    queries: np.ndarray,
+    metric_type: str,
+) -> np.ndarray:
+    """
+    Score rows against 2-D queries, one column per query.
+
+    Higher is better: similarity for IP/COSINE, negative squared distance for L2.
+    """
+    similarity = vectors @ queries.T
+    if metric_type != "L2":
+        return similarity
+
+    if squared_norms is None:
+        squared_norms = np.einsum("ij,ij->i", vectors, vectors)
+
+    return (
+        2 * similarity
+        - squared_norms[:, None]
+        - np.einsum("ij,ij->i", queries, queries)[None, :]
+    )
+
+
+class EmbeddedVectorStore(VectorStore):
+    """
+    Vector store inside the backend process, no Milvus server required.
+
+    Each collection is a directory of append-only segments listed in a
+    `manifest.json`. Every insert writes a new segment and deletes are recorded
+    in the manifest. Once there are more than `EMBEDDED_MAX_SEGMENTS` segments,
+    or deleted rows exceed `EMBEDDED_MAX_DELETED_RATIO`, the collection is
+    compacted into one segment. With `EMBEDDED_INDEX_TYPE=IVF_FLAT`, compaction
+    also builds an IVF index for collections of at least `EMBEDDED_IVF_MIN_ROWS`
+    rows. Searches are vectorized brute force over the (probed) rows.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(EmbeddedVectorStore, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self) -> None:
+        self.config = EmbeddedVectorStoreConfig(
+            path=getenv("EMBEDDED_VECTOR_STORE_PATH", "./vector_store"),
+            metric_type=getenv("EMBEDDED_METRIC_TYPE", "COSINE"),
+            index_type=getenv("EMBEDDED_INDEX_TYPE", "FLAT"),
+            ivf_nlist=int(getenv("EMBEDDED_IVF_NLIST", "1024")),
+            ivf_nprobe=int(getenv("EMBEDDED_IVF_NPROBE", "16")),
+            ivf_min_rows=int(getenv("EMBEDDED_IVF_MIN_ROWS", "50000")),
+            max_segments=int(getenv("EMBEDDED_MAX_SEGMENTS", "16")),
+            max_deleted_ratio=float(getenv("EMBEDDED_MAX_DELETED_RATIO", "0.2")),
+        )
+
+        self.logger = CustomLoggerHandler(__name__).setup_logging()
+        os.makedirs(self.config.path, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._manifests: dict[str, EmbeddedCollectionManifestModel] = {}
+        self._segments: dict[str, list[EmbeddedSegment]] = {}
+        # content hash -> id of the live rows of each collection
+        self._hashes: dict[str, dict[str, int]] = {}
+
+        self.logger.info(f"Using embedded vector store {self.config.path}")
+
+    def insert_sentences(
+        self,
+        vectors: np.ndarray,
+        contents: list[str],
+        sources: list[str],
+        file_uuids: list[str],
+        collection: str = "default",
+        remove_duplicates: bool = True,
+        positions: list[ChunkPositionModel] | None = None,
+    ) -> InsertSentencesResultModel:
+        if not contents:
+            return InsertSentencesResultModel(insert_count=0, skipped_count=0, ids=[])
+
+        if positions is None:
+            positions = [ChunkPositionModel()] * len(contents)
+
+        vectors = self._prepare_vectors(vectors)
+        if vectors.ndim != 2 or not (
+            vectors.shape[0]
+            == len(contents)
+            == len(sources)
+            == len(file_uuids)
+            == len(positions)
+        ):
+            raise ValueError(
+                f"Columns don't match: vectors {vectors.shape}, contents {len(contents)}, "
+                f"sources {len(sources)}, file_uuids {len(file_uuids)}, positions {len(positions)}"
+            )
+
+        with self._lock:
+            if not self._load_collection(collection):
+                self._manifests[collection] = EmbeddedCollectionManifestModel(
+                    dimension=vectors.shape[1]
+                )
+                self._segments[collection] = []
+                self._hashes[collection] = {}
+                os.makedirs(self._collection_path(collection), exist_ok=True)
+                self.logger.info(f"Created embedded collection `{collection}`")
+
+            manifest = self._manifests[collection]
+            if vectors.shape[1] != manifest.dimension:
+                raise ValueError(
+                    f"Collection `{collection}` has dimension {manifest.dimension}, got {vectors.shape[1]}"
+                )
+
+            hashes = self._hashes[collection]
+            keep = []
+            rows = []
+            for i, (content, source, file_uuid, position) in enumerate(
+                zip(contents, sources, file_uuids, positions)
+            ):
+                content_hash = chunk_hash(source, content)
+                if remove_duplicates and content_hash in hashes:
+                    continue
+
+                hashes[content_hash] = manifest.next_id
+                rows.append(
+                    [
+                        manifest.next_id,
+                        str(source),
+                        file_uuid,
+                        content,
+                        content_hash,
+                        position.page,
+                        position.end_page,
+                        position.ordinal,
+                    ]
+                )
+                keep.append(i)
+                manifest.next_id += 1
+
+            if rows:
+                segment_name = f"segment_{manifest.next_segment}"
+                manifest.next_segment += 1
+                self._write_segment(collection, segment_name, vectors[keep], rows)
+                manifest.segments.append(segment_name)
+                self._write_manifest(collection)
+                self._segments[collection].append(
+                    EmbeddedSegment(self._collection_path(collection), segment_name)
+                )
+                self._compact_if_needed(collection)
+
+        self.logger.debug(
+            f"Inserted {len(rows)} sentences into {collection}, skipped {len(contents) - len(rows)} duplicates"
+        )
+        return InsertSentencesResultModel(
+            insert_count=len(rows),
+            skipped_count=len(contents) - len(rows),
+            ids=[str(row[0]) for row in rows],
+        )
+
+    def search_similarity(
+        self,
+        question_vector: np.ndarray,
+        collection_name: str = "default",
+        limit: int = 3,
+        file_uuids: list[str] | None = None,
+        exclude_file_uuids: list[str] | None = None,
+    ) -> list[SearchSimilarityModel]:
+        return self._search_many(
+            [question_vector],
+            collection_name=collection_name,
+            limit=limit,
+            file_uuids=file_uuids,
+            exclude_file_uuids=exclude_file_uuids,
+        )[0]
+
+    def _search_many(
+        self,
+        question_vectors: np.ndarray | list[np.ndarray],
+        collection_name: str,
+        limit: int,
+        file_uuids: list[str] | None,
+        exclude_file_uuids: list[str] | None,
+    ) -> list[list[SearchSimilarityModel]]:
+        """score every query against each segment in one matrix product"""
+        queries = self._prepare_vectors(np.atleast_2d(np.asarray(question_vectors)))
+
+        with self._lock:
+            if not self._load_collection(collection_name):
+                self.logger.warning(f"Collection `{collection_name}` does not exist")
+                return [[] for _ in queries]
+
+            segments = list(self._segments[collection_name])
+
+        file_uuid_filter = None if file_uuids is None else np.asarray(file_uuids, dtype=str)
+        file_uuid_exclusion = (
+            np.asarray(exclude_file_uuids, dtype=str) if exclude_file_uuids else None
+        )
+
+        # best `limit` of every segment for each query, then the best of those
+        candidates: list[list[tuple[float, EmbeddedSegment, int]]] = [
+            [] for _ in queries
+        ]
+        for segment in segments:
+            allowed = segment.live.copy()
+            if file_uuid_filter is not None:
+                allowed &= np.isin(segment.file_uuids, file_uuid_filter)
+            if file_uuid_exclusion is not None:
+                allowed &= ~np.isin(segment.file_uuids, file_uuid_exclusion)
+            if not allowed.any():
+                continue
+
+            if segment.centroids is None:
+                rows = np.flatnonzero(allowed)
+                scores = _scores(
+                    segment.vectors[rows],
+                    segment.squared_norms[rows],
+                    queries,
+                    self.config.metric_type,
+                )
+                for query_index in range(len(queries)):
+                    candidates[query_index].extend(
+                        self._top(rows, scores[:, query_index], segment, limit)
+                    )
+                continue
+
+            # IVF lists differ per query
+            for query_index, query in enumerate(queries):
+                rows = segment.candidates(
+                    query, self.config.metric_type, self.config.ivf_nprobe
+                )
+                rows = rows[allowed[rows]]
+                if not len(rows):
+                    continue
+
+                scores = _scores(
+                    segment.vectors[rows],
+                    segment.squared_norms[rows],
+                    query[None],
+                    self.config.metric_type,
+                )[:, 0]
+                candidates[query_index].extend(
+                    self._top(rows, scores, segment, limit)
+                )
+
+        results = []
+        for query_candidates in candidates:
+            query_candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+
+            query_search_result = []
+            for score, segment, row in query_candidates[:limit]:
+                row_id, source, file_uuid, content = segment.rows[row][:4]
+                page, end_page, ordinal = (segment.rows[row][5:] + [None] * 3)[:3]
+                query_search_result.append(
+                    SearchSimilarityModel(
+                        id=str(row_id),
+                        # same sign as Milvus: distance for L2, similarity otherwise
+                        score=-score if self.config.metric_type == "L2" else score,
+                        file_uuid=file_uuid,
+                        content=content,
+                        source=source,
+                        page=page,
+                        end_page=end_page,
+                        ordinal=ordinal,
+                    )
+                )
+            results.append(query_search_result)
+
+        return results
+
+    @staticmethod
+    def _top(
+        rows: np.ndarray, scores: np.ndarray, segment: EmbeddedSegment, limit: int
+    ) -> list[tuple[float, EmbeddedSegment, int]]:
+        if len(rows) > limit:
+            best = np.argpartition(-scores, limit - 1)[:limit]
+            rows, scores = rows[best], scores[best]
+
+        return [(float(score), segment, int(row)) for score, row in zip(scores, rows)]
+
+    def delete_document(self, file_uuid: str, collection: str = "default") -> int:
+        with self._lock:
+            if not self._load_collection(collection):
+                return 0
+
+            manifest = self._manifests[collection]
+            deleted_ids = []
+            for segment in self._segments[collection]:
+                matches = segment.live & (segment.file_uuids == file_uuid)
+                for row in np.flatnonzero(matches):
+                    deleted_ids.append(int(segment.ids[row]))
+                    self._forget_hash(collection, segment.rows[row])
+
+            if not deleted_ids:
+                return 0
+
+            manifest.deleted_ids.extend(deleted_ids)
+            self._write_manifest(collection)
+            self._apply_deleted(collection)
+            self._compact_if_needed(collection)
+
+        self.logger.debug(f"Deleted {len(deleted_ids)} chunks of {file_uuid} in {collection}")
+        return len(deleted_ids)
+
+    def document_chunk_hashes(
+        self, file_uuid: str, collection: str = "default"
+    ) -> dict[str, list[str]]:
+        with self._lock:
+            if not self._load_collection(collection):
+                return {}
+
+            chunk_hashes: dict[str, list[str]] = {}
+            for segment in self._segments[collection]:
+                matches = segment.live & (segment.file_uuids == file_uuid)
+                for row in np.flatnonzero(matches):
+                    chunk_hashes.setdefault(segment.rows[row][4], []).append(
+                        str(segment.ids[row])
+                    )
+
+        return chunk_hashes
+
+    def delete_chunks(self, ids: list[str], collection: str = "default") -> int:
+        with self._lock:
+            if not ids or not self._load_collection(collection):
+                return 0
+
+            manifest = self._manifests[collection]
+            requested_ids = np.asarray([int(chunk_id) for chunk_id in ids], dtype=np.int64)
+            deleted_ids = []
+            for segment in self._segments[collection]:
+                matches = segment.live & np.isin(segment.ids, requested_ids)
+                for row in np.flatnonzero(matches):
+                    deleted_ids.append(int(segment.ids[row]))
+                    self._forget_hash(collection, segment.rows[row])
+
+            if not deleted_ids:
+                return 0
+
+            manifest.deleted_ids.extend(deleted_ids)
+            self._write_manifest(collection)
+            self._apply_deleted(collection)
+            self._compact_if_needed(collection)
+
+        self.logger.debug(f"Deleted {len(deleted_ids)} chunks in {collection}")
+        return len(deleted_ids)
+
+    def _forget_hash(self, collection: str, row: list) -> None:
+        # documents may share a content hash, keep the entry of another copy
+        if self._hashes[collection].get(row[4]) == row[0]:
+            del self._hashes[collection][row[4]]
+
+    def compact(self, collection: str) -> None:
+        """
+        Merge the live rows of a collection into one segment.
+
+        Deleted rows are dropped and, with `EMBEDDED_INDEX_TYPE=IVF_FLAT`, an IVF
+        index is built for the new segment.
+
+        Args:
+            collection (str): Collection name.
+        """
+        with self._lock:
+            if not self._load_collection(collection):
+                return
+
+            manifest = self._manifests[collection]
+            old_segments = self._segments[collection]
+
+            vectors = np.concatenate(
+                [np.asarray(segment.vectors[segment.live]) for segment in old_segments]
+                or [np.empty((0, manifest.dimension), dtype=np.float32)]
+            )
+            rows = [
+                row
+                for segment in old_segments
+                for row, live in zip(segment.rows, segment.live)
+                if live
+            ]
+
+            segment_name = f"segment_{manifest.next_segment}"
+            manifest.next_segment += 1
+            self._write_segment(collection, segment_name, vectors, rows)
+            if (
+                self.config.index_type == "IVF_FLAT"
+                and len(rows) >= self.config.ivf_min_rows
+            ):
+                self._write_ivf(collection, segment_name, vectors)
+
+            manifest.segments = [segment_name]
+            manifest.deleted_ids = []
+            self._write_manifest(collection)
+            self._segments[collection] = [
+                EmbeddedSegment(self._collection_path(collection), segment_name)
+            ]
+
+            # the manifest no longer references the old files
+            for segment in old_segments:
+                for suffix in [".npy", ".json", ".ivf.npz"]:
+                    segment_path = path.join(
+                        self._collection_path(collection), f"{segment.name}{suffix}"
+                    )
+                    if path.exists(segment_path):
+                        os.remove(segment_path)
+
+        self.logger.info(
+            f"Compacted `{collection}`: {len(old_segments)} segments into {len(rows)} rows"
+        )
+
+    def _compact_if_needed(self, collection: str) -> None:
+        manifest = self._manifests[collection]
+        row_count = sum(len(segment.rows) for segment in self._segments[collection])
+
+        if len(manifest.segments) > self.config.max_segments or (
+            row_count
+            and len(manifest.deleted_ids) / row_count > self.config.max_deleted_ratio
+        ):
+            self.compact(collection)
+
+    def _prepare_vectors(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.config.metric_type != "COSINE":
+            return vectors
+
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _collection_path(self, collection: str) -> str:
+        assert (
+            collection and path.basename(collection) == collection
+        ), f"Invalid collection name: {collection}"
+        return path.join(self.config.path, collection)
+
+    def _load_collection(self, collection: str) -> bool:
+        """load a collection on first use, False if it doesn't exist"""
+        if collection in self._manifests:
+            return True
+
+        manifest_path = path.join(self._collection_path(collection), "manifest.json")
+        if not path.exists(manifest_path):
+            return False
+
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = EmbeddedCollectionManifestModel(**json.load(f))
+
+        self._manifests[collection] = manifest
+        self._segments[collection] = [
+            EmbeddedSegment(self._collection_path(collection), segment_name)
+            for segment_name in manifest.segments
+        ]
+        self._apply_deleted(collection)
+        self._hashes[collection] = {
+            row[4]: row[0]
+            for segment in self._segments[collection]
+            for row, live in zip(segment.rows, segment.live)
+            if live
+        }
+
+        self.logger.info(
+            f"Loaded embedded collection `{collection}`: {len(self._hashes[collection])} rows"
+        )
+        return True
+
+    def _apply_deleted(self, collection: str) -> None:
+        deleted_ids = np.asarray(self._manifests[collection].deleted_ids, dtype=np.int64)
+        for segment in self._segments[collection]:
+            segment.apply_deleted(deleted_ids)
+
+    def _write_segment(
+        self, collection: str, segment_name: str, vectors: np.ndarray, rows: list[list]
+    ) -> None:
+        collection_path = self._collection_path(collection)
+
+        with open(path.join(collection_path, f"{segment_name}.npy"), "wb") as f:
+            np.save(f, np.ascontiguousarray(vectors, dtype=np.float32))
+        with open(
+            path.join(collection_path, f"{segment_name}.json"), "w", encoding="utf-8"
+        ) as f:
+            json.dump(rows, f, ensure_ascii=False)
+
+    def _write_manifest(self, collection: str) -> None:
+        """replace the manifest atomically, it is the commit point of every change"""
+        manifest_path = path.join(self._collection_path(collection), "manifest.json")
+
+        with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+            f.write(self._manifests[collection].model_dump_json())
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    def _write_ivf(self, collection: str, segment_name: str, vectors: np.ndarray) -> None:
+        """cluster the vectors with k-means and store the inverted lists"""
+        nlist = min(self.config.ivf_nlist, len(vectors))
+        random = np.random.default_rng(0)
+        centroids = vectors[random.choice(len(vectors), nlist, replace=False)].copy()
+
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = self._assign(vectors, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            counts = np.bincount(assignment, minlength=nlist)
+            # empty lists keep their previous centroid
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+            if self.config.metric_type == "COSINE":
+                centroids = self._prepare_vectors(centroids)
+
+        assignment = self._assign(vectors, centroids)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(assignment, minlength=nlist))]
+        )
+
+        np.savez(
+            path.join(self._collection_path(collection), f"{segment_name}.ivf.npz"),
+            centroids=centroids,
+            order=order,
+            offsets=offsets,
+        )
+        self.logger.info(f"Built IVF index for `{collection}` with {nlist} lists")
+
+    def _assign(self, vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+        assignment = np.empty(len(vectors), dtype=np.int64)
+
+        for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+            block = vectors[start : start + ASSIGN_BLOCK_ROWS]
+            similarity = block @ centroids.T
+            if self.config.metric_type == "L2":
+                similarity = 2 * similarity - centroid_norms
+            assignment[start : start + len(block)] = np.argmax(similarity, axis=1)
+
+        return assignment
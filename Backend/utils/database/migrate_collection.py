@@ -0,0 +1,134 @@
+# Code by AkinoAlice@TyrantRey
+
+"""
+Re-create a Milvus collection at the native dimension of the embedding model.
+
+The stored chunks are re-embedded (through the embedding cache) into a new
+collection with the current schema and index configuration, which then
+replaces the old one. Run it while the backend is stopped, the backend caches
+the schema of the collections it uses.
+
+Usage:
+    python -m Backend.utils.database.migrate_collection [collection] [--batch-size 256]
+"""
+
+from Backend.utils.helper.model.database.migrate_collection import (
+    CollectionMigrationModel,
+)
+from Backend.utils.database.vector_database import MilvusHandler, POSITION_FIELDS
+from Backend.utils.helper.logger import CustomLoggerHandler
+
+import argparse
+
+logger = CustomLoggerHandler(__name__).setup_logging()
+
+
+def migrate_collection(
+    collection_name: str, batch_size: int = 256
+) -> CollectionMigrationModel:
+    """
+    Re-create a collection from its stored content.
+
+    Args:
+        collection_name (str): Milvus collection name.
+        batch_size (int, optional): Number of chunks embedded and inserted at once. Defaults to 256.
+
+    Returns:
+        CollectionMigrationModel: The new dimension and the number of migrated
+            and skipped (duplicate) chunks.
+    """
+    milvus_handler = MilvusHandler()
+    milvus_client = milvus_handler.milvus_client
+    vector_handler = milvus_handler.vector_handler
+    migration_collection_name = f"{collection_name}_migration"
+
+    assert milvus_client.has_collection(
+        collection_name
+    ), f"Collection `{collection_name}` does not exist"
+
+    # leftover of an interrupted migration
+    if milvus_client.has_collection(migration_collection_name):
+        milvus_client.drop_collection(migration_collection_name)
+
+    index_config = milvus_handler.index_config(collection_name)
+    milvus_handler._create_collection(
+        collection_name=migration_collection_name,
+        index_config=index_config,
+    )
+    milvus_client.load_collection(collection_name)
+
+    logger.info(
+        f"Migrating `{collection_name}` to dimension {vector_handler.vector_dim}"
+    )
+
+    output_fields = ["source", "file_uuid", "content"]
+    # collections created before the position fields are copied without them
+    if "page" in milvus_handler.collection_manager.fields(collection_name):
+        output_fields += POSITION_FIELDS
+
+    migrated_count = 0
+    skipped_count = 0
+    iterator = milvus_handler.orm_collection(collection_name).query_iterator(
+        batch_size=batch_size,
+        output_fields=output_fields,
+    )
+    try:
+        while rows := iterator.next():
+            contents = [row["content"] for row in rows]
+            vectors = milvus_handler._prepare_vectors(
+                collection_name, vector_handler.encode_batch(contents)
+            )
+
+            insert_info = milvus_handler.insert_sentences(
+                vectors=vectors,
+                contents=contents,
+                sources=[row["source"] for row in rows],
+                file_uuids=[row["file_uuid"] for row in rows],
+                collection=migration_collection_name,
+                # a 1:1 copy, chunks of same-named documents share a content hash
+                remove_duplicates=False,
+                positions=[milvus_handler._position(row) for row in rows],
+            )
+            migrated_count += insert_info.insert_count
+            skipped_count += insert_info.skipped_count
+            logger.info(f"Migrated {migrated_count} chunks")
+    finally:
+        iterator.close()
+
+    milvus_client.drop_collection(collection_name)
+    milvus_client.rename_collection(migration_collection_name, collection_name)
+    milvus_client.load_collection(collection_name)
+
+    migration = CollectionMigrationModel(
+        collection=collection_name,
+        dimension=vector_handler.vector_dim,
+        migrated_count=migrated_count,
+        skipped_count=skipped_count,
+    )
+    logger.info(f"Migration finished: {migration}")
+
+    return migration
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Re-create a Milvus collection at the native embedding dimension"
+    )
+    parser.add_argument(
+        "collection",
+        nargs="?",
+        default=None,
+        help="collection to migrate, defaults to MILVUS_DEFAULT_COLLECTION_NAME",
+    )
+    parser.add_argument("--batch-size", type=int, default=256)
+    arguments = parser.parse_args()
+
+    migrate_collection(
+        collection_name=arguments.collection
+        or MilvusHandler().DEFAULT_COLLECTION_NAME,
+        batch_size=arguments.batch_size,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,53 @@
 # Code by AkinoAlice@TyrantRey
 
-from Backend.utils.helper.model.database.vector_database import SearchSimilarityModel
+from Backend.utils.helper.model.database.vector_database import (
+    ChunkPositionModel,
+    InsertSentencesResultModel,
+    MilvusIndexConfig,
+    SearchSimilarityModel,
+)
+from Backend.utils.database.vector_store import VectorStore, chunk_hash
+from Backend.utils.RAG.vector_extractor import VectorHandler
+from Backend.utils.helper.executor import io_executor
 from Backend.utils.helper.logger import CustomLoggerHandler
 
-from pymilvus import MilvusClient
+from pymilvus import MilvusClient, Collection
 from pymilvus import DataType
 
-from typing import Literal, Dict
+from collections import OrderedDict
+from typing import Any, Dict
 from pprint import pformat
 from os import getenv
 
 import numpy as np
+import threading
+import json
 
 # development
 from dotenv import load_dotenv
 
 load_dotenv("./.env")
 
+# used when MILVUS_INDEX_PARAMS / MILVUS_SEARCH_PARAMS are not set
+DEFAULT_INDEX_PARAMS: dict[str, dict[str, Any]] = {
+    "IVF_FLAT": {"nlist": 128},
+    "IVF_SQ8": {"nlist": 128},
+    "IVF_PQ": {"nlist": 128, "m": 16, "nbits": 8},
+    "HNSW": {"M": 16, "efConstruction": 200},
+    "SCANN": {"nlist": 128},
+}
+DEFAULT_SEARCH_PARAMS: dict[str, dict[str, Any]] = {
+    "IVF_FLAT": {"nprobe": 16},
+    "IVF_SQ8": {"nprobe": 16},
+    "IVF_PQ": {"nprobe": 16},
+    "HNSW": {"ef": 64},
+    "SCANN": {"nprobe": 16},
+    "DISKANN": {"search_list": 64},
+}
+
+# chunk position fields, -1 when unknown since scalar fields aren't nullable
+POSITION_FIELDS = ["page", "end_page", "ordinal"]
+
 
 class SetupMilvus(object):
     _instance = None
@@ -31,31 +62,119 @@ class SetupMilvus(object):
         self.DEBUG = getenv("MILVUS_DEBUG")
         self.HOST = getenv("MILVUS_HOST")
         self.PORT = getenv("MILVUS_PORT")
-        self.MILVUS_VECTOR_DIM = int(str(getenv("MILVUS_VECTOR_DIM")))
         self.DEFAULT_COLLECTION_NAME = str(getenv("MILVUS_DEFAULT_COLLECTION_NAME"))
+        self.INSERT_BATCH_SIZE = int(getenv("MILVUS_INSERT_BATCH_SIZE", "256"))
+        self.NUM_PARTITIONS = int(getenv("MILVUS_NUM_PARTITIONS", "64"))
+        self.INDEX_CONFIG = self._load_index_config()
 
         assert self.DEBUG is not None, "Missing MILVUS_DEBUG environment variable"
         assert self.HOST is not None, "Missing MILVUS_HOST environment variable"
         assert self.PORT is not None, "Missing MILVUS_PORT environment variable"
-        assert (
-            self.MILVUS_VECTOR_DIM > 0 and self.MILVUS_VECTOR_DIM is not None
-        ), "MILVUS_VECTOR_DIM must be a positive integer"
         assert (
             self.DEFAULT_COLLECTION_NAME is not None
         ), "Missing MILVUS_DEFAULT_COLLECTION_NAME environment variable"
+        assert (
+            self.INSERT_BATCH_SIZE > 0
+        ), "MILVUS_INSERT_BATCH_SIZE must be a positive integer"
+        assert (
+            self.NUM_PARTITIONS > 0
+        ), "MILVUS_NUM_PARTITIONS must be a positive integer"
 
         self.logger = CustomLoggerHandler(__name__).setup_logging()
+        # collections are created at the native dimension of the embedding model
+        self.vector_handler = VectorHandler()
 
         self.logger.debug("========================")
         self.logger.debug("| Start loading Milvus |")
         self.logger.debug("========================")
 
         self._setup()
+        self.collection_manager = CollectionManager(self)
 
         self.logger.debug("===========================")
         self.logger.debug("| Milvus Loading Finished |")
         self.logger.debug("===========================")
 
+    def _load_index_config(self) -> dict[str, MilvusIndexConfig]:
+        """
+        Read the index configuration of every collection.
+
+        `MILVUS_INDEX_TYPE`, `MILVUS_METRIC_TYPE`, `MILVUS_INDEX_PARAMS`,
+        `MILVUS_SEARCH_PARAMS` (JSON) and `MILVUS_CONSISTENCY_LEVEL` set the
+        defaults. `MILVUS_COLLECTION_CONFIG` overrides them per collection, e.g.
+        `{"econ101": {"index_type": "HNSW", "index_params": {"M": 16, "efConstruction": 200}, "search_params": {"ef": 64}}}`.
+
+        Returns:
+            dict[str, MilvusIndexConfig]: Index configuration by collection name,
+                the default configuration is stored under "".
+        """
+        default_config: dict[str, Any] = {}
+        for field, env_name, is_json in [
+            ("index_type", "MILVUS_INDEX_TYPE", False),
+            ("metric_type", "MILVUS_METRIC_TYPE", False),
+            ("index_params", "MILVUS_INDEX_PARAMS", True),
+            ("search_params", "MILVUS_SEARCH_PARAMS", True),
+            ("consistency_level", "MILVUS_CONSISTENCY_LEVEL", False),
+        ]:
+            value = getenv(env_name)
+            if value:
+                default_config[field] = json.loads(value) if is_json else value
+
+        def _with_defaults(config: dict[str, Any]) -> MilvusIndexConfig:
+            index_config = MilvusIndexConfig(**config)
+            if "index_params" not in config:
+                index_config.index_params = DEFAULT_INDEX_PARAMS.get(
+                    index_config.index_type, {}
+                )
+            if "search_params" not in config:
+                index_config.search_params = DEFAULT_SEARCH_PARAMS.get(
+                    index_config.index_type, {}
+                )
+            return index_config
+
+        index_config = {"": _with_defaults(default_config)}
+
+        collection_config = json.loads(getenv("MILVUS_COLLECTION_CONFIG", "{}"))
+        assert isinstance(
+            collection_config, dict
+        ), "MILVUS_COLLECTION_CONFIG must be a JSON object"
+        for collection_name, config in collection_config.items():
+            index_config[collection_name] = _with_defaults(
+                {**default_config, **config}
+            )
+
+        return index_config
+
+    def index_config(self, collection_name: str) -> MilvusIndexConfig:
+        """
+        Get the index configuration of a collection.
+
+        Args:
+            collection_name (str): Milvus collection name.
+
+        Returns:
+            MilvusIndexConfig: Its own configuration, or the default one.
+        """
+        return self.INDEX_CONFIG.get(collection_name, self.INDEX_CONFIG[""])
+
+    def _prepare_vectors(self, collection_name: str, vectors: np.ndarray) -> np.ndarray:
+        """
+        Cast vectors to float32 and L2 normalize them for IP and COSINE metrics.
+
+        Args:
+            collection_name (str): Milvus collection name.
+            vectors (np.ndarray): 1-D vector or 2-D array of vectors.
+
+        Returns:
+            np.ndarray: Vectors ready to be inserted or searched.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.index_config(collection_name).metric_type == "L2":
+            return vectors
+
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
     def _setup(self) -> None:
         self.milvus_client = MilvusClient(uri=f"http://{self.HOST}:{self.PORT}")
 
@@ -84,23 +203,59 @@ class SetupMilvus(object):
             self.logger.error("Milvus collection not loaded")
             self.logger.debug(pformat("Creating Milvus database"))
             self._create_collection(collection_name=self.DEFAULT_COLLECTION_NAME)
+            return
+
+        collection_fields = {
+            field["name"]: field
+            for field in self.milvus_client.describe_collection(
+                collection_name=self.DEFAULT_COLLECTION_NAME
+            )["fields"]
+        }
+        if "content_hash" not in collection_fields:
+            self.logger.error(
+                f"Collection `{self.DEFAULT_COLLECTION_NAME}` has no content_hash field, "
+                "migrate it to insert new documents"
+            )
+        if "page" not in collection_fields:
+            self.logger.warning(
+                f"Collection `{self.DEFAULT_COLLECTION_NAME}` has no chunk position fields, "
+                "migrate it to return the page and ordinal of search results"
+            )
+        if not collection_fields["file_uuid"].get("is_partition_key"):
+            self.logger.warning(
+                f"Collection `{self.DEFAULT_COLLECTION_NAME}` is not partitioned by file_uuid, "
+                "migrate it for fast per-document search and delete"
+            )
+
+        collection_dim = collection_fields["vector"]["params"].get("dim")
+        try:
+            if collection_dim != self.vector_handler.vector_dim:
+                self.logger.error(
+                    f"Collection `{self.DEFAULT_COLLECTION_NAME}` has dimension {collection_dim}, "
+                    f"the embedding model has {self.vector_handler.vector_dim}, migrate it with "
+                    "`python -m Backend.utils.database.migrate_collection`"
+                )
+        except Exception as error:
+            self.logger.warning(f"Failed to probe the embedding dimension: {error}")
 
     def _create_collection(
         self,
         collection_name: str,
-        index_type: Literal[
-            "FLAT",
-            "IVF_FLAT",
-            "IVF_SQ8",
-            "IVF_PQ",
-            "HNSW",
-            "ANNOY",
-            "RHNSW_FLAT",
-            "RHNSW_PQ",
-            "RHNSW_SQ",
-        ] = "IVF_FLAT",
-        metric_type: Literal["L2", "IP"] = "L2",
+        index_config: MilvusIndexConfig | None = None,
     ) -> Dict:
+        """
+        Create a collection with its vector and content hash indexes.
+
+        Args:
+            collection_name (str): Milvus collection name.
+            index_config (MilvusIndexConfig | None, optional): Index type, build params
+                and metric. Defaults to the configuration of the collection.
+
+        Returns:
+            Dict: Load state of the new collection.
+        """
+        if index_config is None:
+            index_config = self.index_config(collection_name)
 
         schema = MilvusClient.create_schema(
             auto_id=True,
@@ -114,16 +269,26 @@ class SetupMilvus(object):
         schema.add_field(
             field_name="source", datatype=DataType.VARCHAR, max_length=1024
         )
+        # chunks of a document share a partition, see `delete_document`
         schema.add_field(
-            field_name="file_uuid", datatype=DataType.VARCHAR, max_length=36
+            field_name="file_uuid",
+            datatype=DataType.VARCHAR,
+            max_length=36,
+            is_partition_key=True,
         )
         schema.add_field(
             field_name="content", datatype=DataType.VARCHAR, max_length=4096
         )
+        # sha1 of source and normalized content, see `chunk_hash`
+        schema.add_field(
+            field_name="content_hash", datatype=DataType.VARCHAR, max_length=40
+        )
+        for field_name in POSITION_FIELDS:
+            schema.add_field(field_name=field_name, datatype=DataType.INT64)
         schema.add_field(
             field_name="vector",
             datatype=DataType.FLOAT_VECTOR,
-            dim=self.MILVUS_VECTOR_DIM,
+            dim=self.vector_handler.vector_dim,
         )
 
         self.logger.debug(pformat(f"Creating schema: {schema}"))
@@ -132,9 +297,17 @@ class SetupMilvus(object):
 
         index_params.add_index(
             field_name="vector",
-            index_type=index_type,
-            metric_type=metric_type,
-            params={"nlist": 128},
+            index_type=index_config.index_type,
+            metric_type=index_config.metric_type,
+            params=index_config.index_params,
+        )
+        index_params.add_index(
+            field_name="content_hash",
+            index_type="INVERTED",
+        )
+        index_params.add_index(
+            field_name="file_uuid",
+            index_type="INVERTED",
         )
 
         self.logger.debug(pformat(f"Creating index: {index_params}"))
@@ -142,7 +315,9 @@ class SetupMilvus(object):
         self.milvus_client.create_collection(
             collection_name=collection_name,
             index_params=index_params,
-            metric_type=metric_type,
+            metric_type=index_config.metric_type,
+            consistency_level=index_config.consistency_level,
+            num_partitions=self.NUM_PARTITIONS,
             schema=schema,
         )
 
@@ -154,10 +329,207 @@ class SetupMilvus(object):
         return collection_status
 
 
-class MilvusHandler(SetupMilvus):
+class CollectionManager(object):
+    """
+    Create and load Milvus collections on demand.
+
+    Collections are created on first insert and loaded on first search. Loaded
+    collections are kept in LRU order, and the least recently used ones are
+    released once their estimated memory exceeds `MILVUS_MEMORY_BUDGET_MB`.
+    The default collection and `MILVUS_PRELOAD_COLLECTIONS` are loaded at
+    startup and never released.
+    """
+
+    def __init__(self, milvus_setup: "SetupMilvus") -> None:
+        self.MEMORY_BUDGET_MB = float(getenv("MILVUS_MEMORY_BUDGET_MB", "0"))
+        self.PRELOAD_COLLECTIONS = [
+            collection.strip()
+            for collection in getenv("MILVUS_PRELOAD_COLLECTIONS", "").split(",")
+            if collection.strip()
+        ]
+
+        assert self.MEMORY_BUDGET_MB >= 0, "MILVUS_MEMORY_BUDGET_MB must not be negative"
+
+        self.logger = CustomLoggerHandler(__name__).setup_logging()
+        self.milvus_setup = milvus_setup
+        self.milvus_client = milvus_setup.milvus_client
+
+        self._lock = threading.RLock()
+        self._existing: set[str] = set()
+        # collection name -> field names, collections created before a field lack it
+        self._fields: dict[str, set[str]] = {}
+        # collection name -> estimated memory in MB, least recently used first
+        self._loaded: OrderedDict[str, float] = OrderedDict()
+        self.pinned = {milvus_setup.DEFAULT_COLLECTION_NAME, *self.PRELOAD_COLLECTIONS}
+
+        # collections may still be loaded from a previous run
+        for collection in self.milvus_client.list_collections():
+            self._existing.add(collection)
+            if self._is_loaded(collection):
+                self._loaded[collection] = self._estimate_memory(collection)
+
+        for collection in self.pinned:
+            if not self.ensure_loaded(collection):
+                self.logger.warning(f"Preload collection `{collection}` does not exist")
+
+        self._release_over_budget()
+
+    def exists(self, collection: str) -> bool:
+        with self._lock:
+            if collection not in self._existing and self.milvus_client.has_collection(
+                collection
+            ):
+                self._existing.add(collection)
+
+            return collection in self._existing
+
+    def fields(self, collection: str) -> set[str]:
+        """
+        Get the field names of a collection.
+
+        Args:
+            collection (str): Milvus collection name.
+
+        Returns:
+            set[str]: Field names, empty if the collection doesn't exist.
+        """
+        with self._lock:
+            if collection not in self._fields:
+                if not self.exists(collection):
+                    return set()
+
+                self._fields[collection] = {
+                    field["name"]
+                    for field in self.milvus_client.describe_collection(
+                        collection_name=collection
+                    )["fields"]
+                }
+
+            return self._fields[collection]
+
+    def ensure_collection(self, collection: str) -> None:
+        """
+        Create a collection if it doesn't exist yet.
+
+        Args:
+            collection (str): Milvus collection name.
+        """
+        with self._lock:
+            if self.exists(collection):
+                return
+
+            self.logger.info(f"Creating collection `{collection}`")
+            self.milvus_setup._create_collection(collection_name=collection)
+            self._existing.add(collection)
+
+            # new collections are loaded by create_collection
+            self._loaded[collection] = 0.0
+            self._release_over_budget()
+
+    def ensure_loaded(self, collection: str) -> bool:
+        """
+        Load a collection into Milvus memory if it isn't loaded yet.
+
+        Args:
+            collection (str): Milvus collection name.
+
+        Returns:
+            bool: False if the collection doesn't exist.
+        """
+        with self._lock:
+            if collection in self._loaded:
+                self._loaded.move_to_end(collection)
+                return True
+
+            if not self.exists(collection):
+                return False
+
+            if not self._is_loaded(collection):
+                self.logger.info(f"Loading collection `{collection}`")
+                self.milvus_client.load_collection(collection_name=collection)
+
+            self._loaded[collection] = self._estimate_memory(collection)
+            self._release_over_budget()
+            return True
+
+    def refresh(self, collection: str) -> None:
+        """
+        Update the memory estimate of a loaded collection after inserts.
+
+        Args:
+            collection (str): Milvus collection name.
+        """
+        with self._lock:
+            if collection not in self._loaded:
+                return
+
+            self._loaded[collection] = self._estimate_memory(collection)
+            self._release_over_budget()
+
+    def _is_loaded(self, collection: str) -> bool:
+        load_state = self.milvus_client.get_load_state(collection_name=collection)
+        return load_state["state"] == load_state["state"].Loaded
+
+    def _estimate_memory(self, collection: str) -> float:
+        """raw float32 vectors plus up to 1 KiB of scalar fields per row"""
+        row_count = int(
+            self.milvus_client.get_collection_stats(collection_name=collection)[
+                "row_count"
+            ]
+        )
+        vector_field = next(
+            field
+            for field in self.milvus_client.describe_collection(
+                collection_name=collection
+            )["fields"]
+            if field["name"] == "vector"
+        )
+        row_bytes = int(vector_field["params"]["dim"]) * 4 + 1024
+
+        return row_count * row_bytes / 1024**2
+
+    def _release_over_budget(self) -> None:
+        if not self.MEMORY_BUDGET_MB:
+            return
+
+        total_memory = sum(self._loaded.values())
+        # never release the most recently used collection
+        for collection in list(self._loaded)[:-1]:
+            if total_memory <= self.MEMORY_BUDGET_MB:
+                break
+            if collection in self.pinned:
+                continue
+
+            self.logger.info(
+                f"Releasing collection `{collection}` ({self._loaded[collection]:.1f} MB)"
+            )
+            self.milvus_client.release_collection(collection_name=collection)
+            total_memory -= self._loaded.pop(collection)
+
+        if total_memory > self.MEMORY_BUDGET_MB:
+            self.logger.warning(
+                f"Loaded collections use {total_memory:.1f} MB, over the {self.MEMORY_BUDGET_MB} MB budget"
+            )
+
+
+class MilvusHandler(SetupMilvus, VectorStore):
     def __init__(self) -> None:
         super().__init__()
 
+    def orm_collection(self, collection: str) -> Collection:
+        """
+        Get an ORM handle of a collection on the connection of `milvus_client`,
+        for the operations MilvusClient lacks such as `flush` and `query_iterator`.
+
+        Args:
+            collection (str): Milvus collection name.
+
+        Returns:
+            Collection: The collection handle.
+        """
+        # MilvusClient registers its connection under a private alias
+        return Collection(collection, using=self.milvus_client._using)
+
     def insert_sentence(
         self,
         docs_filename: str,
@@ -171,7 +543,7 @@ class MilvusHandler(SetupMilvus):
         Insert a sentence (regulation) from a document into the vector database.
 
         This function inserts a sentence along with its associated metadata into the specified
-        collection in the vector database. It can optionally remove duplicates before insertion.
+        collection in the vector database. It can optionally skip sentences that are already stored.
 
         Args:
             docs_filename (str): The filename of the document containing the sentence.
@@ -179,41 +551,169 @@ class MilvusHandler(SetupMilvus):
             content (str): The actual content of the sentence.
             file_uuid (str): A unique identifier for the file.
             collection (str, optional): The name of the collection to insert into. Defaults to "default".
-            remove_duplicates (bool, optional): Whether to remove duplicate entries before insertion. Defaults to True.
+            remove_duplicates (bool, optional): Whether to skip the sentence if the same source and content is already stored. Defaults to True.
 
         Returns:
             dict: A dictionary containing information about the insertion operation, including
                   the number of rows inserted and the list of inserted primary keys.
         """
-        # fix duplicates
-        if remove_duplicates:
-            is_duplicates = self.milvus_client.query(
-                collection_name=collection,
-                filter=f"""(source == "{docs_filename}") and (content == "{content}")""",  # fmt: off
-            )  # nopep8
-            if is_duplicates:
-                info = self.milvus_client.delete(
-                    collection_name="default", ids=[i["id"] for i in is_duplicates]
+        content_hash = chunk_hash(docs_filename, content)
+
+        # duplicate lookups need the collection loaded
+        self.collection_manager.ensure_collection(collection)
+        self.collection_manager.ensure_loaded(collection)
+
+        # skip duplicates
+        if remove_duplicates and self._existing_hashes(collection, [content_hash]):
+            self.logger.debug(f"Skipped duplicate sentence: {content_hash}")
+            return {"insert_count": 0, "ids": []}
+
+        row = {
+            "source": str(docs_filename),
+            "vector": self._prepare_vectors(collection, vector),
+            "content": content,
+            "content_hash": content_hash,
+            "file_uuid": file_uuid,
+        }
+        if self._has_positions(collection):
+            row.update(self._position_row(ChunkPositionModel()))
+
+        success = self.milvus_client.insert(collection_name=collection, data=row)
+        self.collection_manager.refresh(collection)
+
+        return success
+
+    def insert_sentences(
+        self,
+        vectors: np.ndarray,
+        contents: list[str],
+        sources: list[str],
+        file_uuids: list[str],
+        collection: str = "default",
+        remove_duplicates: bool = True,
+        positions: list[ChunkPositionModel] | None = None,
+    ) -> InsertSentencesResultModel:
+        """
+        Insert many sentences at once, `MILVUS_INSERT_BATCH_SIZE` rows per request.
+
+        Duplicates are found with one `content_hash in [...]` lookup per batch and
+        skipped. The collection is flushed once after the last batch.
+
+        Args:
+            vectors (np.ndarray): 2-D array with one vector per sentence.
+            contents (list[str]): The content of each sentence.
+            sources (list[str]): The document filename of each sentence.
+            file_uuids (list[str]): The file identifier of each sentence.
+            collection (str, optional): The name of the collection to insert into. Defaults to "default".
+            remove_duplicates (bool, optional): Whether to skip sentences whose source and content are already stored. Defaults to True.
+            positions (list[ChunkPositionModel] | None, optional): The page and ordinal of each sentence. Defaults to unknown.
+
+        Returns:
+            InsertSentencesResultModel: The number of inserted and skipped rows and the inserted primary keys.
+
+        Raises:
+            ValueError: If the columns don't have the same length.
+        """
+        if not contents:
+            return InsertSentencesResultModel(insert_count=0, skipped_count=0, ids=[])
+
+        if positions is None:
+            positions = [ChunkPositionModel()] * len(contents)
+
+        vectors = self._prepare_vectors(collection, vectors)
+        if vectors.ndim != 2 or not (
+            vectors.shape[0]
+            == len(contents)
+            == len(sources)
+            == len(file_uuids)
+            == len(positions)
+        ):
+            raise ValueError(
+                f"Columns don't match: vectors {vectors.shape}, contents {len(contents)}, "
+                f"sources {len(sources)}, file_uuids {len(file_uuids)}, positions {len(positions)}"
+            )
+
+        # duplicate lookups need the collection loaded
+        self.collection_manager.ensure_collection(collection)
+        self.collection_manager.ensure_loaded(collection)
+        has_positions = self._has_positions(collection)
+
+        content_hashes = [
+            chunk_hash(source, content) for source, content in zip(sources, contents)
+        ]
+
+        insert_count = 0
+        skipped_count = 0
+        ids: list[str] = []
+        # hashes stored so far, also catches repeated chunks within one upload
+        seen_hashes: set[str] = set()
+
+        for start in range(0, len(contents), self.INSERT_BATCH_SIZE):
+            end = start + self.INSERT_BATCH_SIZE
+
+            if remove_duplicates:
+                seen_hashes |= self._existing_hashes(
+                    collection, content_hashes[start:end]
                 )
-                self.logger.debug(pformat(f"Deleted: {info}"))
 
-        success = self.milvus_client.insert(
-            collection_name=collection,
-            data={
-                "source": str(docs_filename),
-                "vector": vector,
-                "content": content,
-                "file_uuid": file_uuid,
-            },
+            rows = []
+            for i in range(start, min(end, len(contents))):
+                if remove_duplicates and content_hashes[i] in seen_hashes:
+                    skipped_count += 1
+                    continue
+
+                seen_hashes.add(content_hashes[i])
+                row = {
+                    "source": str(sources[i]),
+                    "vector": vectors[i],
+                    "content": contents[i],
+                    "content_hash": content_hashes[i],
+                    "file_uuid": file_uuids[i],
+                }
+                if has_positions:
+                    row.update(self._position_row(positions[i]))
+                rows.append(row)
+
+            if not rows:
+                continue
+
+            info = self.milvus_client.insert(collection_name=collection, data=rows)
+            insert_count += info["insert_count"]
+            ids.extend(str(i) for i in info["ids"])
+
+        if insert_count:
+            # seal the growing segments once instead of per insert
+            self.orm_collection(collection).flush()
+            self.collection_manager.refresh(collection)
+
+        self.logger.debug(
+            f"Inserted {insert_count} sentences into {collection}, skipped {skipped_count} duplicates"
+        )
+        return InsertSentencesResultModel(
+            insert_count=insert_count,
+            skipped_count=skipped_count,
+            ids=ids,
         )
 
-        return success
+    def _existing_hashes(self, collection: str, content_hashes: list[str]) -> set[str]:
+        # strong consistency, a re-indexed document must not match its just deleted chunks
+        existing = self.milvus_client.query(
+            collection_name=collection,
+            filter=f"content_hash in {json.dumps(list(set(content_hashes)))}",
+            output_fields=["content_hash"],
+            consistency_level="Strong",
+        )
+        return {row["content_hash"] for row in existing}
 
     def search_similarity(
             self,
             question_vector: np.ndarray,
             collection_name: str = "default",
             limit: int = 3,
+            search_params: dict[str, Any] | None = None,
+            consistency_level: str | None = None,
+            file_uuids: list[str] | None = None,
+            exclude_file_uuids: list[str] | None = None,
         ) -> list[SearchSimilarityModel]:
         """
         Perform a similarity search on a vector database.
@@ -222,37 +722,225 @@ class MilvusHandler(SetupMilvus):
             question_vector (np.ndarray): Vector representation of the query.
             collection_name (str, optional): Milvus collection name. Defaults to "default".
             limit (int, optional): Maximum number of similar documents to retrieve. Defaults to 3.
+            search_params (dict[str, Any] | None, optional): Index search params such as
+                `nprobe` or `ef`. Defaults to the configuration of the collection.
+            consistency_level (str | None, optional): Consistency level of the search.
+                Defaults to the configuration of the collection.
+            file_uuids (list[str] | None, optional): Only search the chunks of these
+                documents. Defaults to every document.
+            exclude_file_uuids (list[str] | None, optional): Skip the chunks of these
+                documents, e.g. expired ones. Applied as a pre-filter of the search.
 
         Returns:
-            list[SearchSimilarityModel]: List of similar documents with their metadata.
+            list[SearchSimilarityModel]: List of similar documents with their metadata,
+                primary key and distance, fetched in the same round trip as the search.
 
         Raises:
             ValueError: If the question vector is invalid or empty.
             MilvusException: If there are issues with Milvus database connection or search.
         """
 
-        docs_results = self.milvus_client.search(
-            collection_name=collection_name, data=[question_vector], limit=limit
+        query_search_result = self._search_many(
+            [question_vector],
+            collection_name=collection_name,
+            limit=limit,
+            file_uuids=file_uuids,
+            exclude_file_uuids=exclude_file_uuids,
+            search_params=search_params,
+            consistency_level=consistency_level,
         )[0]
-        self.logger.info(f"question_vector: {question_vector}")
-        self.logger.info(f"docs_results: {docs_results}")
 
-        query_search_result = []
+        self.logger.debug(pformat(query_search_result))
+
+        return query_search_result
+
+    def _search_many(
+        self,
+        question_vectors: np.ndarray | list[np.ndarray],
+        collection_name: str,
+        limit: int,
+        file_uuids: list[str] | None,
+        exclude_file_uuids: list[str] | None,
+        search_params: dict[str, Any] | None = None,
+        consistency_level: str | None = None,
+    ) -> list[list[SearchSimilarityModel]]:
+        """search every query vector in one request, one ranking per query"""
+        if not self.collection_manager.ensure_loaded(collection_name):
+            self.logger.warning(f"Collection `{collection_name}` does not exist")
+            return [[] for _ in question_vectors]
+
+        index_config = self.index_config(collection_name)
+        output_fields = ["source", "file_uuid", "content"]
+        if self._has_positions(collection_name):
+            output_fields += POSITION_FIELDS
 
-        for _ in docs_results:
-            file_ = self.milvus_client.get(
-                collection_name="default",
-                ids=_["id"],
-            )[0]
+        docs_results = self.milvus_client.search(
+            collection_name=collection_name,
+            data=list(
+                self._prepare_vectors(
+                    collection_name, np.asarray(question_vectors, dtype=np.float32)
+                )
+            ),
+            filter=self._file_uuid_filter(file_uuids, exclude_file_uuids),
+            limit=limit,
+            output_fields=output_fields,
+            search_params={
+                "metric_type": index_config.metric_type,
+                "params": (
+                    index_config.search_params
+                    if search_params is None
+                    else search_params
+                ),
+            },
+            consistency_level=consistency_level or index_config.consistency_level,
+        )
+        self.logger.info(f"docs_results: {docs_results}")
 
-            query_search_result.append(
+        return [
+            [
                 SearchSimilarityModel(
-                    file_uuid=file_["file_uuid"],
-                    content=file_["content"],
-                    source=file_["source"],
+                    id=str(hit["id"]),
+                    score=hit["distance"],
+                    file_uuid=hit["entity"]["file_uuid"],
+                    content=hit["entity"]["content"],
+                    source=hit["entity"]["source"],
+                    **self._position(hit["entity"]).model_dump(),
                 )
-            )
+                for hit in hits
+            ]
+            for hits in docs_results
+        ]
 
-        self.logger.debug(pformat(query_search_result))
+    def delete_document(self, file_uuid: str, collection: str = "default") -> int:
+        """
+        Delete every chunk of a document.
 
-        return query_search_result
+        Args:
+            file_uuid (str): The unique identifier of the document.
+            collection (str, optional): Milvus collection name. Defaults to "default".
+
+        Returns:
+            int: Number of deleted chunks.
+        """
+        if not self.collection_manager.exists(collection):
+            return 0
+
+        result = self.milvus_client.delete(
+            collection_name=collection,
+            filter=self._file_uuid_filter([file_uuid]),
+        )
+        delete_count = len(result) if isinstance(result, list) else result["delete_count"]
+
+        self.logger.debug(f"Deleted {delete_count} chunks of {file_uuid} in {collection}")
+        return delete_count
+
+    def document_chunk_hashes(
+        self, file_uuid: str, collection: str = "default"
+    ) -> dict[str, list[str]]:
+        """
+        Get the content hashes of the indexed chunks of a document.
+
+        Args:
+            file_uuid (str): The unique identifier of the document.
+            collection (str, optional): Milvus collection name. Defaults to "default".
+
+        Returns:
+            dict[str, list[str]]: The primary keys of the chunks of each content hash.
+        """
+        if not self.collection_manager.exists(collection):
+            return {}
+
+        self.collection_manager.ensure_loaded(collection)
+
+        chunk_hashes: dict[str, list[str]] = {}
+        # strong consistency, chunks inserted by an interrupted job must be seen
+        iterator = self.orm_collection(collection).query_iterator(
+            batch_size=self.INSERT_BATCH_SIZE,
+            expr=self._file_uuid_filter([file_uuid]),
+            output_fields=["content_hash"],
+            consistency_level="Strong",
+        )
+        try:
+            while rows := iterator.next():
+                for row in rows:
+                    chunk_hashes.setdefault(row["content_hash"], []).append(
+                        str(row["id"])
+                    )
+        finally:
+            iterator.close()
+
+        return chunk_hashes
+
+    def delete_chunks(self, ids: list[str], collection: str = "default") -> int:
+        """
+        Delete chunks by primary key.
+
+        Args:
+            ids (list[str]): The primary keys of the chunks.
+            collection (str, optional): Milvus collection name. Defaults to "default".
+
+        Returns:
+            int: Number of deleted chunks.
+        """
+        if not ids or not self.collection_manager.exists(collection):
+            return 0
+
+        result = self.milvus_client.delete(collection_name=collection, ids=ids)
+        delete_count = len(result) if isinstance(result, list) else result["delete_count"]
+
+        self.logger.debug(f"Deleted {delete_count} chunks in {collection}")
+        return delete_count
+
+    def _has_positions(self, collection: str) -> bool:
+        """collections created before the position fields are stored without them"""
+        return "page" in self.collection_manager.fields(collection)
+
+    @staticmethod
+    def _position_row(position: ChunkPositionModel) -> dict[str, int]:
+        return {
+            field: -1 if value is None else value
+            for field, value in position.model_dump().items()
+        }
+
+    @staticmethod
+    def _position(entity: dict[str, Any]) -> ChunkPositionModel:
+        return ChunkPositionModel(
+            **{
+                field: entity[field]
+                for field in POSITION_FIELDS
+                if entity.get(field, -1) >= 0
+            }
+        )
+
+    @staticmethod
+    def _file_uuid_filter(
+        file_uuids: list[str] | None, exclude_file_uuids: list[str] | None = None
+    ) -> str:
+        """filter expression matching the given documents, empty for all documents"""
+        conditions = []
+        if file_uuids is not None:
+            conditions.append(f"file_uuid in {json.dumps(list(file_uuids))}")
+        if exclude_file_uuids:
+            conditions.append(f"file_uuid not in {json.dumps(list(exclude_file_uuids))}")
+
+        return " and ".join(conditions)
+
+    async def async_insert_sentence(
+        self,
+        docs_filename: str,
+        vector: np.ndarray,
+        content: str,
+        file_uuid: str,
+        collection: str = "default",
+        remove_duplicates: bool = True,
+    ) -> dict:
+        """Non-blocking version of `insert_sentence`, run on the io executor."""
+        return await io_executor.run(
+            self.insert_sentence,
+            docs_filename=docs_filename,
+            vector=vector,
+            content=content,
+            file_uuid=file_uuid,
+            collection=collection,
+            remove_duplicates=remove_duplicates,
+        )
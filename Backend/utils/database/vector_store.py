@@ -0,0 +1,352 @@
+# Code by AkinoAlice@TyrantRey
+
+from Backend.utils.helper.model.database.vector_database import (
+    BatchSearchSimilarityModel,
+    ChunkPositionModel,
+    InsertSentencesResultModel,
+    SearchSimilarityModel,
+)
+from Backend.utils.helper.executor import io_executor
+
+from abc import ABC, abstractmethod
+from typing import Any
+from os import getenv
+
+import numpy as np
+import unicodedata
+import hashlib
+import re
+
+
+def chunk_hash(source: str, content: str) -> str:
+    """
+    Identity of a chunk for deduplication.
+
+    Args:
+        source (str): The filename of the document containing the chunk.
+        content (str): The chunk content, compared after NFKC normalization
+            with runs of whitespace collapsed.
+
+    Returns:
+        str: sha1 hex digest of the source and normalized content.
+    """
+    normalized_content = re.sub(
+        r"\s+", " ", unicodedata.normalize("NFKC", content)
+    ).strip()
+    return hashlib.sha1(
+        f"{source}\0{normalized_content}".encode("utf-8")
+    ).hexdigest()
+
+
+def reciprocal_rank_fusion(
+    rankings: list[list[SearchSimilarityModel]], limit: int, k: int = 60
+) -> list[SearchSimilarityModel]:
+    """
+    Merge rankings by reciprocal rank fusion.
+
+    Each chunk scores `1 / (k + rank)` in every ranking it appears in, chunks are
+    identified by (file_uuid, content). The fused chunks carry their summed
+    fusion score, the scores of the input rankings aren't comparable.
+
+    Args:
+        rankings (list[list[SearchSimilarityModel]]): Rankings, best first.
+        limit (int): Maximum number of chunks.
+        k (int, optional): Rank smoothing constant. Defaults to 60.
+
+    Returns:
+        list[SearchSimilarityModel]: Fused ranking, best first.
+    """
+    scores: dict[tuple[str, str], float] = {}
+    documents: dict[tuple[str, str], SearchSimilarityModel] = {}
+
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            key = (document.file_uuid, document.content)
+            scores[key] = scores.get(key, 0.0) + 1 / (k + rank)
+            # prefer a copy with the vector store primary key
+            if key not in documents or (document.id and not documents[key].id):
+                documents[key] = document
+
+    fused = sorted(scores, key=lambda key: scores[key], reverse=True)
+    return [
+        documents[key].model_copy(update={"score": scores[key]})
+        for key in fused[:limit]
+    ]
+
+
+class VectorStore(ABC):
+    """
+    Interface of the vector store backends.
+
+    Backends implement the abstract blocking methods, the async versions run
+    them on the io executor.
+    """
+
+    @abstractmethod
+    def insert_sentences(
+        self,
+        vectors: np.ndarray,
+        contents: list[str],
+        sources: list[str],
+        file_uuids: list[str],
+        collection: str = "default",
+        remove_duplicates: bool = True,
+        positions: list[ChunkPositionModel] | None = None,
+    ) -> InsertSentencesResultModel:
+        """
+        Insert many sentences at once, creating the collection if needed.
+
+        Args:
+            vectors (np.ndarray): 2-D array with one vector per sentence.
+            contents (list[str]): The content of each sentence.
+            sources (list[str]): The document filename of each sentence.
+            file_uuids (list[str]): The file identifier of each sentence.
+            collection (str, optional): The name of the collection to insert into. Defaults to "default".
+            remove_duplicates (bool, optional): Whether to skip sentences whose source and content are already stored. Defaults to True.
+            positions (list[ChunkPositionModel] | None, optional): The page and ordinal of each sentence, returned with the search results. Defaults to unknown.
+
+        Returns:
+            InsertSentencesResultModel: The number of inserted and skipped rows and the inserted primary keys.
+        """
+
+    @abstractmethod
+    def search_similarity(
+        self,
+        question_vector: np.ndarray,
+        collection_name: str = "default",
+        limit: int = 3,
+        file_uuids: list[str] | None = None,
+        exclude_file_uuids: list[str] | None = None,
+    ) -> list[SearchSimilarityModel]:
+        """
+        Find the sentences closest to a vector.
+
+        Args:
+            question_vector (np.ndarray): Vector representation of the query.
+            collection_name (str, optional): Collection name. Defaults to "default".
+            limit (int, optional): Maximum number of similar documents to retrieve. Defaults to 3.
+            file_uuids (list[str] | None, optional): Only search the chunks of these
+                documents. Defaults to every document.
+            exclude_file_uuids (list[str] | None, optional): Skip the chunks of these
+                documents, e.g. expired ones. Defaults to none.
+
+        Returns:
+            list[SearchSimilarityModel]: Similar sentences, best first. Empty if the
+                collection doesn't exist.
+        """
+
+    def search_similarity_batch(
+        self,
+        question_vectors: np.ndarray,
+        collection_name: str = "default",
+        limit: int = 3,
+        file_uuids: list[str] | None = None,
+        exclude_file_uuids: list[str] | None = None,
+        fusion_k: int = 60,
+    ) -> BatchSearchSimilarityModel:
+        """
+        Find the sentences closest to each of many vectors in one search, e.g. the
+        rewrites of a question or the questions of an exam sheet.
+
+        Args:
+            question_vectors (np.ndarray): 2-D array with one query vector per row.
+            collection_name (str, optional): Collection name. Defaults to "default".
+            limit (int, optional): Maximum number of sentences per query and fused. Defaults to 3.
+            file_uuids (list[str] | None, optional): Only search the chunks of these
+                documents. Defaults to every document.
+            exclude_file_uuids (list[str] | None, optional): Skip the chunks of these
+                documents, e.g. expired ones. Defaults to none.
+            fusion_k (int, optional): Rank smoothing constant of the fusion. Defaults to 60.
+
+        Returns:
+            BatchSearchSimilarityModel: The ranking of each query and their fusion.
+        """
+        results = self._search_many(
+            question_vectors,
+            collection_name=collection_name,
+            limit=limit,
+            file_uuids=file_uuids,
+            exclude_file_uuids=exclude_file_uuids,
+        )
+
+        return BatchSearchSimilarityModel(
+            results=results,
+            fused=reciprocal_rank_fusion(results, limit=limit, k=fusion_k),
+        )
+
+    def _search_many(
+        self,
+        question_vectors: np.ndarray,
+        collection_name: str,
+        limit: int,
+        file_uuids: list[str] | None,
+        exclude_file_uuids: list[str] | None,
+    ) -> list[list[SearchSimilarityModel]]:
+        """one ranking per query, backends override this with a single batched search"""
+        return [
+            self.search_similarity(
+                question_vector,
+                collection_name=collection_name,
+                limit=limit,
+                file_uuids=file_uuids,
+                exclude_file_uuids=exclude_file_uuids,
+            )
+            for question_vector in question_vectors
+        ]
+
+    @abstractmethod
+    def delete_document(self, file_uuid: str, collection: str = "default") -> int:
+        """
+        Delete every chunk of a document.
+
+        Args:
+            file_uuid (str): The unique identifier of the document.
+            collection (str, optional): Collection name. Defaults to "default".
+
+        Returns:
+            int: Number of deleted chunks.
+        """
+
+    @abstractmethod
+    def document_chunk_hashes(
+        self, file_uuid: str, collection: str = "default"
+    ) -> dict[str, list[str]]:
+        """
+        Get the content hashes of the indexed chunks of a document.
+
+        Args:
+            file_uuid (str): The unique identifier of the document.
+            collection (str, optional): Collection name. Defaults to "default".
+
+        Returns:
+            dict[str, list[str]]: The primary keys of the chunks of each content hash,
+                see `chunk_hash`.
+        """
+
+    @abstractmethod
+    def delete_chunks(self, ids: list[str], collection: str = "default") -> int:
+        """
+        Delete chunks by primary key.
+
+        Args:
+            ids (list[str]): The primary keys of the chunks.
+            collection (str, optional): Collection name. Defaults to "default".
+
+        Returns:
+            int: Number of deleted chunks.
+        """
+
+    async def async_insert_sentences(
+        self,
+        vectors: np.ndarray,
+        contents: list[str],
+        sources: list[str],
+        file_uuids: list[str],
+        collection: str = "default",
+        remove_duplicates: bool = True,
+        positions: list[ChunkPositionModel] | None = None,
+    ) -> InsertSentencesResultModel:
+        """Non-blocking version of `insert_sentences`, run on the io executor."""
+        return await io_executor.run(
+            self.insert_sentences,
+            vectors=vectors,
+            contents=contents,
+            sources=sources,
+            file_uuids=file_uuids,
+            collection=collection,
+            remove_duplicates=remove_duplicates,
+            positions=positions,
+        )
+
+    async def async_search_similarity(
+        self,
+        question_vector: np.ndarray,
+        collection_name: str = "default",
+        limit: int = 3,
+        file_uuids: list[str] | None = None,
+        exclude_file_uuids: list[str] | None = None,
+        **kwargs: Any,
+    ) -> list[SearchSimilarityModel]:
+        """Non-blocking version of `search_similarity`, run on the io executor.
+
+        Extra keyword arguments are passed to the backend, e.g. Milvus `search_params`.
+        """
+        return await io_executor.run(
+            self.search_similarity,
+            question_vector=question_vector,
+            collection_name=collection_name,
+            limit=limit,
+            file_uuids=file_uuids,
+            exclude_file_uuids=exclude_file_uuids,
+            **kwargs,
+        )
+
+    async def async_search_similarity_batch(
+        self,
+        question_vectors: np.ndarray,
+        collection_name: str = "default",
+        limit: int = 3,
+        file_uuids: list[str] | None = None,
+        exclude_file_uuids: list[str] | None = None,
+        fusion_k: int = 60,
+    ) -> BatchSearchSimilarityModel:
+        """Non-blocking version of `search_similarity_batch`, run on the io executor."""
+        return await io_executor.run(
+            self.search_similarity_batch,
+            question_vectors=question_vectors,
+            collection_name=collection_name,
+            limit=limit,
+            file_uuids=file_uuids,
+            exclude_file_uuids=exclude_file_uuids,
+            fusion_k=fusion_k,
+        )
+
+    async def async_delete_document(
+        self, file_uuid: str, collection: str = "default"
+    ) -> int:
+        """Non-blocking version of `delete_document`, run on the io executor."""
+        return await io_executor.run(
+            self.delete_document, file_uuid=file_uuid, collection=collection
+        )
+
+    async def async_document_chunk_hashes(
+        self, file_uuid: str, collection: str = "default"
+    ) -> dict[str, list[str]]:
+        """Non-blocking version of `document_chunk_hashes`, run on the io executor."""
+        return await io_executor.run(
+            self.document_chunk_hashes, file_uuid=file_uuid, collection=collection
+        )
+
+    async def async_delete_chunks(
+        self, ids: list[str], collection: str = "default"
+    ) -> int:
+        """Non-blocking version of `delete_chunks`, run on the io executor."""
+        return await io_executor.run(self.delete_chunks, ids=ids, collection=collection)
+
+
+def get_vector_store() -> VectorStore:
+    """
+    Get the vector store selected by `VECTOR_STORE_DEPLOY_MODE`.
+
+    "milvus" (default) uses the Milvus server, "embedded" stores vectors in
+    memory-mapped files inside the backend process.
+
+    Returns:
+        VectorStore: The shared instance of the selected backend.
+    """
+    mode = getenv("VECTOR_STORE_DEPLOY_MODE", "milvus")
+
+    assert mode in [
+        "milvus",
+        "embedded",
+    ], "VECTOR_STORE_DEPLOY_MODE environment variable is not valid"
+
+    # imported here so the embedded backend runs without pymilvus
+    if mode == "embedded":
+        from Backend.utils.database.embedded_vector_store import EmbeddedVectorStore
+
+        return EmbeddedVectorStore()
+
+    from Backend.utils.database.vector_database import MilvusHandler
+
+    return MilvusHandler()
@@ -0,0 +1,211 @@
+# Code by AkinoAlice@TyrantRey
+
+from Backend.utils.helper.model.database.database import ChatRecordModel
+from Backend.utils.helper.executor import mysql_executor
+from Backend.utils.helper.logger import CustomLoggerHandler
+from Backend.utils.database.database import MySQLHandler
+
+from os import getenv
+
+import mysql.connector as connector
+import asyncio
+
+# lock wait timeout, deadlock, server gone away, lost connection
+TRANSIENT_MYSQL_ERRORS = {1205, 1213, 2006, 2013}
+
+
+class ChatRecordWriter(object):
+    """
+    Write-behind queue for finished chat records.
+
+    Records are queued on the request path and written by a background task,
+    which drains everything queued so far into one multi-row transaction.
+    Transient MySQL errors are retried with exponential backoff; a batch that
+    still fails is retried one record at a time.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ChatRecordWriter, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self) -> None:
+        self.BATCH_SIZE = int(getenv("WRITE_BEHIND_BATCH_SIZE", "100"))
+        self.MAX_PENDING = int(getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+        self.MAX_RETRY = int(getenv("WRITE_BEHIND_MAX_RETRY", "5"))
+
+        assert self.BATCH_SIZE >= 1, "WRITE_BEHIND_BATCH_SIZE must be positive"
+        assert self.MAX_RETRY >= 1, "WRITE_BEHIND_MAX_RETRY must be positive"
+
+        self.logger = CustomLoggerHandler(__name__).setup_logging()
+        self.mysql_client = MySQLHandler()
+
+        self._queue: asyncio.Queue[ChatRecordModel] | None = None
+        self._task: asyncio.Task | None = None
+        # qa_id -> record, until its batch is committed or given up
+        self._pending: dict[str, ChatRecordModel] = {}
+        self._written: dict[str, asyncio.Event] = {}
+        # qa_id of records taken off the queue by the running batch
+        self._in_batch: set[str] = set()
+
+        self.written_records = 0
+        self.failed_records = 0
+
+    def start(self) -> None:
+        """Start the background writer on the running event loop."""
+        if self._task is not None and not self._task.done():
+            return
+
+        self._queue = asyncio.Queue(maxsize=self.MAX_PENDING)
+        self._task = asyncio.create_task(self._run())
+        self.logger.info("Chat record writer started")
+
+    async def enqueue(self, record: ChatRecordModel) -> None:
+        """
+        Queue a chat record to be written.
+
+        Waits only if `WRITE_BEHIND_MAX_PENDING` records are already queued.
+
+        Args:
+            record (ChatRecordModel): The finished chat record.
+        """
+        self.start()
+        assert self._queue is not None
+
+        self._pending[record.qa_id] = record
+        self._written[record.qa_id] = asyncio.Event()
+        await self._queue.put(record)
+
+    def set_pending_rating(self, qa_id: str, rating: bool) -> bool:
+        """
+        Set the rating of a record that has not been taken by a batch yet.
+
+        Args:
+            qa_id (str): The unique identifier of the question.
+            rating (bool): The rating of the answer.
+
+        Returns:
+            bool: True if the rating will be written with the record itself.
+        """
+        record = self._pending.get(qa_id)
+        if record is None or qa_id in self._in_batch:
+            return False
+
+        record.rating = rating
+        return True
+
+    def pending_records(self, chat_id: str) -> list[ChatRecordModel]:
+        """
+        Get the records of a chat that are not committed yet.
+
+        Args:
+            chat_id (str): The unique identifier for the chat session.
+
+        Returns:
+            list[ChatRecordModel]: The pending records, oldest first.
+        """
+        return sorted(
+            (record for record in self._pending.values() if record.chat_id == chat_id),
+            key=lambda record: record.sent_time,
+        )
+
+    async def wait_until_written(self, qa_id: str) -> None:
+        """
+        Wait until a queued record is committed (or given up on).
+
+        Returns immediately if the record is not pending.
+
+        Args:
+            qa_id (str): The unique identifier of the question.
+        """
+        event = self._written.get(qa_id)
+        if event is not None:
+            await event.wait()
+
+    async def stop(self) -> None:
+        """Flush every queued record and stop the background writer."""
+        if self._task is None or self._queue is None:
+            return
+
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        self._task = None
+        self.logger.info(
+            f"Chat record writer stopped, written: {self.written_records}, failed: {self.failed_records}"
+        )
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.BATCH_SIZE and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            self._in_batch = {record.qa_id for record in batch}
+            try:
+                await self._write(batch)
+            finally:
+                for record in batch:
+                    self._pending.pop(record.qa_id, None)
+                    self._written.pop(record.qa_id).set()
+                    self._queue.task_done()
+                self._in_batch = set()
+
+    async def _write(self, batch: list[ChatRecordModel]) -> None:
+        if await self._insert(batch):
+            self.written_records += len(batch)
+            self.logger.debug(f"Wrote {len(batch)} chat records")
+            return
+
+        if len(batch) == 1:
+            failed_records = batch
+        else:
+            # one bad record must not take the rest of the batch with it
+            self.logger.warning(
+                f"Failed to write {len(batch)} chat records, retrying them one at a time"
+            )
+            failed_records = []
+            for record in batch:
+                if await self._insert([record]):
+                    self.written_records += 1
+                else:
+                    failed_records.append(record)
+
+        if failed_records:
+            self.failed_records += len(failed_records)
+            self.logger.error(
+                f"Failed to write chat records: {[record.qa_id for record in failed_records]}"
+            )
+
+    async def _insert(self, records: list[ChatRecordModel]) -> bool:
+        """insert records in one transaction, retrying transient errors"""
+        for attempt in range(1, self.MAX_RETRY + 1):
+            try:
+                await mysql_executor.run(self.mysql_client.insert_chatting_batch, records)
+                return True
+
+            except connector.Error as error:
+                if error.errno in TRANSIENT_MYSQL_ERRORS and attempt < self.MAX_RETRY:
+                    self.logger.warning(
+                        f"Transient MySQL error, retrying chat records ({attempt}/{self.MAX_RETRY}): {error}"
+                    )
+                    await asyncio.sleep(0.1 * 2**attempt)
+                    continue
+
+                self.logger.error(error)
+                return False
+
+            except Exception as error:
+                self.logger.error(error)
+                return False
+
+        return False
@@ -65,5 +65,21 @@ class ChatNotEqualError(RAGError):
     ...
 
 
+class SchedulerRejectedError(RAGError):
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+
+    def __str__(self):
+        return f"LLM request rejected, retry after {self.retry_after} seconds"
+
+
+class SchedulerQueueFullError(SchedulerRejectedError):
+    ...
+
+
+class SchedulerUserLimitError(SchedulerRejectedError):
+    ...
+
+
 if __name__ == "__main__":
     raise FormatError("str", "txt")
@@ -0,0 +1,55 @@
+# Code by AkinoAlice@TyrantRey
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar, ParamSpec
+from functools import partial
+from os import getenv
+
+import asyncio
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+
+class BlockingExecutor(object):
+    """Run blocking calls on a bounded thread pool so they don't block the event loop."""
+
+    def __init__(self, name: str, max_workers: int) -> None:
+        assert max_workers >= 1, f"{name} executor needs at least one worker"
+
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=name,
+        )
+
+    async def run(self, func: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+        """
+        Run a blocking function on the executor and await its result.
+
+        Args:
+            func (Callable): The blocking function.
+            *args: Positional arguments passed to `func`.
+            **kwargs: Keyword arguments passed to `func`.
+
+        Returns:
+            T: The return value of `func`.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, partial(func, *args, **kwargs)
+        )
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+# Milvus, file system and document parsing
+io_executor = BlockingExecutor(
+    name="io",
+    max_workers=int(getenv("BACKEND_IO_WORKERS", "16")),
+)
+
+# the MySQL connection is shared and not thread safe, so every query is serialized
+mysql_executor = BlockingExecutor(name="mysql", max_workers=1)
@@ -0,0 +1,24 @@
+# Code by AkinoAlice@TyrantRey
+
+from pydantic import BaseModel, Field
+
+
+class SemanticCacheConfig(BaseModel):
+    similarity_threshold: float = Field(..., ge=0, le=1)
+    max_size: int = Field(..., ge=0)
+    ttl: int = Field(..., ge=0)
+
+
+class CachedAnswerModel(BaseModel):
+    answer: str
+    token_size: int
+    files: list[dict[str, str]]
+    file_ids: list[str]
+
+
+class SemanticCacheStatsModel(BaseModel):
+    size: int
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
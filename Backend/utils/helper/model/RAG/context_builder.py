@@ -0,0 +1,17 @@
+# Code by AkinoAlice@TyrantRey
+
+from pydantic import BaseModel, Field
+
+
+class ContextBudgetConfig(BaseModel):
+    context_window: int = Field(..., ge=1)
+    min_response_tokens: int = Field(..., ge=1)
+
+
+class ConversationContextModel(BaseModel):
+    conversation: list[dict[str, str]]
+    prompt_tokens: int
+    max_tokens: int
+    dropped_turns: int
+    dropped_documents: int
+
@@ -0,0 +1,21 @@
+# Code by AkinoAlice@TyrantRey
+
+from pydantic import BaseModel
+
+
+class ConversationMemoryConfig(BaseModel):
+    max_size: int
+    summary_after: int
+    keep_turns: int
+    max_load_turns: int
+
+
+class ConversationTurnModel(BaseModel):
+    question: str
+    answer: str
+
+
+class ConversationStateModel(BaseModel):
+    # turns not condensed into `summary` yet, oldest first
+    turns: list[ConversationTurnModel] = []
+    summary: str = ""
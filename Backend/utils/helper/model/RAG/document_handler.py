@@ -0,0 +1,23 @@
+# Code by AkinoAlice@TyrantRey
+
+from pydantic import BaseModel, Field
+
+
+class DocumentSplitterConfig(BaseModel):
+    chunk_tokens: int = Field(..., ge=1)
+    # tokens of the previous chunk repeated at the start of the next one
+    overlap_tokens: int = Field(..., ge=0)
+    # smaller chunks are merged into the previous one or dropped
+    min_chunk_tokens: int = Field(..., ge=0)
+    # UTF-8 bytes, the `content` field of the vector store is VARCHAR(4096)
+    max_chunk_bytes: int = Field(..., ge=1)
+
+
+class DocumentChunkModel(BaseModel):
+    content: str
+    # page or slide number of the first and last sentence, None if unknown
+    page: int | None
+    end_page: int | None
+    # position of the chunk within the document, from 0
+    ordinal: int
+    tokens: int
@@ -0,0 +1,14 @@
+# Code by AkinoAlice@TyrantRey
+
+from pydantic import BaseModel, Field
+
+
+class EmbeddingCacheConfig(BaseModel):
+    max_size: int = Field(..., ge=0)
+    database_path: str = ""
+
+
+class EmbeddingCacheStatsModel(BaseModel):
+    size: int
+    hits: int
+    misses: int
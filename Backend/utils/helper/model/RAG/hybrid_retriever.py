@@ -0,0 +1,9 @@
+# Code by AkinoAlice@TyrantRey
+
+from pydantic import BaseModel, Field
+
+
+class HybridRetrieverConfig(BaseModel):
+    limit: int = Field(..., ge=1)
+    candidate_limit: int = Field(..., ge=1)
+    rrf_k: int = Field(..., ge=0)
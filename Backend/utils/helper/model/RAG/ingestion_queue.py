@@ -0,0 +1,9 @@
+# Code by AkinoAlice@TyrantRey
+
+from pydantic import BaseModel, Field
+
+
+class IngestionQueueConfig(BaseModel):
+    workers: int = Field(..., ge=1)
+    # chunks embedded between two progress writes to MySQL
+    progress_interval: int = Field(..., ge=1)
@@ -0,0 +1,17 @@
+# Code by AkinoAlice@TyrantRey
+
+from pydantic import BaseModel, Field
+
+
+class LexicalIndexConfig(BaseModel):
+    k1: float = Field(..., ge=0)
+    b: float = Field(..., ge=0, le=1)
+    snapshot_path: str = ""
+    # seconds between a change and the snapshot save that includes it
+    save_delay: float = Field(..., ge=0)
+
+
+class LexicalIndexStatsModel(BaseModel):
+    collection: str
+    documents: int
+    terms: int
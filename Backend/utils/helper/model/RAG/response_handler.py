@@ -53,3 +53,23 @@ class OLLAMAConfig(BaseModel):
     ollama_host: str = Field(..., min_length=1)
     ollama_port: int = Field(..., ge=1, le=65535)
     ollama_model_name: str = Field(..., min_length=1)
+
+
+class SchedulerConfig(BaseModel):
+    max_concurrency: int = Field(..., ge=1)
+    max_queue_size: int = Field(..., ge=0)
+    max_queued_per_user: int = Field(..., ge=1)
+    retry_after: int = Field(..., ge=1)
+
+
+class SchedulerStatsModel(BaseModel):
+    backend: str
+    active: int
+    queue_depth: int
+    max_concurrency: int
+    max_queue_size: int
+    admitted: int
+    rejected: int
+    average_wait_time: float
+    max_wait_time: float
+    oldest_wait_time: float
@@ -20,3 +20,16 @@ class OLLAMAEmbeddingConfig(BaseModel):
     ollama_host: str = Field(..., min_length=1)
     ollama_port: int = Field(..., ge=1, le=65535)
     ollama_embedding_model_name: str = Field(..., min_length=1)
+
+
+class OPENAIEmbeddingConfig(BaseModel):
+    api_url: str = Field(..., min_length=1)
+    api_key: str = Field(..., min_length=1)
+    embedding_model_name: str = Field(..., min_length=1)
+
+
+class EmbeddingBatchConfig(BaseModel):
+    # texts per embedding request
+    batch_size: int = Field(..., ge=1)
+    # embedding requests running at the same time
+    max_in_flight: int = Field(..., ge=1)
@@ -1,6 +1,9 @@
 # Code by AkinoAlice@TyrantRey
 
-from Backend.utils.helper.model.database.database import QueryDocumentationTypeListModel
+from Backend.utils.helper.model.database.database import (
+    QueryDocumentationTypeListModel,
+    IngestionJobModel,
+)
 
 from pydantic import BaseModel
 from typing import Literal
@@ -36,6 +39,26 @@ class QueryDocumentListModel(BaseModel):
     docs_list: list[QueryDocumentationTypeListModel]
 
 
-class FileUploadSuccessModel(BaseModel):    
+class DocumentUpdateModel(BaseModel):
     status_code: int
-    file_id: str
\ No newline at end of file
+    file_id: str
+    expired: bool
+    removed_count: int = 0
+
+
+class IngestionJobAcceptedModel(BaseModel):
+    status_code: int
+    file_id: str
+    # None for a duplicate of an already indexed file
+    job_id: str | None
+    # the content was already uploaded to the collection, file_id is the existing file
+    duplicate: bool = False
+    # a new version of the document of the same name, file_id is the existing file
+    replaced: bool = False
+
+
+class IngestionJobStatusModel(BaseModel):
+    status_code: int
+    job: IngestionJobModel
+    # embedded chunks / total chunks
+    progress: float
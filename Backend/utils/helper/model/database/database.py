@@ -1,6 +1,8 @@
 # Code by AkinoAlice@TyrantRey
 
 from pydantic import BaseModel
+from datetime import datetime
+from typing import Literal
 
 class UserInfoModel(BaseModel):
     user_id: int
@@ -13,4 +15,48 @@ class UserInfoModel(BaseModel):
 class QueryDocumentationTypeListModel(BaseModel):
     file_id: str
     file_name: str
-    last_update_time: str
\ No newline at end of file
+    last_update_time: str
+
+
+class ChatRecordModel(BaseModel):
+    chat_id: str
+    qa_id: str
+    question: str
+    answer: str
+    token_size: int
+    sent_by: str
+    file_ids: list[str]
+    sent_time: datetime
+    rating: bool | None = None
+
+
+class FileRecordModel(BaseModel):
+    file_id: str
+    file_name: str
+    collection: str
+    expired: bool
+    tags: str
+    # sha256 of the file content, None for files uploaded before it was recorded
+    file_hash: str | None = None
+
+
+class IngestionJobModel(BaseModel):
+    job_id: str
+    file_id: str
+    file_name: str
+    collection: str
+    tags: str
+    # upload indexes a new file, reindex replaces the chunks of an existing one
+    kind: Literal["upload", "reindex"] = "upload"
+    # sha256 of the uploaded content, None when re-indexing the stored file
+    file_hash: str | None = None
+    status: Literal["queued", "running", "succeeded", "failed"] = "queued"
+    embedded_chunks: int = 0
+    total_chunks: int = 0
+    # chunk diff against the chunks already indexed for the file
+    added_chunks: int = 0
+    removed_chunks: int = 0
+    unchanged_chunks: int = 0
+    error: str | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
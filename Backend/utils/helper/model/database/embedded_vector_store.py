@@ -0,0 +1,26 @@
+# Code by AkinoAlice@TyrantRey
+
+from pydantic import BaseModel, Field
+from typing import Literal
+
+
+class EmbeddedVectorStoreConfig(BaseModel):
+    path: str = Field(..., min_length=1)
+    metric_type: Literal["L2", "IP", "COSINE"] = "COSINE"
+    index_type: Literal["FLAT", "IVF_FLAT"] = "FLAT"
+    ivf_nlist: int = Field(..., ge=1)
+    ivf_nprobe: int = Field(..., ge=1)
+    # collections smaller than this are searched by brute force even with IVF_FLAT
+    ivf_min_rows: int = Field(..., ge=1)
+    max_segments: int = Field(..., ge=1)
+    max_deleted_ratio: float = Field(..., gt=0, le=1)
+
+
+class EmbeddedCollectionManifestModel(BaseModel):
+    dimension: int
+    next_id: int = 0
+    next_segment: int = 0
+    # live segments, oldest first
+    segments: list[str] = []
+    # ids of deleted rows not compacted away yet
+    deleted_ids: list[int] = []
@@ -0,0 +1,10 @@
+# Code by AkinoAlice@TyrantRey
+
+from pydantic import BaseModel
+
+
+class CollectionMigrationModel(BaseModel):
+    collection: str
+    dimension: int
+    migrated_count: int
+    skipped_count: int
@@ -1,9 +1,56 @@
 # Code by AkinoAlice@TyrantRey
 
 from pydantic import BaseModel
+from typing import Any, Literal
 
 
-class SearchSimilarityModel(BaseModel):
+class ChunkPositionModel(BaseModel):
+    # page or slide number of the first and last sentence, None if unknown
+    page: int | None = None
+    end_page: int | None = None
+    # position of the chunk within the document when it was indexed, from 0
+    ordinal: int | None = None
+
+
+class SearchSimilarityModel(ChunkPositionModel):
     source: str
     content: str
     file_uuid: str
+    # milvus primary key, empty for chunks found by lexical search only
+    id: str = ""
+    # milvus distance, BM25 score or reciprocal rank fusion score for fused results
+    score: float = 0.0
+
+
+class BatchSearchSimilarityModel(BaseModel):
+    # one ranking per query vector, in the order of the queries
+    results: list[list[SearchSimilarityModel]]
+    # every ranking fused by reciprocal rank, duplicates merged
+    fused: list[SearchSimilarityModel]
+
+
+class InsertSentencesResultModel(BaseModel):
+    insert_count: int
+    skipped_count: int
+    ids: list[str]
+
+
+class MilvusIndexConfig(BaseModel):
+    index_type: Literal[
+        "FLAT",
+        "IVF_FLAT",
+        "IVF_SQ8",
+        "IVF_PQ",
+        "HNSW",
+        "SCANN",
+        "DISKANN",
+        "AUTOINDEX",
+    ] = "IVF_FLAT"
+    metric_type: Literal["L2", "IP", "COSINE"] = "L2"
+    # build params, e.g. {"nlist": 128} or {"M": 16, "efConstruction": 200}
+    index_params: dict[str, Any] = {}
+    # search params, e.g. {"nprobe": 16} or {"ef": 64}
+    search_params: dict[str, Any] = {}
+    consistency_level: Literal["Strong", "Session", "Bounded", "Eventually"] = (
+        "Bounded"
+    )
@@ -19,6 +19,7 @@ export const FileUploadButton = () => {
   const { isOpen, onOpen, onOpenChange } = useDisclosure()
   const [uploadSuccess, setUploadSuccess] = useState<number>(0)
   const [isProgressing, setIsProgressing] = useState<boolean>(false)
+  const [isDuplicate, setIsDuplicate] = useState<boolean>(false)
   const [fileObject, setFileObject] = useState<File | null>()
   const [fileURL, setFileURL] = useState<string>()
 
@@ -35,7 +36,7 @@ export const FileUploadButton = () => {
         return (
           <div className="w-full flex justify-center">
             <span className="text-left text-lg">
-              {uploadSuccess ? (uploadSuccess == 200 ? "上載成功:" : "上載失敗:") : ""}
+              {uploadSuccess ? (uploadSuccess == 200 ? (isDuplicate ? "文件已存在:" : "上載成功:") : "上載失敗:") : ""}
               {file.name}
             </span>
           </div>
@@ -44,7 +45,7 @@ export const FileUploadButton = () => {
         return (
           <div className="w-full flex justify-center">
             <span className="text-left text-lg">
-              {uploadSuccess ? (uploadSuccess == 200 ? "上載成功:" : "上載失敗:") : ""}
+              {uploadSuccess ? (uploadSuccess == 200 ? (isDuplicate ? "文件已存在:" : "上載成功:") : "上載失敗:") : ""}
               {file.name}
             </span>
           </div>
@@ -91,9 +92,17 @@ export const FileUploadButton = () => {
 
     const respJson = await resp.json()
     console.log(respJson)
-    if (respJson.status_code === 200) {
-      console.log("File uploaded successfully")
+    // the document is indexed by a background job after the upload is accepted
+    if (respJson.status_code === 202) {
+      console.log("File uploaded successfully, ingestion job:", respJson.job_id)
       setIsProgressing(false)
+      setIsDuplicate(false)
+      setUploadSuccess(200)
+    } else if (respJson.status_code === 200 && respJson.duplicate) {
+      // the same content is already in the collection
+      console.log("Document already exists:", respJson.file_id)
+      setIsProgressing(false)
+      setIsDuplicate(true)
       setUploadSuccess(200)
     } else {
       console.error("Error uploading file")
@@ -112,6 +121,7 @@ export const FileUploadButton = () => {
           onOpen()
           setIsProgressing(false)
           setUploadSuccess(0)
+          setIsDuplicate(false)
           setFileURL("")
           setFileObject(null)
         }}
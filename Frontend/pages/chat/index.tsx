@@ -41,20 +41,10 @@ export default function ChatPage() {
     setLoading(true);
     setInputQuestion("");
 
-    const historyQuestions: string[] = []
-
-    if (chatInfo.length > 0) {
-      for (const chat of chatInfo) {
-        console.log(chat);
-        historyQuestions.push(chat.question.toString())
-        historyQuestions.push(chat.answer.toString())
-      }
-    }
-    historyQuestions.push(inputQuestion);
-
+    // the backend rebuilds the history from the chatroom UUID
     const message = await askQuestion(
       chatroomUUID,
-      historyQuestions,
+      [inputQuestion],
       "Anonymous",
       language,
       "default",